@@ -0,0 +1,182 @@
+# answer_cache.py
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import List, Dict, Optional, Any
+import numpy as np
+from langchain.schema import Document
+
+class AnswerCache:
+    """
+    Persistent cache of generated answers.
+
+    An entry is keyed on the normalized query, response type, the ordered
+    retrieved chunks (chunk id, or a content hash for chunks without one),
+    model name and generation settings, so a hit needs exactly the same
+    question and context. Entries expire after ttl_seconds, the least
+    recently used are evicted beyond max_entries, and invalidate_chunks()
+    drops every answer built from a changed chunk (wire it to
+    VectorStore.add_change_listener).
+
+    With similarity_threshold set, a miss falls back to earlier questions
+    with the same retrieved chunks (in any order) and settings whose query
+    embedding has at least that cosine similarity, so paraphrases reuse the
+    answer.
+    """
+
+    def __init__(self, cache_path: str, ttl_seconds: float = 7 * 24 * 3600, max_entries: int = 5000,
+                 similarity_threshold: Optional[float] = None):
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        self.cache_path = cache_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, context_key TEXT NOT NULL, query TEXT NOT NULL, "
+            "query_vector BLOB, result TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_context ON answers(context_key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_last_used ON answers(last_used)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answer_chunks ("
+            "chunk_id TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (chunk_id, key)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answer_chunks_key ON answer_chunks(key)")
+        self._conn.commit()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    @staticmethod
+    def chunk_key(doc: Document) -> str:
+        return doc.metadata.get("chunk_uid") or hashlib.sha1(doc.page_content.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _hash(*parts) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _keys(self, query: str, response_type: str, docs: List[Document], settings: Dict[str, Any]):
+        chunks = [self.chunk_key(doc) for doc in docs]
+        key = self._hash(self.normalize(query), response_type, chunks, settings)
+        context_key = self._hash(response_type, sorted(chunks), settings)
+        return key, context_key, chunks
+
+    def get(self, query: str, response_type: str, docs: List[Document], settings: Dict[str, Any],
+            query_vector: Optional[List[float]] = None) -> Optional[Dict[str, Any]]:
+        """Cached answer result for this question and context, or None"""
+        key, context_key, _ = self._keys(query, response_type, docs, settings)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, result FROM answers WHERE key = ? AND created > ?", (key, now - self.ttl_seconds)
+            ).fetchone()
+            similar = False
+            if row is None and self.similarity_threshold and query_vector is not None:
+                row = self._most_similar(context_key, query_vector, now)
+                similar = row is not None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, row[0]))
+            self._conn.commit()
+        self.hits += 1
+        self.similar_hits += similar
+        return json.loads(row[1])
+
+    def _most_similar(self, context_key: str, query_vector: List[float], now: float) -> Optional[tuple]:
+        rows = self._conn.execute(
+            "SELECT key, result, query_vector FROM answers "
+            "WHERE context_key = ? AND created > ? AND query_vector IS NOT NULL",
+            (context_key, now - self.ttl_seconds)
+        ).fetchall()
+        if not rows:
+            return None
+        query = np.asarray(query_vector, dtype=np.float32)
+        vectors = np.stack([np.frombuffer(blob, dtype=np.float32) for _, _, blob in rows])
+        similarities = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query) + 1e-12)
+        best = int(np.argmax(similarities))
+        return rows[best][:2] if similarities[best] >= self.similarity_threshold else None
+
+    def put(self, query: str, response_type: str, docs: List[Document], settings: Dict[str, Any],
+            result: Dict[str, Any], query_vector: Optional[List[float]] = None):
+        key, context_key, chunks = self._keys(query, response_type, docs, settings)
+        vector = None if query_vector is None else np.asarray(query_vector, dtype=np.float32).tobytes()
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, context_key, query, query_vector, result, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, context_key, self.normalize(query), vector, json.dumps(result), now, now)
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO answer_chunks (chunk_id, key) VALUES (?, ?)",
+                [(chunk, key) for chunk in set(chunks)]
+            )
+            self._conn.commit()
+            self._evict(now)
+
+    def _delete_keys(self, keys: List[str]):
+        for start in range(0, len(keys), 500):
+            batch = [(key,) for key in keys[start:start + 500]]
+            self._conn.executemany("DELETE FROM answers WHERE key = ?", batch)
+            self._conn.executemany("DELETE FROM answer_chunks WHERE key = ?", batch)
+
+    def _evict(self, now: float):
+        """Drop expired entries, then least recently used ones down to 90% of max_entries"""
+        stale = [key for (key,) in self._conn.execute(
+            "SELECT key FROM answers WHERE created <= ?", (now - self.ttl_seconds,)
+        )]
+        count = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - len(stale)
+        if count > self.max_entries:
+            stale += [key for (key,) in self._conn.execute(
+                "SELECT key FROM answers WHERE created > ? ORDER BY last_used ASC LIMIT ?",
+                (now - self.ttl_seconds, count - int(self.max_entries * 0.9))
+            )]
+        if stale:
+            self._delete_keys(stale)
+            self._conn.commit()
+
+    def invalidate_chunks(self, chunk_ids: Optional[List[str]]):
+        """Drop answers built from any of these chunks (None drops everything)"""
+        with self._lock:
+            if chunk_ids is None:
+                self._conn.execute("DELETE FROM answers")
+                self._conn.execute("DELETE FROM answer_chunks")
+                self._conn.commit()
+                return
+            keys = set()
+            for start in range(0, len(chunk_ids), 500):
+                batch = list(chunk_ids[start:start + 500])
+                keys.update(key for (key,) in self._conn.execute(
+                    f"SELECT key FROM answer_chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+                ))
+            if keys:
+                self._delete_keys(list(keys))
+                self._conn.commit()
+                print(f"🧹 Answer cache: dropped {len(keys)} answers using changed chunks")
+
+    def clear(self):
+        self.invalidate_chunks(None)
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
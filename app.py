@@ -1,12 +1,15 @@
 # app.py
 import streamlit as st
 import os
+import time
 from pathlib import Path
 from dotenv import load_dotenv
 from document_processor import DocumentProcessor
 from vector_store import VectorStore
 from query_engine import QueryEngine
-import tempfile
+from ingestion import sync_folder
+from reranker import Reranker
+from answer_cache import AnswerCache
 
 # Load environment variables
 load_dotenv()
@@ -17,15 +20,83 @@ CHROMA_PATH = os.getenv('CHROMA_PATH', './chroma_db')
 COLLECTION_NAME = os.getenv('COLLECTION_NAME', 'sop-knowledge')
 CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', '1000'))
 CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', '200'))
+CHUNK_SPLITTER = os.getenv('CHUNK_SPLITTER', 'offset')
 EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', './embedding_cache')
+EMBEDDING_CACHE_SIZE_MB = int(os.getenv('EMBEDDING_CACHE_SIZE_MB', '512'))
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '32'))
+EMBEDDING_THREADS = int(os.getenv('EMBEDDING_THREADS', '0')) or None
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv('NEAR_DUPLICATE_THRESHOLD', '0.9'))
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', str(os.cpu_count() or 1)))
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '256'))
+RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'hybrid')
+MMR_DIVERSITY = float(os.getenv('MMR_DIVERSITY', '0.3'))
+RERANK = os.getenv('RERANK', 'false').lower() == 'true'
+RERANKER_MODEL = os.getenv('RERANKER_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES', '20'))
+RERANK_BUDGET_MS = int(os.getenv('RERANK_BUDGET_MS', '500'))
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '1024'))
+RESULTS_CACHE_SIZE = int(os.getenv('RESULTS_CACHE_SIZE', '256'))
+VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'chroma')
+VECTOR_DTYPE = os.getenv('VECTOR_DTYPE', 'float16')
+IVF_NPROBE = int(os.getenv('IVF_NPROBE', '16'))
+VECTOR_SHARDS = int(os.getenv('VECTOR_SHARDS', '1'))
+SHARD_BY = os.getenv('SHARD_BY', 'source')
+WARM_UP_MODELS = os.getenv('WARM_UP_MODELS', 'true').lower() == 'true'
+ANSWER_CACHE = os.getenv('ANSWER_CACHE', 'true').lower() == 'true'
+ANSWER_CACHE_TTL_HOURS = float(os.getenv('ANSWER_CACHE_TTL_HOURS', '168'))
+ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', '5000'))
+ANSWER_CACHE_SIMILARITY = float(os.getenv('ANSWER_CACHE_SIMILARITY', '0'))
+PREFIX_KV_CACHE = os.getenv('PREFIX_KV_CACHE', 'true').lower() == 'true'
 
 # Initialize components
 @st.cache_resource
 def initialize_components():
-    doc_processor = DocumentProcessor(CHUNK_SIZE, CHUNK_OVERLAP)
-    vector_store = VectorStore(CHROMA_PATH, COLLECTION_NAME, EMBEDDING_MODEL)
-    query_engine = QueryEngine()
-    return doc_processor, vector_store, query_engine
+    # Models load lazily (warmed in background threads when WARM_UP_MODELS),
+    # so this only opens the indexes
+    start = time.perf_counter()
+    doc_processor = DocumentProcessor(CHUNK_SIZE, CHUNK_OVERLAP, INGEST_WORKERS, CHUNK_SPLITTER)
+    vector_store = VectorStore(CHROMA_PATH, COLLECTION_NAME, EMBEDDING_MODEL,
+                               EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_SIZE_MB,
+                               EMBEDDING_BATCH_SIZE, EMBEDDING_THREADS,
+                               NEAR_DUPLICATE_THRESHOLD,
+                               query_cache_size=QUERY_CACHE_SIZE,
+                               results_cache_size=RESULTS_CACHE_SIZE,
+                               vector_backend=VECTOR_BACKEND,
+                               vector_dtype=VECTOR_DTYPE,
+                               ivf_nprobe=IVF_NPROBE,
+                               vector_shards=VECTOR_SHARDS,
+                               shard_by=SHARD_BY,
+                               warm_up=WARM_UP_MODELS)
+    # Answers are reused for the same question over the same chunks, and
+    # dropped as soon as one of those chunks changes
+    answer_cache = None
+    if ANSWER_CACHE:
+        answer_cache = AnswerCache(os.path.join(CHROMA_PATH, f"{COLLECTION_NAME}-answers.sqlite"),
+                                   ttl_seconds=ANSWER_CACHE_TTL_HOURS * 3600,
+                                   max_entries=ANSWER_CACHE_SIZE,
+                                   similarity_threshold=ANSWER_CACHE_SIMILARITY or None)
+        vector_store.add_change_listener(answer_cache.invalidate_chunks)
+    query_engine = QueryEngine(warm_up=WARM_UP_MODELS, answer_cache=answer_cache, prefix_cache=PREFIX_KV_CACHE)
+    startup_seconds = time.perf_counter() - start
+    print(f"⏱️ Components initialized in {startup_seconds:.2f}s (models {'warming up' if WARM_UP_MODELS else 'load on first use'})")
+    return doc_processor, vector_store, query_engine, startup_seconds
+
+@st.cache_resource
+def load_reranker():
+    # Loaded on first use only, so the cross-encoder costs nothing when reranking is off
+    return Reranker(RERANKER_MODEL, time_budget_ms=RERANK_BUDGET_MS)
+
+def format_citation(metadata: dict) -> str:
+    """File name plus page range when the chunk came from a paginated document"""
+    citation = metadata.get('file_name', 'Unknown')
+    page_start, page_end = metadata.get('page_start'), metadata.get('page_end')
+    if page_start is not None:
+        if page_end is not None and page_end != page_start:
+            citation += f", pp. {page_start}–{page_end}"
+        else:
+            citation += f", p. {page_start}"
+    return citation
 
 def main():
     st.set_page_config(
@@ -38,7 +109,7 @@ def main():
     st.markdown("Upload your Standard Operating Procedure documents and ask questions!")
     
     # Initialize components
-    doc_processor, vector_store, query_engine = initialize_components()
+    doc_processor, vector_store, query_engine, startup_seconds = initialize_components()
     
     # Sidebar for document management
     with st.sidebar:
@@ -59,24 +130,21 @@ def main():
         if uploaded_files:
             if st.button("Process Uploaded Files"):
                 with st.spinner("Processing documents..."):
+                    # Parse uploads straight from memory, several at a time
+                    uploads = [(file.name, file.getvalue()) for file in uploaded_files]
                     all_docs = []
-                    for file in uploaded_files:
-                        # Save uploaded file temporarily
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(file.name).suffix) as tmp_file:
-                            tmp_file.write(file.getvalue())
-                            tmp_path = tmp_file.name
-                        
-                        # Process document
-                        docs = doc_processor.process_document(tmp_path)
+                    for file_name, docs, error in doc_processor.iter_process_files(uploads):
+                        if error:
+                            st.error(f"Could not process {file_name}: {error}")
+                            continue
                         all_docs.extend(docs)
-                        
-                        # Clean up temp file
-                        os.unlink(tmp_path)
                     
                     if all_docs:
                         success = vector_store.add_documents(all_docs)
                         if success:
-                            st.success(f"Successfully processed {len(all_docs)} document chunks!")
+                            skipped = len(vector_store.last_skipped_duplicates)
+                            st.success(f"Successfully processed {len(all_docs) - skipped} document chunks!"
+                                       + (f" ({skipped} near-duplicates skipped)" if skipped else ""))
                             st.rerun()
                         else:
                             st.error("Error processing documents")
@@ -88,15 +156,28 @@ def main():
         
         if st.button("Load from Folder"):
             if os.path.exists(folder_path):
-                with st.spinner("Processing folder..."):
-                    docs = doc_processor.process_folder(folder_path)
-                    if docs:
-                        success = vector_store.add_documents(docs)
-                        if success:
-                            st.success(f"Successfully processed {len(docs)} document chunks!")
-                            st.rerun()
-                        else:
-                            st.error("Error processing documents")
+                with st.spinner("Syncing folder..."):
+                    progress = st.progress(0.0, text="Scanning folder...")
+                    stats = sync_folder(
+                        doc_processor, vector_store, folder_path,
+                        batch_size=INGEST_BATCH_SIZE,
+                        progress_callback=lambda done, total: progress.progress(
+                            done / total, text=f"Indexed {done}/{total} changed files"
+                        )
+                    )
+                    progress.empty()
+                    changed_files = stats["added_files"] + stats["updated_files"] + stats["removed_files"]
+                    for failed_path, error in stats["failed_files"].items():
+                        st.error(f"Could not process {Path(failed_path).name}: {error}")
+                    if changed_files:
+                        st.success(
+                            f"Synced {changed_files} changed file(s): "
+                            f"+{stats['chunks_added']} / -{stats['chunks_deleted']} chunks"
+                            + (f", {stats['chunks_skipped']} near-duplicates skipped" if stats['chunks_skipped'] else "")
+                        )
+                        st.rerun()
+                    elif stats["unchanged_files"]:
+                        st.info(f"Already up to date ({stats['unchanged_files']} unchanged files)")
                     else:
                         st.warning("No supported documents found in folder")
             else:
@@ -106,6 +187,16 @@ def main():
             vector_store.clear_collection()
             st.success("Database cleared!")
             st.rerun()
+        
+        st.subheader("🔎 Search Filters")
+        filter_values = vector_store.get_filter_values()
+        selected_files = st.multiselect(
+            "Only search these documents",
+            filter_values["file_name"],
+            help="Leave empty to search all documents"
+        )
+        selected_types = st.multiselect("Only these file types", filter_values["file_type"])
+        search_filters = {"file_name": selected_files, "file_type": selected_types}
     
     # Main query interface
     col1, col2 = st.columns([2, 1])
@@ -138,33 +229,73 @@ def main():
         # Search parameters
         with st.expander("Search Settings"):
             num_results = st.slider("Number of relevant documents to retrieve", 1, 10, 5)
+            retrieval_modes = {
+                "hybrid": "Hybrid (keywords + semantic)",
+                "semantic": "Semantic only",
+                "mmr": "Diverse (MMR, skips overlapping chunks)",
+            }
+            retrieval_mode = st.selectbox(
+                "Retrieval mode",
+                list(retrieval_modes),
+                index=list(retrieval_modes).index(RETRIEVAL_MODE) if RETRIEVAL_MODE in retrieval_modes else 0,
+                format_func=retrieval_modes.get,
+                help="Hybrid also matches exact SOP numbers, part numbers and form codes"
+            )
+            if retrieval_mode == "mmr":
+                diversity = st.slider("Diversity", 0.0, 1.0, MMR_DIVERSITY, 0.05,
+                                      help="Higher values trade relevance for less repetition")
+            use_reranker = st.checkbox(
+                "Rerank with cross-encoder", value=RERANK,
+                help=f"Re-score the top {RERANK_CANDIDATES} candidates and keep the best {num_results} "
+                     f"(time budget {RERANK_BUDGET_MS} ms)"
+            )
         
         if st.button("Ask Question", type="primary"):
             if query.strip():
                 with st.spinner("Searching and generating answer..."):
                     # Retrieve relevant documents with similarity scores
-                    docs_with_scores = vector_store.search_with_scores(query, k=num_results)
+                    # (a wider candidate pool when the reranker picks the final few)
+                    fetch_k = max(num_results, RERANK_CANDIDATES) if use_reranker else num_results
+                    if retrieval_mode == "hybrid":
+                        docs_with_scores = vector_store.hybrid_search(query, k=fetch_k, filters=search_filters)
+                    elif retrieval_mode == "mmr":
+                        docs_with_scores = vector_store.mmr_search(query, k=fetch_k, diversity=diversity,
+                                                                   filters=search_filters)
+                    else:
+                        docs_with_scores = vector_store.search_with_scores(query, k=fetch_k, filters=search_filters)
+                    
+                    if use_reranker and docs_with_scores:
+                        docs_with_scores = load_reranker().rerank(query, docs_with_scores, num_results)
                     
                     if docs_with_scores:
                         # Separate documents and scores
                         relevant_docs = [doc for doc, score in docs_with_scores]
                         similarity_scores = [score for doc, score in docs_with_scores]
                         
-                        # Generate answer with similarity scores for better confidence
-                        result = query_engine.generate_answer(query, relevant_docs, similarity_scores=similarity_scores)
+                        # Generate answer with similarity scores for better confidence,
+                        # streamed so the first words show while the rest is generated
+                        query_vector = vector_store.embed_query(query) if ANSWER_CACHE_SIMILARITY else None
+                        stream = query_engine.stream_answer(query, relevant_docs, similarity_scores=similarity_scores,
+                                                            query_vector=query_vector)
                         
                         # Display answer with type indicator
-                        answer_type = result.get("answer_type", "standard_qa")
+                        answer_type = stream.answer_type
+                        headers = {"step_by_step": "📋 Step-by-Step Instructions", "generate_sop": "📋 Generated SOP"}
+                        st.subheader(headers.get(answer_type, "📋 Answer"))
+                        answer_placeholder = st.empty()
+                        streamed = ""
+                        for piece in stream:
+                            streamed += piece
+                            answer_placeholder.markdown(streamed.strip() + " ▌")
                         
-                        if answer_type == "step_by_step":
-                            st.subheader("📋 Step-by-Step Instructions")
-                            st.markdown(result["answer"])
-                        elif answer_type == "generate_sop":
-                            st.subheader("📋 Generated SOP")
-                            st.markdown(result["answer"])
-                        else:
-                            st.subheader("📋 Answer")
-                            st.write(result["answer"])
+                        # Replace the raw stream with the cleaned, formatted answer
+                        result = stream.result
+                        answer_placeholder.markdown(result["answer"])
+                        if result.get("cached"):
+                            st.caption("⚡ Reused a cached answer for this question and these sources")
+                        elif stream.stats["time_to_first_token_ms"] is not None:
+                            st.caption(f"⚡ First words after {stream.stats['time_to_first_token_ms'] / 1000:.1f}s · "
+                                       f"complete after {stream.stats['total_ms'] / 1000:.1f}s")
                         
                         # Display confidence and sources
                         col_conf, col_sources, col_type = st.columns(3)
@@ -197,7 +328,7 @@ def main():
                         # Display relevant excerpts
                         with st.expander("View Relevant Document Excerpts"):
                             for i, doc in enumerate(relevant_docs):
-                                st.write(f"**Excerpt {i+1}** (from {doc.metadata.get('file_name', 'Unknown')})")
+                                st.write(f"**Excerpt {i+1}** (from {format_citation(doc.metadata)})")
                                 st.write(doc.page_content)
                                 st.write("---")
                     
@@ -214,12 +345,29 @@ def main():
         st.metric("Total Documents", info["document_count"])
         st.metric("Collection Name", info["collection_name"])
         
-        # Advanced Model status
-        if query_engine.model_loaded:
-            st.success("✅ Advanced Query Engine Ready")
+        cache_stats = vector_store.get_cache_stats()
+        st.metric("Search Cache Hit Rate", f"{cache_stats['results']['hit_rate'] * 100:.0f}%",
+                  help=f"Results: {cache_stats['results']['hits']} hits / {cache_stats['results']['misses']} misses · "
+                       f"Query embeddings: {cache_stats['query_embeddings']['hit_rate'] * 100:.0f}% hit rate")
+        if query_engine.answer_cache is not None:
+            answer_stats = query_engine.answer_cache.get_stats()
+            st.metric("Answer Cache Hit Rate", f"{answer_stats['hit_rate'] * 100:.0f}%",
+                      help=f"{answer_stats['entries']} cached answers · {answer_stats['hits']} hits "
+                           f"({answer_stats['similar_hits']} paraphrases) / {answer_stats['misses']} misses")
+        
+        # Model readiness (checked without triggering a load)
+        st.caption(f"⏱️ Started in {startup_seconds:.2f}s")
+        for label, model in (("Embedding Model", vector_store.embedding_model), ("Advanced Query Engine", query_engine.model)):
+            if model.state == "ready":
+                st.success(f"✅ {label} Ready (loaded in {model.load_seconds:.1f}s)")
+            elif model.state == "loading":
+                st.info(f"⏳ {label} Loading...")
+            elif model.state == "failed":
+                st.warning(f"⚠️ {label} Not Available")
+            else:
+                st.info(f"💤 {label} loads on first use")
+        if query_engine.model.ready:
             st.info("🚀 Features: Q&A, Step-by-step, SOP Generation")
-        else:
-            st.warning("⚠️ Advanced Query Engine Not Available")
         
         # Quick help
         with st.expander("💡 Tips"):
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark: IVF-PQ approximate search vs exact search
+
+Builds a memory-mapped exact (NumPy float16) index and an IVF-PQ index over
+the same clustered, normalized vectors, then opens each in a fresh process
+and reports, per setting (exact, and IVF-PQ at each --nprobe value):
+- recall@k against exact float32 search
+- single-query p50/p95/p99 latency
+- resident memory added by opening the index and running the queries, split
+  into private (heap: codes, lists, ids) and file-backed pages of the vector
+  memmap, which the OS can drop under memory pressure (on a warm page cache the
+  kernel maps cached neighbours of every touched page, so this over-counts)
+- size on disk
+
+Run: python benchmarks/benchmark_ann.py --vectors 200000 --dim 384 --nprobe 4,8,16,32
+"""
+import os
+import time
+import tempfile
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from common import environment_info, write_results
+from benchmark_backends import make_vectors, directory_size_mb
+from vector_backends import NumpyBackend, IVFPQBackend
+
+def resident_mb() -> tuple:
+    """(private, file-backed) resident MB of this process (Linux /proc; zeros elsewhere)"""
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            resident, shared = (int(pages) for pages in file.read().split()[1:3])
+    except (OSError, ValueError):
+        return 0.0, 0.0
+    page_mb = os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    return (resident - shared) * page_mb, shared * page_mb
+
+def measure(kind: str, directory: str, nprobe: int, queries: np.ndarray, exact: np.ndarray, k: int) -> dict:
+    """Runs in a fresh process so resident memory reflects only this index"""
+    before = resident_mb()
+    backend = IVFPQBackend(directory, nprobe=nprobe) if kind == "ivfpq" else NumpyBackend(directory, keep_decoded=False)
+    latencies, found = [], []
+    for query in queries:
+        start = time.perf_counter()
+        response = backend.query([query.tolist()], k)
+        latencies.append(time.perf_counter() - start)
+        found.append({int(chunk_id.split('-')[1]) for chunk_id in response["ids"][0]})
+    latencies_ms = np.array(latencies) * 1000
+    after = resident_mb()
+    return {
+        f"recall_at_{k}": float(np.mean([len(hits & set(truth.tolist())) / k for hits, truth in zip(found, exact)])),
+        "query_p50_ms": float(np.percentile(latencies_ms, 50)),
+        "query_p95_ms": float(np.percentile(latencies_ms, 95)),
+        "query_p99_ms": float(np.percentile(latencies_ms, 99)),
+        "resident_private_mb": after[0] - before[0],
+        "resident_file_mb": after[1] - before[1],
+    }
+
+def build(backend, vectors: np.ndarray, batch_size: int) -> float:
+    start = time.perf_counter()
+    for offset in range(0, len(vectors), batch_size):
+        end = min(offset + batch_size, len(vectors))
+        backend.upsert([f"chunk-{i}" for i in range(offset, end)], vectors[offset:end],
+                       [{} for _ in range(offset, end)], [f"chunk text {i}" for i in range(offset, end)])
+    # Includes IVF-PQ training, which runs in the background
+    backend.wait_until_idle()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", default="4,8,16,32")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmarks/results/ann.json")
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.vectors + args.queries, args.dim, args.seed)
+    vectors, queries = vectors[:args.vectors], vectors[args.vectors:]
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.k]
+    print(f"📐 {args.vectors} x {args.dim} vectors, {args.queries} queries, k={args.k}\n")
+
+    results = {}
+    pool = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as workdir:
+        directories = {"exact": os.path.join(workdir, "exact"), "ivfpq": os.path.join(workdir, "ivfpq")}
+        build_seconds = {
+            "exact": build(NumpyBackend(directories["exact"], keep_decoded=False), vectors, args.batch_size),
+            "ivfpq": build(IVFPQBackend(directories["ivfpq"]), vectors, args.batch_size),
+        }
+        settings = [("exact", "exact", 0)] + [(f"ivfpq-nprobe{n}", "ivfpq", int(n)) for n in args.nprobe.split(",")]
+        for name, kind, nprobe in settings:
+            with pool.Pool(1) as worker:
+                result = worker.apply(measure, (kind, directories[kind], nprobe, queries, exact, args.k))
+            result["build_vectors_per_sec"] = args.vectors / build_seconds[kind]
+            result["disk_mb"] = directory_size_mb(directories[kind])
+            results[name] = result
+            print(f"  {name:<16} recall {result[f'recall_at_{args.k}']:.3f}  p50 {result['query_p50_ms']:7.2f} ms  "
+                  f"p95 {result['query_p95_ms']:7.2f} ms  p99 {result['query_p99_ms']:7.2f} ms  "
+                  f"RSS +{result['resident_private_mb']:6.1f} MB private +{result['resident_file_mb']:6.1f} MB mapped  disk {result['disk_mb']:.1f} MB")
+
+    write_results(args.output, {
+        "benchmark": "ann",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "environment": environment_info(),
+        "settings": results,
+    })
+
+if __name__ == "__main__":
+    main()
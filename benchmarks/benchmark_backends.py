@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark: vector backends (Chroma HNSW vs memory-mapped NumPy exact search vs IVF-PQ)
+
+Builds each backend from the same clustered set of normalized vectors and
+reports build rate, reopen time, single-query latency (p50/p95), batched
+query throughput, recall@k against exact float32 search and size on disk.
+
+Run: python benchmarks/benchmark_backends.py --vectors 50000 --dim 384 [--shards 4]
+"""
+import os
+import time
+import tempfile
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from common import HashEmbeddings, environment_info, write_results
+from vector_backends import ChromaBackend, NumpyBackend, IVFPQBackend, ShardedBackend
+
+def make_vectors(count: int, dim: int, seed: int) -> np.ndarray:
+    """Unit vectors scattered around a few hundred centres, like topic clusters of SOP chunks"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((max(count // 200, 1), dim)).astype(np.float32)
+    vectors = centres[rng.integers(len(centres), size=count)] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def directory_size_mb(path: str) -> float:
+    return sum(file.stat().st_size for file in Path(path).rglob('*') if file.is_file()) / (1024 * 1024)
+
+def run(name: str, open_backend, directory: str, vectors: np.ndarray, queries: np.ndarray,
+        exact: np.ndarray, k: int, batch_size: int) -> dict:
+    backend = open_backend()
+    ids = [f"chunk-{i}" for i in range(len(vectors))]
+    start = time.perf_counter()
+    for offset in range(0, len(vectors), batch_size):
+        end = offset + batch_size
+        backend.upsert(ids[offset:end], vectors[offset:end].tolist(),
+                       [{"row": i} for i in range(offset, min(end, len(vectors)))],
+                       [f"chunk text {i}" for i in range(offset, min(end, len(vectors)))])
+    backend.wait_until_idle()
+    build_seconds = time.perf_counter() - start
+    del backend
+
+    start = time.perf_counter()
+    backend = open_backend()
+    backend.count()
+    open_seconds = time.perf_counter() - start
+
+    latencies, found = [], []
+    for query in queries:
+        start = time.perf_counter()
+        response = backend.query([query.tolist()], k)
+        latencies.append(time.perf_counter() - start)
+        found.append({int(chunk_id.split('-')[1]) for chunk_id in response["ids"][0]})
+    recall = float(np.mean([len(hits & set(truth.tolist())) / k for hits, truth in zip(found, exact)]))
+
+    start = time.perf_counter()
+    backend.query(queries.tolist(), k)
+    batch_seconds = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    result = {
+        "build_vectors_per_sec": len(vectors) / build_seconds,
+        "open_ms": open_seconds * 1000,
+        "query_p50_ms": float(np.percentile(latencies_ms, 50)),
+        "query_p95_ms": float(np.percentile(latencies_ms, 95)),
+        "batched_queries_per_sec": len(queries) / batch_seconds,
+        f"recall_at_{k}": recall,
+        "disk_mb": directory_size_mb(directory),
+    }
+    print(f"  {name:<14} build {result['build_vectors_per_sec']:9.0f}/s  open {result['open_ms']:8.1f} ms  "
+          f"p50 {result['query_p50_ms']:7.2f} ms  p95 {result['query_p95_ms']:7.2f} ms  "
+          f"batch {result['batched_queries_per_sec']:8.0f} q/s  recall {recall:.3f}  {result['disk_mb']:.1f} MB")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--backends", default="chroma,numpy-float16,numpy-int8,ivfpq")
+    parser.add_argument("--shards", type=int, default=1, help="Split each backend into N parallel shards")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmarks/results/backends.json")
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.vectors + args.queries, args.dim, args.seed)
+    vectors, queries = vectors[:args.vectors], vectors[args.vectors:]
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.k]
+    print(f"📐 {args.vectors} x {args.dim} vectors, {args.queries} queries, k={args.k}\n")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.backends.split(","):
+            directory = os.path.join(workdir, name)
+            if name == "chroma":
+                embeddings = HashEmbeddings(args.dim)
+                open_shard = lambda path: ChromaBackend(path, "benchmark", embeddings)
+            elif name == "ivfpq":
+                open_shard = IVFPQBackend
+            else:
+                dtype = name.split("-", 1)[1]
+                open_shard = lambda path: NumpyBackend(path, dtype=dtype)
+            if args.shards > 1:
+                open_backend = lambda: ShardedBackend(
+                    [open_shard(os.path.join(directory, f"shard-{i}")) for i in range(args.shards)]
+                )
+            else:
+                open_backend = lambda: open_shard(directory)
+            results[name] = run(name, open_backend, directory, vectors, queries, exact, args.k, args.batch_size)
+
+    write_results(args.output, {
+        "benchmark": "backends",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "environment": environment_info(),
+        "backends": results,
+    })
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ingestion pipeline, stage by stage
+
+Generates a synthetic SOP corpus (or uses --corpus) and measures:
+- extract:  files/sec through DocumentProcessor's PDF/DOCX/TXT extractors
+- split:    chunks/sec through the configured text splitter
+- process:  files/sec for process_folder end to end (with --workers)
+- embed:    chunks/sec through VectorStore.embed_documents (cache off)
+- upsert:   chunks/sec writing precomputed vectors into the vector backend
+- add:      chunks/sec through VectorStore.add_documents on an empty store, with
+            the near-duplicate screen, BM25 indexing and a cold embedding cache
+- re-add:   the same into a second empty store sharing the now warm embedding
+            cache (the rebuild / re-upload path)
+
+Runs offline on CPU: --embedding stub (default) uses a hashing embedder, or
+pass a locally available sentence-transformers model name. Results are
+written as JSON; --baseline compares against a previous run and exits with
+status 1 if any stage got slower than --max-regression.
+
+Run: python benchmarks/benchmark_ingestion.py --files 30 --pages 10 [--baseline old.json]
+"""
+import sys
+import json
+import time
+import tempfile
+import argparse
+from pathlib import Path
+
+from common import load_embeddings, environment_info, write_results
+from synthetic_corpus import generate_corpus
+from document_processor import DocumentProcessor
+from vector_store import VectorStore
+
+def stage_result(seconds: float, items: int, unit: str, **extra) -> dict:
+    result = {"seconds": seconds, "items": items, "unit": unit, "rate": items / max(seconds, 1e-9)}
+    result.update(extra)
+    print(f"  {result['rate']:10.1f} {unit:<12} ({items} in {seconds:.2f}s)")
+    return result
+
+def extract_all(processor: DocumentProcessor, files):
+    extractors = {
+        '.pdf': processor.extract_text_from_pdf,
+        '.docx': processor.extract_text_from_docx,
+        '.txt': processor.extract_text_from_txt,
+    }
+    return [extractors[file_path.suffix.lower()](str(file_path)) for file_path in files]
+
+def add_all(vector_store: VectorStore, documents, batch_size: int) -> int:
+    for offset in range(0, len(documents), batch_size):
+        if not vector_store.add_documents(documents[offset:offset + batch_size]):
+            raise RuntimeError("add_documents failed")
+    return vector_store.skipped_duplicates_total
+
+def compare(results: dict, baseline_path: str, max_regression: float) -> bool:
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    ok = True
+    print(f"\n📊 Compared with {baseline_path} (allowed slowdown {max_regression:.0%}):")
+    for name, stage in results["stages"].items():
+        old = baseline.get("stages", {}).get(name)
+        if not old:
+            continue
+        change = stage["rate"] / old["rate"] - 1
+        regressed = change < -max_regression
+        ok = ok and not regressed
+        print(f"  {'❌' if regressed else '✅'} {name:<8} {old['rate']:10.1f} -> {stage['rate']:10.1f} {stage['unit']} ({change:+.1%})")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Existing folder to ingest instead of a generated corpus")
+    parser.add_argument("--files", type=int, default=30)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--formats", default="pdf,docx,txt")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--splitter", default="offset", choices=["offset", "recursive"])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--embedding", default="stub", help="'stub' or a local sentence-transformers model")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks per vector store upsert")
+    parser.add_argument("--backend", default="chroma", choices=["chroma", "numpy", "ivfpq"])
+    parser.add_argument("--embedding-batch-size", type=int, default=32)
+    parser.add_argument("--near-duplicate-threshold", type=float, default=0.9,
+                        help="Near-duplicate screen for the add stages (0 disables)")
+    parser.add_argument("--output", default="benchmarks/results/ingestion.json")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = args.corpus
+        if not corpus:
+            corpus = str(Path(workdir) / "corpus")
+            print(f"📝 Generating {args.files} files x {args.pages} pages...")
+            generate_corpus(corpus, args.files, args.pages, tuple(args.formats.split(",")))
+
+        processor = DocumentProcessor(args.chunk_size, args.chunk_overlap, args.workers, args.splitter)
+        files = processor.list_supported_files(corpus)
+        corpus_mb = sum(file_path.stat().st_size for file_path in files) / (1024 * 1024)
+        print(f"📁 {len(files)} files, {corpus_mb:.1f} MB")
+        stages = {}
+
+        print("\n⏱️ extract")
+        start = time.perf_counter()
+        texts = extract_all(processor, files)
+        stages["extract"] = stage_result(time.perf_counter() - start, len(files), "files/sec",
+                                         chars=sum(len(text) for text in texts))
+
+        print("⏱️ split")
+        start = time.perf_counter()
+        chunks = [chunk for text in texts for chunk in processor.text_splitter.split_text(text)]
+        stages["split"] = stage_result(time.perf_counter() - start, len(chunks), "chunks/sec")
+
+        print(f"⏱️ process ({args.workers} workers)")
+        start = time.perf_counter()
+        documents = processor.process_folder(corpus, max_workers=args.workers)
+        stages["process"] = stage_result(time.perf_counter() - start, len(files), "files/sec",
+                                         chunks=len(documents))
+
+        vector_store = VectorStore(
+            persist_directory=str(Path(workdir) / "chroma"),
+            collection_name="benchmark",
+            embedding_model=args.embedding,
+            embedding_cache_dir=None,
+            embedding_batch_size=args.embedding_batch_size,
+            near_duplicate_threshold=None,
+            vector_backend=args.backend,
+            embeddings=load_embeddings(args.embedding)
+        )
+        texts = [doc.page_content for doc in documents]
+
+        print("⏱️ embed")
+        start = time.perf_counter()
+        vectors = vector_store.embed_documents(texts)
+        stages["embed"] = stage_result(time.perf_counter() - start, len(texts), "chunks/sec")
+
+        print(f"⏱️ upsert ({args.backend})")
+        backend = vector_store.backend
+        start = time.perf_counter()
+        for offset in range(0, len(documents), args.batch_size):
+            batch = documents[offset:offset + args.batch_size]
+            backend.upsert(
+                ids=[doc.metadata["chunk_uid"] for doc in batch],
+                embeddings=vectors[offset:offset + args.batch_size],
+                metadatas=[doc.metadata for doc in batch],
+                documents=texts[offset:offset + args.batch_size]
+            )
+        stages["upsert"] = stage_result(time.perf_counter() - start, len(documents), "chunks/sec",
+                                        stored=backend.count())
+
+        # The stages above time the backend alone; these go through add_documents,
+        # so near-duplicate screening, BM25 indexing and the embedding cache count too
+        cache_dir = str(Path(workdir) / "embedding_cache")
+        for name, directory in (("add", "store-cold"), ("re-add", "store-warm")):
+            store = VectorStore(
+                persist_directory=str(Path(workdir) / directory),
+                collection_name="benchmark",
+                embedding_model=args.embedding,
+                embedding_cache_dir=cache_dir,
+                embedding_batch_size=args.embedding_batch_size,
+                near_duplicate_threshold=args.near_duplicate_threshold or None,
+                vector_backend=args.backend,
+                embeddings=vector_store.embeddings
+            )
+            print(f"⏱️ {name} (add_documents, {args.backend})")
+            start = time.perf_counter()
+            skipped = add_all(store, documents, args.batch_size)
+            stages[name] = stage_result(time.perf_counter() - start, len(documents), "chunks/sec",
+                                        stored=store.backend.count(), skipped_duplicates=skipped)
+
+    results = {
+        "benchmark": "ingestion",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": dict(vars(args), corpus_files=len(files), corpus_mb=corpus_mb),
+        "environment": environment_info(),
+        "stages": stages,
+    }
+    write_results(args.output, results)
+
+    if args.baseline and not compare(results, args.baseline, args.max_regression):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark: retrieval quality and latency on a labelled query set
+
+Each labelled query names the file its answer lives in and, optionally, a
+phrase the answering chunk must contain:
+    [{"query": "...", "file_name": "safety_procedures.txt", "contains": "every 75 feet"}, ...]
+A retrieved chunk is a hit when both match. For every backend and retrieval
+mode it reports recall@k (share of queries with a hit in the top k) for each
+--k, MRR of the first hit within the largest k, and p50/p95/p99 latency of
+one search call with the query and results caches disabled.
+
+By default a synthetic corpus is generated and its planted facts become the
+queries; --corpus documents --queries benchmarks/queries/documents.json runs
+the hand-labelled set over the bundled documents instead. Runs offline on CPU
+with --embedding stub (default).
+
+Run: python benchmarks/benchmark_retrieval.py --backends chroma,numpy --modes semantic,hybrid
+"""
+import json
+import time
+import tempfile
+import argparse
+from pathlib import Path
+from typing import List, Dict
+
+import numpy as np
+
+from common import load_embeddings, environment_info, write_results
+from synthetic_corpus import generate_corpus
+from document_processor import DocumentProcessor
+from vector_store import VectorStore
+
+SEARCHES = {
+    "semantic": lambda store, query, k: store.search_with_scores(query, k),
+    "hybrid": lambda store, query, k: store.hybrid_search(query, k),
+    "mmr": lambda store, query, k: store.mmr_search(query, k),
+}
+
+def fact_queries(facts: List[Dict]) -> List[Dict]:
+    """Labelled queries from a synthetic corpus' planted facts: one by identifier, one by wording"""
+    queries = []
+    for fact in facts:
+        queries.append({"query": f"What is spare part {fact['identifier']}?",
+                        "file_name": fact["file_name"], "contains": fact["identifier"]})
+        queries.append({"query": fact["sentence"].replace(fact["identifier"], "").replace("  ", " "),
+                        "file_name": fact["file_name"], "contains": fact["identifier"]})
+    return queries
+
+def first_hit(results: List[tuple], label: Dict) -> int:
+    """1-based rank of the first relevant chunk, 0 if none"""
+    for rank, (doc, _) in enumerate(results, 1):
+        if doc.metadata.get("file_name") == label["file_name"] and label.get("contains", "") in doc.page_content:
+            return rank
+    return 0
+
+def evaluate(store: VectorStore, mode: str, labels: List[Dict], ks: List[int]) -> dict:
+    search = SEARCHES[mode]
+    ranks, latencies = [], []
+    for label in labels:
+        start = time.perf_counter()
+        results = search(store, label["query"], max(ks))
+        latencies.append(time.perf_counter() - start)
+        ranks.append(first_hit(results, label))
+    ranks = np.array(ranks)
+    latencies_ms = np.array(latencies) * 1000
+    result = {f"recall_at_{k}": float(np.mean((ranks > 0) & (ranks <= k))) for k in ks}
+    result.update({
+        "mrr": float(np.mean(np.where(ranks > 0, 1.0 / np.maximum(ranks, 1), 0.0))),
+        "latency_p50_ms": float(np.percentile(latencies_ms, 50)),
+        "latency_p95_ms": float(np.percentile(latencies_ms, 95)),
+        "latency_p99_ms": float(np.percentile(latencies_ms, 99)),
+    })
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Folder to index instead of a generated corpus")
+    parser.add_argument("--queries", help="Labelled queries JSON (required with --corpus)")
+    parser.add_argument("--files", type=int, default=30)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--k", default="1,3,5,10", help="Comma-separated k values")
+    parser.add_argument("--backends", default="chroma,numpy")
+    parser.add_argument("--modes", default="semantic,hybrid", help=f"Any of {', '.join(SEARCHES)}")
+    parser.add_argument("--embedding", default="stub", help="'stub' or a local sentence-transformers model")
+    parser.add_argument("--output", default="benchmarks/results/retrieval.json")
+    args = parser.parse_args()
+    if args.corpus and not args.queries:
+        parser.error("--corpus needs --queries")
+    ks = sorted(int(k) for k in args.k.split(","))
+    embeddings = load_embeddings(args.embedding)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = args.corpus
+        if not corpus:
+            corpus = str(Path(workdir) / "corpus")
+            labels = fact_queries(generate_corpus(corpus, args.files, args.pages, formats=("txt", "pdf")))
+        if args.queries:
+            with open(args.queries, 'r', encoding='utf-8') as file:
+                labels = json.load(file)
+        documents = DocumentProcessor().process_folder(corpus)
+        print(f"\n🔎 {len(labels)} labelled queries against {len(documents)} chunks, k={ks}")
+
+        for backend in args.backends.split(","):
+            store = VectorStore(
+                persist_directory=str(Path(workdir) / backend),
+                collection_name="benchmark",
+                embedding_model=args.embedding,
+                embedding_cache_dir=None,
+                near_duplicate_threshold=None,
+                query_cache_size=0,
+                results_cache_size=0,
+                vector_backend=backend,
+                embeddings=embeddings
+            )
+            store.add_documents(documents)
+            for mode in args.modes.split(","):
+                name = f"{backend}/{mode}"
+                result = results[name] = evaluate(store, mode, labels, ks)
+                recalls = "  ".join(f"R@{k} {result[f'recall_at_{k}']:.3f}" for k in ks)
+                print(f"  {name:<18} {recalls}  MRR {result['mrr']:.3f}  p50 {result['latency_p50_ms']:6.2f} ms  "
+                      f"p95 {result['latency_p95_ms']:6.2f} ms  p99 {result['latency_p99_ms']:6.2f} ms")
+
+    write_results(args.output, {
+        "benchmark": "retrieval",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": dict(vars(args), queries_count=len(labels), chunks=len(documents)),
+        "environment": environment_info(),
+        "results": results,
+    })
+
+if __name__ == "__main__":
+    main()
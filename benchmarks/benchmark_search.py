@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark: looped search_with_scores vs batched search_many
+
+Indexes a synthetic SOP corpus, then runs the same queries one at a time and
+as a single search_many call (query and results caches disabled) and checks
+both return the same chunks.
+
+Run: python benchmarks/benchmark_search.py --queries 200 [--embedding all-MiniLM-L6-v2]
+"""
+import time
+import tempfile
+import argparse
+from pathlib import Path
+
+from common import load_embeddings, environment_info, write_results
+from synthetic_corpus import SOPTextGenerator, generate_corpus
+from document_processor import DocumentProcessor
+from vector_store import VectorStore
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=30)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--embedding", default="stub", help="'stub' or a local sentence-transformers model")
+    parser.add_argument("--output", default="benchmarks/results/search.json")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = str(Path(workdir) / "corpus")
+        facts = generate_corpus(corpus, args.files, args.pages, formats=("txt",))
+        documents = DocumentProcessor().process_folder(corpus)
+
+        vector_store = VectorStore(
+            persist_directory=str(Path(workdir) / "chroma"),
+            collection_name="benchmark",
+            embedding_model=args.embedding,
+            embedding_cache_dir=None,
+            near_duplicate_threshold=None,
+            query_cache_size=0,
+            results_cache_size=0,
+            embeddings=load_embeddings(args.embedding)
+        )
+        vector_store.add_documents(documents)
+
+        generator = SOPTextGenerator(seed=7)
+        queries = [fact["sentence"] for fact in facts][:args.queries // 2]
+        queries += [generator.sentence() for _ in range(args.queries - len(queries))]
+        print(f"\n🔎 {len(queries)} queries against {len(documents)} chunks")
+
+        start = time.perf_counter()
+        looped = [vector_store.search_with_scores(query, k=args.k) for query in queries]
+        looped_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batched = vector_store.search_many(queries, k=args.k)
+        batched_seconds = time.perf_counter() - start
+
+    agreement = sum(
+        [doc.page_content for doc, _ in a] == [doc.page_content for doc, _ in b]
+        for a, b in zip(looped, batched)
+    ) / len(queries)
+    print(f"  looped      {len(queries) / looped_seconds:8.1f} queries/sec")
+    print(f"  search_many {len(queries) / batched_seconds:8.1f} queries/sec "
+          f"({looped_seconds / batched_seconds:.1f}x, {agreement:.0%} identical results)")
+
+    write_results(args.output, {
+        "benchmark": "search_many",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "environment": environment_info(),
+        "looped": {"seconds": looped_seconds, "queries_per_sec": len(queries) / looped_seconds},
+        "search_many": {"seconds": batched_seconds, "queries_per_sec": len(queries) / batched_seconds},
+        "speedup": looped_seconds / batched_seconds,
+        "identical_results": agreement,
+    })
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark: OffsetTextSplitter vs LangChain's RecursiveCharacterTextSplitter
+
+Splits the documents/ corpus (repeated to a target size) with both splitters
+and reports throughput, chunk counts and chunk length statistics.
+
+Run: python benchmarks/benchmark_splitter.py [--target-mb 20] [--chunk-size 1000] [--chunk-overlap 200]
+     [--output benchmarks/results/splitter.json]
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from common import environment_info, write_results
+from document_processor import DocumentProcessor, OffsetTextSplitter
+
+def load_corpus(folder: str, target_chars: int) -> str:
+    processor = DocumentProcessor()
+    texts = []
+    for file_path in processor.list_supported_files(folder):
+        if file_path.suffix.lower() == '.pdf':
+            texts.append(processor.extract_text_from_pdf(str(file_path)))
+        elif file_path.suffix.lower() == '.docx':
+            texts.append(processor.extract_text_from_docx(str(file_path)))
+        else:
+            texts.append(processor.extract_text_from_txt(str(file_path)))
+    base = "\n\n".join(text for text in texts if text.strip())
+    if not base:
+        raise SystemExit(f"No text found in {folder}")
+    repeats = max(1, target_chars // len(base))
+    return "\n\n".join([base] * repeats)
+
+def run(name: str, split, text: str, rounds: int) -> dict:
+    best = float('inf')
+    chunks = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        chunks = split(text)
+        best = min(best, time.perf_counter() - start)
+    lengths = [len(chunk) for chunk in chunks]
+    result = {
+        "splitter": name,
+        "seconds": best,
+        "mb_per_sec": len(text) / best / 1e6,
+        "chunks": len(chunks),
+        "avg_chunk_chars": sum(lengths) / len(lengths),
+        "max_chunk_chars": max(lengths),
+    }
+    print(f"  {name:<10} {best * 1000:9.1f} ms  {result['mb_per_sec']:7.2f} MB/s  "
+          f"{len(chunks):7d} chunks  avg {result['avg_chunk_chars']:.0f} chars")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folder", default="./documents")
+    parser.add_argument("--target-mb", type=float, default=20)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--output", default="benchmarks/results/splitter.json")
+    args = parser.parse_args()
+
+    text = load_corpus(args.folder, int(args.target_mb * 1e6))
+    print(f"📄 Corpus: {len(text) / 1e6:.1f} MB of text")
+
+    recursive = RecursiveCharacterTextSplitter(
+        chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap, length_function=len
+    )
+    offset = OffsetTextSplitter(args.chunk_size, args.chunk_overlap)
+
+    baseline = run("recursive", recursive.split_text, text, args.rounds)
+    candidate = run("offset", offset.split_text, text, args.rounds)
+    print(f"\n⚡ Speedup: {baseline['seconds'] / candidate['seconds']:.1f}x")
+
+    write_results(args.output, {
+        "benchmark": "splitter",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "environment": environment_info(),
+        "corpus_chars": len(text),
+        "recursive": baseline,
+        "offset": candidate,
+        "speedup": baseline["seconds"] / candidate["seconds"],
+    })
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Shared helpers for the benchmark scripts
+"""
+import sys
+import math
+import json
+import zlib
+import platform
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain_core.embeddings import Embeddings
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Offline stand-in for a sentence-transformer: hashed bag of words and
+    bigrams, L2-normalized. Deterministic and fast, with enough lexical
+    signal for retrieval metrics to be meaningful on the synthetic corpus.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        # Embedding cache key
+        self.model_name = f"hash-bow-{dim}"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        words = text.lower().split()
+        for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = zlib.crc32(token.encode('utf-8'))
+            vector[digest % self.dim] += 1.0 if (digest >> 31) else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+
+def load_embeddings(name: str) -> Embeddings:
+    """'stub' for HashEmbeddings, otherwise a local sentence-transformers model name"""
+    if name == "stub":
+        return HashEmbeddings()
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(
+        model_name=name,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+
+
+def environment_info() -> dict:
+    import os
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_results(path: str, results: dict):
+    output = Path(path)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+    print(f"\n💾 Results written to {output}")
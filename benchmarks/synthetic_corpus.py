@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Synthetic SOP corpus generator for benchmarks
+
+Writes PDF, DOCX and TXT files that look like maritime SOPs (sections,
+numbered steps, SOP / form / part identifiers). Every file also gets a few
+unique "facts" (identifier + sentence) that retrieval benchmarks can use as
+labelled queries. PDFs are written with a tiny built-in writer, so no PDF
+library is needed to generate them.
+
+Run: python benchmarks/synthetic_corpus.py ./bench_corpus --files 30 --pages 20
+"""
+import json
+import random
+import argparse
+from pathlib import Path
+from typing import List, Dict
+
+SUBJECTS = [
+    "main engine", "ballast pump", "steering gear", "fire main", "mooring winch",
+    "emergency generator", "oily water separator", "lifeboat davit", "fuel purifier",
+    "air compressor", "cargo crane", "sewage plant", "boiler", "bilge system", "hull coating",
+]
+ACTIONS = [
+    "inspect", "isolate", "drain", "record", "verify", "calibrate", "lubricate",
+    "test", "replace", "clean", "tag", "report", "measure", "tighten", "flush",
+]
+OBJECTS = [
+    "the pressure gauge", "all valve seats", "the defect list", "the spare parts log",
+    "the safety interlock", "the suction filter", "the drain plug", "the bearing clearance",
+    "the permit to work", "the lockout tag", "the alarm set point", "the gasket surface",
+]
+QUALIFIERS = [
+    "before the repair period begins", "in the presence of the chief engineer",
+    "after the system has cooled down", "as required by the annual survey",
+    "with the breaker locked open", "and sign the checklist", "at every watch handover",
+    "in accordance with class requirements", "before returning the unit to service",
+]
+
+
+class SOPTextGenerator:
+    """Deterministic generator of SOP-like text"""
+
+    def __init__(self, seed: int = 42):
+        self.rng = random.Random(seed)
+
+    def sentence(self) -> str:
+        rng = self.rng
+        return (f"{rng.choice(ACTIONS).capitalize()} {rng.choice(OBJECTS)} of the "
+                f"{rng.choice(SUBJECTS)} {rng.choice(QUALIFIERS)}.")
+
+    def section(self, number: int) -> List[str]:
+        rng = self.rng
+        lines = [f"{number}. {rng.choice(SUBJECTS).title()} Procedure (SOP-{rng.randint(1000, 9999)})", ""]
+        lines.extend(" ".join(self.sentence() for _ in range(rng.randint(2, 4))) for _ in range(rng.randint(1, 3)))
+        lines.append("")
+        for step in range(1, rng.randint(4, 9)):
+            lines.append(f"{number}.{step} {self.sentence()} Use form QC-{rng.randint(10, 99)}.")
+        lines.append("")
+        return lines
+
+    def fact(self, file_index: int, fact_index: int) -> Dict[str, str]:
+        """A unique, checkable statement to plant in a document"""
+        rng = self.rng
+        identifier = f"PN-{file_index:04d}-{fact_index:02d}{rng.randint(100, 999)}"
+        subject = rng.choice(SUBJECTS)
+        sentence = (f"Spare part {identifier} for the {subject} must be recorded in the "
+                    f"spare parts log before you {rng.choice(ACTIONS)} {rng.choice(OBJECTS)}.")
+        return {"identifier": identifier, "subject": subject, "sentence": sentence}
+
+    def pages(self, num_pages: int, lines_per_page: int = 55) -> List[List[str]]:
+        pages, current, section = [], [], 1
+        while len(pages) < num_pages:
+            for line in self.section(section):
+                # Wrap long lines the way a PDF page would
+                while len(line) > 90:
+                    split_at = line.rfind(" ", 0, 90)
+                    current.append(line[:split_at])
+                    line = line[split_at + 1:]
+                current.append(line)
+                if len(current) >= lines_per_page:
+                    pages.append(current)
+                    current = []
+            section += 1
+        return pages[:num_pages]
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: Path, pages: List[List[str]]):
+    """Minimal single-font PDF writer (enough for PyPDF2 text extraction)"""
+    objects = {
+        1: "<< /Type /Catalog /Pages 2 0 R >>",
+        3: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    kids = []
+    next_id = 4
+    for lines in pages:
+        stream = "BT /F1 10 Tf 12 TL 50 800 Td\n"
+        stream += "".join(f"({_pdf_escape(line)}) Tj T*\n" for line in lines)
+        stream += "ET"
+        content_id, page_id = next_id, next_id + 1
+        objects[content_id] = f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream"
+        objects[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>")
+        kids.append(page_id)
+        next_id += 2
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>"
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(output)
+        output += f"{object_id} 0 obj\n{objects[object_id]}\nendobj\n".encode('latin-1')
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('latin-1')
+    for object_id in sorted(objects):
+        output += f"{offsets[object_id]:010d} 00000 n \n".encode('latin-1')
+    output += (f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+               f"startxref\n{xref_offset}\n%%EOF\n").encode('latin-1')
+    path.write_bytes(bytes(output))
+
+
+def write_docx(path: Path, pages: List[List[str]]):
+    from docx import Document
+    document = Document()
+    for lines in pages:
+        for line in lines:
+            document.add_paragraph(line)
+    document.save(str(path))
+
+
+def write_txt(path: Path, pages: List[List[str]]):
+    path.write_text("\n".join("\n".join(lines) for lines in pages) + "\n", encoding='utf-8')
+
+
+WRITERS = {"pdf": write_pdf, "docx": write_docx, "txt": write_txt}
+
+
+def generate_corpus(output_dir: str, num_files: int = 30, pages_per_file: int = 10,
+                    formats=("pdf", "docx", "txt"), facts_per_file: int = 3, seed: int = 42) -> List[Dict]:
+    """
+    Write num_files documents (formats round-robin) and return the planted facts:
+    [{"file_name", "identifier", "subject", "sentence", "page"}, ...]
+    """
+    generator = SOPTextGenerator(seed)
+    folder = Path(output_dir)
+    folder.mkdir(parents=True, exist_ok=True)
+    facts = []
+
+    for file_index in range(num_files):
+        file_format = formats[file_index % len(formats)]
+        file_name = f"sop_{file_index:04d}.{file_format}"
+        pages = generator.pages(pages_per_file)
+        for fact_index in range(facts_per_file):
+            fact = generator.fact(file_index, fact_index)
+            page = generator.rng.randrange(len(pages))
+            pages[page].insert(generator.rng.randrange(len(pages[page]) + 1), fact["sentence"])
+            facts.append(dict(fact, file_name=file_name, page=page + 1))
+        WRITERS[file_format](folder / file_name, pages)
+
+    with open(folder / "facts.json", 'w', encoding='utf-8') as file:
+        json.dump(facts, file, indent=1)
+    return facts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output_dir")
+    parser.add_argument("--files", type=int, default=30)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--formats", default="pdf,docx,txt")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    facts = generate_corpus(args.output_dir, args.files, args.pages, tuple(args.formats.split(",")), seed=args.seed)
+    print(f"✅ Wrote {args.files} files ({len(facts)} planted facts) to {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
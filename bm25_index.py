@@ -0,0 +1,357 @@
+# bm25_index.py
+import re
+import math
+import sqlite3
+import threading
+from collections import Counter, OrderedDict
+from typing import List, Tuple, Optional, Iterable, Dict, Sequence
+import numpy as np
+
+# Identifier-aware: "SOP-1234", "PN-0042-17", "QC-12" and "3.2.1" stay whole
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-_./:][a-z0-9]+)*")
+_SUBTOKEN = re.compile(r"[-_./:]")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were "
+    "will with what which who how do does can should must all any".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms; compound identifiers are indexed whole and by their parts"""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        tokens.append(token)
+        if _SUBTOKEN.search(token):
+            tokens.extend(part for part in _SUBTOKEN.split(token) if part not in _STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    """
+    Persistent BM25 inverted index over chunk texts, kept next to the vector collection.
+
+    Postings live in a clustered SQLite table keyed by (term, doc), which
+    takes incremental adds and removes. For scoring, each query term's
+    posting list is also kept packed as numpy arrays (doc ids, term
+    frequencies, doc lengths) in a `packed` table, built on first use and
+    dropped whenever the term's postings change, so every term is scored
+    exactly and vectorized however common it is. Decoded lists of recently
+    used terms stay in memory, up to cache_postings postings in total.
+
+    Values of the metadata fields in facet_fields are indexed as well, so a
+    search can be restricted to e.g. one file or file type inside the index.
+    """
+
+    def __init__(self, index_path: Optional[str] = None, k1: float = 1.5, b: float = 0.75,
+                 cache_postings: int = 5_000_000, facet_fields: Sequence[str] = ()):
+        self.k1 = k1
+        self.b = b
+        self.cache_postings = cache_postings
+        self.facet_fields = tuple(facet_fields)
+        self._lock = threading.Lock()
+        # term -> [docs, tfs, lengths, avg length, BM25 tf weights at that avg length, max weight];
+        # total size bounded by cache_postings
+        self._postings_cache: "OrderedDict[str, list]" = OrderedDict()
+        self._cached_postings = 0
+        self._conn = sqlite3.connect(index_path or ":memory:", timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            "doc INTEGER PRIMARY KEY, chunk_id TEXT UNIQUE NOT NULL, length INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            "term TEXT NOT NULL, doc INTEGER NOT NULL, tf INTEGER NOT NULL, length INTEGER NOT NULL, "
+            "PRIMARY KEY (term, doc)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings(doc)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS facets ("
+            "field TEXT NOT NULL, value TEXT NOT NULL, doc INTEGER NOT NULL, "
+            "PRIMARY KEY (field, value, doc)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_facets_doc ON facets(doc)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS packed ("
+            "term TEXT PRIMARY KEY, docs BLOB NOT NULL, tfs BLOB NOT NULL, lengths BLOB NOT NULL) WITHOUT ROWID"
+        )
+        # Counts content changes (add/remove/clear) by any process; packing
+        # postings for a search is not a change
+        self._conn.execute("CREATE TABLE IF NOT EXISTS generation (id INTEGER PRIMARY KEY CHECK (id = 0), value INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO generation (id, value) VALUES (0, 0)")
+        self._conn.commit()
+        self._load_totals()
+
+    def _load_totals(self):
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self.doc_count, self.total_length = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs"
+        ).fetchone()
+        self._generation = self._conn.execute("SELECT value FROM generation").fetchone()[0]
+
+    def _refresh(self):
+        """Pick up writes committed by another process (e.g. the sync script)"""
+        if self._conn.execute("PRAGMA data_version").fetchone()[0] != self._data_version:
+            self._load_totals()
+            self._postings_cache.clear()
+            self._cached_postings = 0
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    @property
+    def generation(self) -> int:
+        """Changes whenever chunks are added, removed or cleared, also by another process"""
+        with self._lock:
+            self._refresh()
+            return self._generation
+
+    def _bump_generation(self):
+        self._conn.execute("UPDATE generation SET value = value + 1")
+        self._generation = self._conn.execute("SELECT value FROM generation").fetchone()[0]
+
+    @property
+    def missing_facets(self) -> bool:
+        """True for an index built before facet fields were stored (needs a rebuild)"""
+        return bool(self.facet_fields and self.doc_count and
+                    not self._conn.execute("SELECT 1 FROM facets LIMIT 1").fetchone())
+
+    def add(self, chunk_ids: List[str], texts: List[str], metadatas: Optional[List[dict]] = None):
+        """Index chunks (re-indexing any chunk id that is already present)"""
+        with self._lock:
+            self._refresh()
+            self._remove_locked(chunk_ids)
+            df = Counter()
+            postings = []
+            facets = []
+            for i, (chunk_id, text) in enumerate(zip(chunk_ids, texts)):
+                counts = Counter(tokenize(text))
+                length = sum(counts.values())
+                doc = self._conn.execute(
+                    "INSERT INTO docs (chunk_id, length) VALUES (?, ?)", (chunk_id, length)
+                ).lastrowid
+                postings.extend((term, doc, tf, length) for term, tf in counts.items())
+                metadata = metadatas[i] if metadatas else {}
+                facets.extend(
+                    (field, str(metadata[field]), doc) for field in self.facet_fields if metadata.get(field) is not None
+                )
+                df.update(counts.keys())
+                self.doc_count += 1
+                self.total_length += length
+            self._conn.executemany(
+                "INSERT INTO postings (term, doc, tf, length) VALUES (?, ?, ?, ?)", postings
+            )
+            self._conn.executemany(
+                "INSERT INTO terms (term, df) VALUES (?, ?) "
+                "ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+                df.items()
+            )
+            self._invalidate_terms(df.keys())
+            self._conn.executemany("INSERT OR IGNORE INTO facets (field, value, doc) VALUES (?, ?, ?)", facets)
+            self._bump_generation()
+            self._conn.commit()
+
+    def remove(self, chunk_ids: List[str]):
+        with self._lock:
+            self._refresh()
+            self._remove_locked(chunk_ids)
+            self._bump_generation()
+            self._conn.commit()
+
+    def _remove_locked(self, chunk_ids: Iterable[str]):
+        chunk_ids = list(chunk_ids)
+        for start in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[start:start + 500]
+            rows = self._conn.execute(
+                f"SELECT doc, length FROM docs WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            for doc, length in rows:
+                terms = self._conn.execute("SELECT term FROM postings WHERE doc = ?", (doc,)).fetchall()
+                self._conn.executemany("UPDATE terms SET df = df - 1 WHERE term = ?", terms)
+                self._conn.executemany("DELETE FROM terms WHERE term = ? AND df <= 0", terms)
+                self._invalidate_terms(term for (term,) in terms)
+                self._conn.execute("DELETE FROM postings WHERE doc = ?", (doc,))
+                self._conn.execute("DELETE FROM facets WHERE doc = ?", (doc,))
+                self._conn.execute("DELETE FROM docs WHERE doc = ?", (doc,))
+                self.doc_count -= 1
+                self.total_length -= length
+
+    def _invalidate_terms(self, terms: Iterable[str]):
+        """Drop packed and cached posting lists of terms whose postings changed"""
+        terms = list(terms)
+        self._conn.executemany("DELETE FROM packed WHERE term = ?", [(term,) for term in terms])
+        for term in terms:
+            cached = self._postings_cache.pop(term, None)
+            if cached is not None:
+                self._cached_postings -= len(cached[0])
+
+    def _postings(self, term: str, avg_length: float) -> Tuple[np.ndarray, np.ndarray, float]:
+        """
+        (doc ids, BM25 tf weights, max weight) of a term; the weights are
+        tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_length)), so a
+        doc's score is the sum of idf * weight over the query terms.
+        """
+        entry = self._postings_cache.get(term)
+        if entry is not None:
+            self._postings_cache.move_to_end(term)
+        else:
+            entry = [*self._load_postings(term), None, None, 0.0]
+            if len(entry[0]) <= self.cache_postings:
+                self._postings_cache[term] = entry
+                self._cached_postings += len(entry[0])
+                while self._cached_postings > self.cache_postings:
+                    _, evicted = self._postings_cache.popitem(last=False)
+                    self._cached_postings -= len(evicted[0])
+        docs, tfs, lengths, weighted_at, weights, max_weight = entry
+        if weighted_at != avg_length:
+            weights = tfs * (self.k1 + 1) / (tfs + self.k1 * (1 - self.b + self.b / avg_length * lengths))
+            max_weight = float(weights.max()) if len(weights) else 0.0
+            entry[3:] = avg_length, weights, max_weight
+        return docs, weights, max_weight
+
+    def _load_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(doc ids, term frequencies, doc lengths) from the packed table, packing the postings if needed"""
+        row = self._conn.execute("SELECT docs, tfs, lengths FROM packed WHERE term = ?", (term,)).fetchone()
+        if row is None:
+            # Pack under the write lock, so a concurrent writer can't change the
+            # postings between reading them and storing the packed copy
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute("SELECT doc, tf, length FROM postings WHERE term = ?", (term,)).fetchall()
+                packed = np.array(rows, dtype=np.int64).reshape(-1, 3).T
+                row = (packed[0].astype(np.int32).tobytes(), packed[1].astype(np.float32).tobytes(),
+                       packed[2].astype(np.float32).tobytes())
+                self._conn.execute("INSERT OR REPLACE INTO packed (term, docs, tfs, lengths) VALUES (?, ?, ?, ?)",
+                                   (term, *row))
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            # Our own commit doesn't change data_version
+        return (np.frombuffer(row[0], dtype=np.int32), np.frombuffer(row[1], dtype=np.float32),
+                np.frombuffer(row[2], dtype=np.float32))
+
+    def facet_values(self, field: str) -> List[str]:
+        """Distinct indexed values of a facet field"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT value FROM facets WHERE field = ? ORDER BY value", (field,)
+            )]
+
+    def _filtered_docs(self, filters: Optional[Dict[str, List]]) -> Optional[np.ndarray]:
+        """Sorted doc ids matching every filtered field (None = no filter)"""
+        if not filters:
+            return None
+        docs = None
+        for field, values in filters.items():
+            if field not in self.facet_fields:
+                raise ValueError(f"Cannot filter on {field!r} (indexed fields: {', '.join(self.facet_fields)})")
+            matched = np.array([doc for (doc,) in self._conn.execute(
+                f"SELECT doc FROM facets WHERE field = ? AND value IN ({','.join('?' * len(values))})",
+                [field, *map(str, values)]
+            )], dtype=np.int32)
+            docs = matched if docs is None else np.intersect1d(docs, matched)
+        return np.unique(docs)
+
+    def search(self, query: str, k: int = 10, filters: Optional[Dict[str, List]] = None) -> List[Tuple[str, float]]:
+        """Top-k (chunk_id, BM25 score) for a query, optionally only among chunks matching filters"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            self._refresh()
+            if not self.doc_count:
+                return []
+            placeholders = ",".join("?" * len(terms))
+            df = dict(self._conn.execute(f"SELECT term, df FROM terms WHERE term IN ({placeholders})", terms))
+            allowed = self._filtered_docs(filters)
+            avg_length = self.total_length / self.doc_count or 1.0
+            matches = []
+            for term, term_df in df.items():
+                docs, weights, max_weight = self._postings(term, avg_length)
+                if allowed is not None:
+                    keep = np.isin(docs, allowed, assume_unique=True)
+                    docs, weights = docs[keep], weights[keep]
+                if len(docs):
+                    idf = math.log(1 + (self.doc_count - term_df + 0.5) / (term_df + 0.5))
+                    matches.append((docs, weights, np.float32(idf), idf * max_weight))
+            if not matches:
+                return []
+            docs, scores = self._top_docs(matches, k)
+            order = np.lexsort((docs, -scores))
+            top = [(int(docs[i]), float(scores[i])) for i in order]
+            chunk_ids = dict(self._conn.execute(
+                f"SELECT doc, chunk_id FROM docs WHERE doc IN ({','.join('?' * len(top))})",
+                [doc for doc, _ in top]
+            ))
+        return [(chunk_ids[doc], score) for doc, score in top]
+
+    @staticmethod
+    def _top_docs(matches: List[Tuple[np.ndarray, np.ndarray, np.float32, float]], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Best k (docs, scores) over (docs, weights, idf, max score) per term, exact.
+
+        MaxScore pruning: terms are added highest max score first into a dense
+        accumulator. Once the k-th best total so far exceeds what all remaining
+        terms could add together, no unseen doc can reach the top k, so the
+        remaining (low-idf, long) posting lists are only probed for the docs
+        still in contention instead of being scanned.
+        """
+        matches = sorted(matches, key=lambda match: -match[3])
+        remaining = sum(match[3] for match in matches)
+        totals = np.zeros(max(int(docs[-1]) for docs, *_ in matches) + 1, dtype=np.float32)
+        # Docs scored so far, tracked while that is cheaper than a dense pass
+        seen = np.zeros(0, dtype=np.int32)
+        candidates = scores = None
+        for docs, weights, idf, max_score in matches:
+            remaining -= max_score
+            if candidates is not None:
+                positions = np.minimum(np.searchsorted(docs, candidates), len(docs) - 1)
+                hit = docs[positions] == candidates
+                scores[hit] += idf * weights[positions[hit]]
+                continue
+            # Each doc appears once per term, so this needs no scatter-add
+            totals[docs] += idf * weights
+            if seen is None or remaining <= 0:
+                continue
+            if len(seen) + len(docs) > len(totals) // 8:
+                seen = None
+                continue
+            # Union of two sorted runs: a stable (merge) sort is linear here
+            seen = np.concatenate([seen, docs])
+            seen.sort(kind='stable')
+            seen = seen[np.concatenate([[True], seen[1:] != seen[:-1]])]
+            if seen is not None and len(seen) > k:
+                current = totals[seen]
+                threshold = np.partition(current, len(current) - k)[len(current) - k]
+                # Margin for float32 rounding; strict, so ties at the threshold are kept
+                reachable = remaining * (1 + 1e-5) + 1e-6
+                if reachable < threshold:
+                    candidates = seen[current + reachable >= threshold]
+                    scores = totals[candidates]
+        if candidates is None:
+            # Every matched doc has a positive score
+            candidates = np.flatnonzero(totals)
+            scores = totals[candidates]
+        if k < len(candidates):
+            best = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[best], scores[best]
+        return candidates, scores
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM terms")
+            self._conn.execute("DELETE FROM facets")
+            self._conn.execute("DELETE FROM docs")
+            self._conn.execute("DELETE FROM packed")
+            self._bump_generation()
+            self._conn.commit()
+            self.doc_count, self.total_length = 0, 0
+            self._postings_cache.clear()
+            self._cached_postings = 0
@@ -1,14 +1,24 @@
 from vector_store import VectorStore
-import chromadb
 from collections import Counter
+from dotenv import load_dotenv
+from near_duplicate import NearDuplicateIndex
+import os
 
-# Initialize
-vs = VectorStore()
-client = chromadb.PersistentClient(path='./chroma_db')
-coll = client.get_collection('sop-knowledge')
+load_dotenv()
+
+# Initialize with the app's storage settings, so this inspects the index the app reads
+vs = VectorStore(os.getenv('CHROMA_PATH', './chroma_db'),
+                 os.getenv('COLLECTION_NAME', 'sop-knowledge'),
+                 os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2'),
+                 near_duplicate_threshold=None,
+                 vector_backend=os.getenv('VECTOR_BACKEND', 'chroma'),
+                 vector_dtype=os.getenv('VECTOR_DTYPE', 'float16'),
+                 ivf_nprobe=int(os.getenv('IVF_NPROBE', '16')),
+                 vector_shards=int(os.getenv('VECTOR_SHARDS', '1')),
+                 shard_by=os.getenv('SHARD_BY', 'source'))
 
 # Get all documents
-results = coll.get()
+results = vs.backend.get()
 
 print(f"Total embeddings in vector store: {len(results['ids'])}")
 print(f"\nDocuments by source file:")
@@ -34,3 +44,14 @@ if len(documents) != len(unique_docs):
     for i, (content, count) in enumerate(sorted(duplicates, key=lambda x: x[1], reverse=True)[:5], 1):
         print(f"\n{i}. Appears {count} times:")
         print(f"   {content[:150]}...")
+
+# Check for near-duplicate content (revised SOPs that differ by a date, header, ...)
+print(f"\n\n🔍 Checking for near-duplicate content...")
+near_index = NearDuplicateIndex(threshold=0.8)
+file_names = {chunk_id: m.get('file_name', 'Unknown') for chunk_id, m in zip(results['ids'], results['metadatas'])}
+_, near_duplicates = near_index.check_and_add(results['ids'], documents)
+print(f"Near-duplicate chunks (estimated Jaccard ≥ {near_index.threshold}): {len(near_duplicates)}")
+
+for i, item in enumerate(sorted(near_duplicates, key=lambda x: x['similarity'], reverse=True)[:5], 1):
+    print(f"\n{i}. {file_names[item['chunk_id']]} ≈ {file_names[item['duplicate_of']]} "
+          f"(similarity {item['similarity']:.2f})")
@@ -1,106 +1,446 @@
 # document_processor.py
 import os
+import re
 import json
+import io
+import hashlib
+import threading
+import multiprocessing
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import chain, islice
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Iterable, Union, BinaryIO
 import PyPDF2
 from docx import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document as LangchainDocument
 
-class DocumentProcessor:
+
+# A document can be read from a path, raw bytes or a binary file-like object
+DocumentSource = Union[str, bytes, BinaryIO]
+
+
+def _as_binary_stream(source: DocumentSource):
+    """Binary stream for a document source (caller closes it if it came from a path)"""
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, 'rb')
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return source
+
+
+def compute_file_hash(file_path: str, block_size: int = 1 << 20) -> str:
+    """Compute SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_chunk_uid(source: str, index: int, text: str) -> str:
+    """Deterministic chunk id: the same source, position and text always map to the same id"""
+    return hashlib.sha1(f"{source}\x00{index}\x00{text}".encode('utf-8')).hexdigest()
+
+
+class OffsetTextSplitter:
+    """
+    Single-pass splitter with RecursiveCharacterTextSplitter's chunk_size /
+    chunk_overlap semantics that reports where each chunk sits in the source.
+
+    Each chunk is at most chunk_size characters and ends at the strongest
+    available separator (paragraph, then line, then word, else a hard cut).
+    The next chunk starts at a word boundary no more than chunk_overlap
+    characters before the previous end. Chunks are slices of the source
+    text, so text[start:end] == chunk.
+    """
+
+    SEPARATORS = ("\n\n", "\n", " ")
+
     def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-        )
+
+    def split_text_with_offsets(self, text: str) -> List[Tuple[int, int]]:
+        """Return (start, end) offsets of each chunk in text"""
+        spans = []
+        length = len(text)
+        pos = _skip_whitespace(text, 0, length)
+        
+        while pos < length:
+            if length - pos <= self.chunk_size:
+                end = length
+            else:
+                window_end = pos + self.chunk_size
+                # Never break inside the overlap region, so every chunk moves forward
+                earliest = pos + self.chunk_overlap + 1
+                end = window_end
+                for separator in self.SEPARATORS:
+                    index = text.rfind(separator, earliest, window_end)
+                    if index != -1:
+                        end = index
+                        break
+            
+            chunk_end = end
+            while chunk_end > pos and text[chunk_end - 1].isspace():
+                chunk_end -= 1
+            if chunk_end > pos:
+                spans.append((pos, chunk_end))
+            if end >= length:
+                break
+            
+            # Start the next chunk at the first word boundary inside the overlap window
+            next_pos = max(end - self.chunk_overlap, pos + 1)
+            if next_pos < end and not text[next_pos - 1].isspace():
+                boundary = _WHITESPACE.search(text, next_pos, end)
+                if boundary:
+                    next_pos = boundary.end()
+            pos = _skip_whitespace(text, next_pos, length)
+        
+        return spans
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_text_with_offsets(text)]
+
+
+_WHITESPACE = re.compile(r'\s')
+
+
+def _skip_whitespace(text: str, pos: int, length: int) -> int:
+    while pos < length and text[pos].isspace():
+        pos += 1
+    return pos
+
+
+class DocumentProcessor:
+    SUPPORTED_EXTENSIONS = {'.pdf', '.docx', '.txt'}
+    # Starting worker processes costs seconds (interpreter + imports), far more
+    # than extracting a few files in-process, so small batches skip the pool
+    # unless it is already running
+    POOL_MIN_FILES = 8
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, max_workers: int = 1,
+                 splitter: str = "offset"):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.max_workers = max_workers
+        self.splitter = splitter
+        self.failed_files: Dict[str, str] = {}
+        # Extraction pool, started on first use and reused until close()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_workers = 0
+        self._pool_lock = threading.Lock()
+        if splitter == "offset":
+            self.text_splitter = OffsetTextSplitter(chunk_size, chunk_overlap)
+        elif splitter == "recursive":
+            self.text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                length_function=len,
+            )
+        else:
+            raise ValueError(f"Unknown splitter: {splitter} (expected 'offset' or 'recursive')")
     
-    def extract_text_from_pdf(self, file_path: str) -> str:
-        """Extract text from PDF file"""
-        text = ""
+    @property
+    def chunking_config(self) -> Dict[str, Any]:
+        """Settings that determine how a file is split (recorded in the ingestion manifest)"""
+        return {"chunk_size": self.chunk_size, "chunk_overlap": self.chunk_overlap, "splitter": self.splitter}
+    
+    def iter_pdf_pages(self, file_path: DocumentSource, raise_errors: bool = False) -> Iterator[Tuple[int, str]]:
+        """Stream (page_number, text) from a PDF one page at a time (1-based page numbers)"""
         try:
-            with open(file_path, 'rb') as file:
+            file = _as_binary_stream(file_path)
+            try:
                 reader = PyPDF2.PdfReader(file)
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
+                for page_number, page in enumerate(reader.pages, 1):
+                    yield page_number, page.extract_text() or ""
+            finally:
+                if isinstance(file_path, (str, os.PathLike)):
+                    file.close()
         except Exception as e:
+            if raise_errors:
+                raise
             print(f"Error reading PDF {file_path}: {e}")
-        return text
     
-    def extract_text_from_docx(self, file_path: str) -> str:
+    def extract_text_from_pdf(self, file_path: DocumentSource, raise_errors: bool = False) -> str:
+        """Extract text from PDF file"""
+        return "".join(text + "\n" for _, text in self.iter_pdf_pages(file_path, raise_errors))
+    
+    def extract_text_from_docx(self, file_path: DocumentSource, raise_errors: bool = False) -> str:
         """Extract text from DOCX file"""
         text = ""
         try:
-            doc = Document(file_path)
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
+            doc = Document(io.BytesIO(file_path) if isinstance(file_path, (bytes, bytearray)) else file_path)
+            text = "".join(paragraph.text + "\n" for paragraph in doc.paragraphs)
         except Exception as e:
+            if raise_errors:
+                raise
             print(f"Error reading DOCX {file_path}: {e}")
         return text
     
-    def extract_text_from_txt(self, file_path: str) -> str:
+    def extract_text_from_txt(self, file_path: DocumentSource, raise_errors: bool = False) -> str:
         """Extract text from TXT file"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
+            if isinstance(file_path, (str, os.PathLike)):
+                with open(file_path, 'r', encoding='utf-8') as file:
+                    return file.read()
+            data = file_path if isinstance(file_path, (bytes, bytearray)) else file_path.read()
+            return data.decode('utf-8')
         except Exception as e:
+            if raise_errors:
+                raise
             print(f"Error reading TXT {file_path}: {e}")
             return ""
     
-    def process_document(self, file_path: str) -> List[LangchainDocument]:
-        """Process single document and return chunks"""
-        file_extension = Path(file_path).suffix.lower()
+    def process_document(self, file_path: DocumentSource, raise_errors: bool = False,
+                         file_name: Optional[str] = None) -> List[LangchainDocument]:
+        """
+        Process single document and return chunks.
+
+        file_path may also be bytes or a binary file-like object (e.g. an upload),
+        in which case file_name is required and is used as the chunk source.
+        """
+        if not isinstance(file_path, (str, os.PathLike)):
+            if not file_name:
+                raise ValueError("file_name is required when processing in-memory documents")
+            source = file_name
+        else:
+            source = str(file_path)
+        file_extension = Path(source).suffix.lower()
         
-        # Extract text based on file type
+        # Extract text based on file type. PDFs are streamed page by page into
+        # the splitter so chunks can carry the pages they came from.
         if file_extension == '.pdf':
-            text = self.extract_text_from_pdf(file_path)
+            segments = self.iter_pdf_pages(file_path, raise_errors)
         elif file_extension == '.docx':
-            text = self.extract_text_from_docx(file_path)
+            segments = [(None, self.extract_text_from_docx(file_path, raise_errors))]
         elif file_extension == '.txt':
-            text = self.extract_text_from_txt(file_path)
+            segments = [(None, self.extract_text_from_txt(file_path, raise_errors))]
         else:
             print(f"Unsupported file type: {file_extension}")
             return []
         
-        if not text.strip():
-            return []
-        
-        # Split text into chunks
-        chunks = self.text_splitter.split_text(text)
-        
-        # Create LangchainDocument objects
+        # Split text into chunks and create LangchainDocument objects
         documents = []
-        for i, chunk in enumerate(chunks):
-            doc = LangchainDocument(
-                page_content=chunk,
-                metadata={
-                    "source": str(file_path),
-                    "chunk_id": i,
-                    "file_name": Path(file_path).name,
-                    "file_type": file_extension
-                }
-            )
-            documents.append(doc)
+        for i, (chunk, start, end, page_start, page_end) in enumerate(self._split_segments(segments)):
+            metadata = {
+                "source": source,
+                "chunk_id": i,
+                "chunk_uid": make_chunk_uid(source, i, chunk),
+                "file_name": Path(source).name,
+                "file_type": file_extension,
+                # Character span of the chunk in the extracted document text
+                "start_index": start,
+                "end_index": end
+            }
+            if page_start is not None:
+                metadata["page_start"] = page_start
+                metadata["page_end"] = page_end
+            documents.append(LangchainDocument(page_content=chunk, metadata=metadata))
         
         return documents
     
-    def process_folder(self, folder_path: str) -> List[LangchainDocument]:
-        """Process all documents in a folder"""
-        all_documents = []
-        supported_extensions = {'.pdf', '.docx', '.txt'}
+    def _split_segments(self, segments: Iterable[Tuple[Optional[int], str]]) -> Iterator[Tuple[str, int, int, Optional[int], Optional[int]]]:
+        """
+        Split a stream of (page_number, text) segments into
+        (chunk, start, end, page_start, page_end), with start/end offsets
+        into the concatenated document text.
+
+        Text is buffered only up to a window of a few chunks: once the window is
+        full, every chunk that cannot be affected by later text is emitted and the
+        buffer is cut at the start of the first pending chunk, which keeps the
+        splitter's overlap intact across window boundaries.
+        """
+        window = self.chunk_size * 8
+        buffer = ""
+        base = 0  # offset of buffer[0] in the whole document
+        page_marks: List[Tuple[int, Optional[int]]] = []  # (offset in buffer, page number)
+        
+        for page_number, text in segments:
+            page_marks.append((len(buffer), page_number))
+            buffer += text + "\n"
+            if len(buffer) >= window:
+                cut, page_marks = yield from self._drain_buffer(buffer, base, page_marks, final=False)
+                buffer = buffer[cut:]
+                base += cut
+        
+        if buffer.strip():
+            yield from self._drain_buffer(buffer, base, page_marks, final=True)
+    
+    def _chunk_spans(self, text: str) -> List[Tuple[int, int]]:
+        if isinstance(self.text_splitter, OffsetTextSplitter):
+            return self.text_splitter.split_text_with_offsets(text)
+        
+        # LangChain splitter: recover offsets by searching forward for each chunk
+        spans = []
+        search_from = 0
+        for chunk in self.text_splitter.split_text(text):
+            start = text.find(chunk, search_from)
+            if start < 0:
+                start = search_from
+            spans.append((start, start + len(chunk)))
+            search_from = start + 1
+        return spans
+    
+    def _drain_buffer(self, buffer: str, base: int, page_marks: List[Tuple[int, Optional[int]]], final: bool):
+        mark_offsets = [offset for offset, _ in page_marks]
+        
+        def page_at(offset: int) -> Optional[int]:
+            return page_marks[max(bisect_right(mark_offsets, offset) - 1, 0)][1]
         
+        # Chunks ending past this point may still change once more text arrives
+        safe_end = len(buffer) if final else len(buffer) - self.chunk_size
+        cut = len(buffer)
+        for start, end in self._chunk_spans(buffer):
+            if end > safe_end:
+                cut = start
+                break
+            yield buffer[start:end], base + start, base + end, page_at(start), page_at(end - 1)
+        
+        if final:
+            return len(buffer), []
+        
+        # Keep the page mark covering the cut plus every later one, rebased to the new buffer
+        first_mark = max(bisect_right(mark_offsets, cut) - 1, 0)
+        kept_marks = [(max(offset - cut, 0), page) for offset, page in page_marks[first_mark:]]
+        return cut, kept_marks
+    
+    def list_supported_files(self, folder_path: str) -> List[Path]:
+        """List supported documents in a folder (recursive, sorted for stable ordering)"""
         folder = Path(folder_path)
         if not folder.exists():
             folder.mkdir(parents=True, exist_ok=True)
             return []
         
-        for file_path in folder.rglob("*"):
-            if file_path.suffix.lower() in supported_extensions and file_path.is_file():
-                print(f"Processing: {file_path.name}")
-                documents = self.process_document(str(file_path))
-                all_documents.extend(documents)
+        return sorted(
+            file_path for file_path in folder.rglob("*")
+            if file_path.suffix.lower() in self.SUPPORTED_EXTENSIONS and file_path.is_file()
+        )
+    
+    def iter_process_files(self, file_paths: Iterable[Union[str, Tuple[str, bytes]]],
+                           max_workers: Optional[int] = None) -> Iterator[Tuple[str, List[LangchainDocument], Optional[str]]]:
+        """
+        Extract and chunk files lazily, in a process pool when max_workers > 1.
+
+        Items are file paths or in-memory (file_name, bytes) pairs such as uploads.
+        Yields (file_path or file_name, documents, error) per item in input order; a failing
+        file yields an error message instead of aborting the batch. At most
+        2 * max_workers files are in flight, so a slow consumer (e.g. the
+        embedding step) applies backpressure instead of chunks piling up in memory.
+        
+        Workers are spawned, not forked: the caller (e.g. the Streamlit server)
+        may have model warm-up threads holding locks that a forked child would
+        inherit held. Scripts using a pool need an `if __name__ == "__main__"` guard.
+        The pool is started once and kept for later calls; fewer than
+        POOL_MIN_FILES items are extracted in-process while no pool is running.
+        """
+        workers = max_workers if max_workers is not None else self.max_workers
+        items = iter(file_paths)
+        head = list(islice(items, self.POOL_MIN_FILES)) if workers and workers > 1 else []
+        
+        if len(head) < 2 or (len(head) < self.POOL_MIN_FILES and self._pool is None):
+            for file_path in chain(head, items):
+                yield _process_file(self, file_path)
+            return
+        
+        in_flight = deque()
+        for file_path in chain(head, items):
+            in_flight.append((_item_name(file_path), self._submit(workers, file_path)))
+            if len(in_flight) >= 2 * workers:
+                yield _future_result(*in_flight.popleft())
+        while in_flight:
+            yield _future_result(*in_flight.popleft())
+    
+    def _submit(self, workers: int, file_path: Union[str, Tuple[str, bytes]]):
+        with self._pool_lock:
+            if self._pool is None or self._pool_workers != workers:
+                if self._pool is not None:
+                    self._pool.shutdown(wait=False)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.chunk_size, self.chunk_overlap, self.splitter)
+                )
+                self._pool_workers = workers
+            pool = self._pool
+        try:
+            return pool.submit(_process_in_worker, file_path)
+        except BrokenProcessPool:
+            # A worker died (e.g. a crash inside a PDF parser): start a fresh pool
+            with self._pool_lock:
+                if self._pool is pool:
+                    self._pool = None
+            return self._submit(workers, file_path)
+    
+    def close(self):
+        """Stop the extraction worker processes (a later parallel call starts new ones)"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+    
+    def process_files(self, file_paths: List[Union[str, Tuple[str, bytes]]],
+                      max_workers: Optional[int] = None) -> List[Tuple[str, List[LangchainDocument], Optional[str]]]:
+        """Extract and chunk several files; see iter_process_files"""
+        return list(self.iter_process_files(file_paths, max_workers))
+    
+    def process_folder(self, folder_path: str, max_workers: Optional[int] = None) -> List[LangchainDocument]:
+        """Process all documents in a folder (files are extracted in parallel when max_workers > 1)"""
+        all_documents = []
+        self.failed_files = {}
+        
+        file_paths = [str(file_path) for file_path in self.list_supported_files(folder_path)]
+        for file_path, documents, error in self.iter_process_files(file_paths, max_workers):
+            if error:
+                self.failed_files[file_path] = error
+                print(f"❌ Failed: {Path(file_path).name}: {error}")
+                continue
+            print(f"Processed: {Path(file_path).name} ({len(documents)} chunks)")
+            all_documents.extend(documents)
+        
+        if self.failed_files:
+            print(f"⚠️ {len(self.failed_files)} file(s) could not be processed")
         
         return all_documents
+
+
+def _item_name(item: Union[str, Tuple[str, bytes]]) -> str:
+    return item[0] if isinstance(item, tuple) else item
+
+
+def _process_file(processor: DocumentProcessor, item: Union[str, Tuple[str, bytes]]) -> Tuple[str, List[LangchainDocument], Optional[str]]:
+    try:
+        if isinstance(item, tuple):
+            file_name, data = item
+            return file_name, processor.process_document(data, raise_errors=True, file_name=file_name), None
+        return item, processor.process_document(item, raise_errors=True), None
+    except Exception as e:
+        return _item_name(item), [], f"{type(e).__name__}: {e}"
+
+
+def _future_result(file_path: str, future) -> Tuple[str, List[LangchainDocument], Optional[str]]:
+    try:
+        return future.result()
+    except Exception as e:
+        # e.g. a worker killed by a crash inside a PDF parser
+        return file_path, [], f"{type(e).__name__}: {e}"
+
+
+# Per-process state for the extraction pool: each worker builds its own
+# processor (and splitter) once instead of unpickling one per file
+_worker_processor: Optional[DocumentProcessor] = None
+
+
+def _init_worker(chunk_size: int, chunk_overlap: int, splitter: str):
+    global _worker_processor
+    _worker_processor = DocumentProcessor(chunk_size, chunk_overlap, splitter=splitter)
+
+
+def _process_in_worker(file_path: Union[str, Tuple[str, bytes]]) -> Tuple[str, List[LangchainDocument], Optional[str]]:
+    return _process_file(_worker_processor, file_path)
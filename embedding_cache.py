@@ -0,0 +1,126 @@
+# embedding_cache.py
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from typing import List, Optional
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by embedding model + normalized chunk hash.
+
+    Backed by a single SQLite file so it survives clear_collection() and
+    rebuilds. When the stored vectors exceed max_size_mb, the least recently
+    used entries are evicted.
+    """
+
+    def __init__(self, cache_dir: str, model_key: str, max_size_mb: int = 512):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_path = os.path.join(cache_dir, "embeddings.sqlite")
+        self.model_key = model_key
+        self.max_bytes = max_size_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self.total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Whitespace-insensitive form of a chunk used for hashing"""
+        return re.sub(r'\s+', ' ', text).strip()
+
+    def _key(self, text: str) -> str:
+        payload = f"{self.model_key}\x00{self.normalize(text)}"
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Look up embeddings; None for texts not in the cache"""
+        keys = [self._key(text) for text in texts]
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+
+        results = []
+        for key in keys:
+            blob = found.get(key)
+            if blob is None:
+                results.append(None)
+                continue
+            vector = array('f')
+            vector.frombytes(blob)
+            results.append(vector.tolist())
+        self.hits += len(texts) - results.count(None)
+        self.misses += results.count(None)
+        return results
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]):
+        """Store embeddings, evicting least recently used entries if over budget"""
+        now = time.time()
+        rows = [(self._key(text), array('f', vector).tobytes(), now) for text, vector in zip(texts, vectors)]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+            self.total_bytes += sum(len(blob) for _, blob, _ in rows)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used vectors until the cache is at 90% of its budget"""
+        self.total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+        target = int(self.max_bytes * 0.9)
+        if self.total_bytes <= target:
+            return
+        freed = 0
+        stale_keys = []
+        for key, size in self._conn.execute(
+            "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used ASC"
+        ):
+            if self.total_bytes - freed <= target:
+                break
+            stale_keys.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", stale_keys)
+        self._conn.commit()
+        self.total_bytes -= freed
+        print(f"🧹 Embedding cache: evicted {len(stale_keys)} entries")
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size_mb": self.total_bytes / (1024 * 1024),
+        }
+
@@ -0,0 +1,273 @@
+# ingestion.py
+import os
+import json
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable, Tuple
+from document_processor import DocumentProcessor, compute_file_hash
+
+class IngestionManifest:
+    """
+    Persisted record of what has been ingested:
+    absolute file path -> size / mtime / content hash / chunking settings -> chunk ids
+
+    Lets a folder re-sync skip unchanged files and delete the chunks
+    of files that changed or disappeared, or were split with other settings.
+    """
+
+    def __init__(self, manifest_path: str):
+        self.manifest_path = manifest_path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.load()
+
+    def load(self):
+        """Load manifest from disk (missing or unreadable manifest = empty)"""
+        if not os.path.exists(self.manifest_path):
+            self.entries = {}
+            return
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as file:
+                self.entries = json.load(file).get("files", {})
+        except Exception as e:
+            print(f"⚠️ Could not read ingestion manifest {self.manifest_path}: {e}")
+            self.entries = {}
+
+    def save(self):
+        """Atomically write manifest to disk"""
+        directory = os.path.dirname(self.manifest_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({"version": 1, "files": self.entries}, file, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def get(self, file_path: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(file_path)
+
+    def set(self, file_path: str, entry: Dict[str, Any]):
+        self.entries[file_path] = entry
+
+    def remove(self, file_path: str) -> Optional[Dict[str, Any]]:
+        return self.entries.pop(file_path, None)
+
+    def requeue_chunks(self, chunk_ids: List[str]) -> List[str]:
+        """
+        Drop chunk ids from their files' entries and invalidate those files'
+        fingerprints, so the next sync re-processes them and re-adds the chunks.
+        Returns the affected file paths.
+        """
+        if not chunk_ids:
+            return []
+        chunk_ids = set(chunk_ids)
+        affected = []
+        for file_path, entry in self.entries.items():
+            if chunk_ids.intersection(entry["chunk_ids"]):
+                entry["chunk_ids"] = [chunk_id for chunk_id in entry["chunk_ids"] if chunk_id not in chunk_ids]
+                entry.update(size=-1, mtime_ns=-1, content_hash="")
+                affected.append(file_path)
+        return affected
+
+    def clear(self):
+        """Forget everything (used when the collection is wiped)"""
+        self.entries = {}
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+
+
+class _BatchWriter:
+    """
+    Upserts chunks in fixed-size batches and commits a file's manifest
+    entry only once every one of its chunks has been written.
+
+    The manifest file is rewritten at most every save_interval seconds (the
+    caller saves once more at the end): each save writes every entry, so
+    saving per batch would make a large first sync quadratic. A crash loses
+    at most that much bookkeeping; those files are re-processed, and their
+    chunks re-upserted under the same ids, on the next sync.
+    """
+
+    def __init__(self, vector_store, manifest: IngestionManifest, batch_size: int, stats: Dict[str, Any],
+                 save_interval: float = 30.0):
+        self.vector_store = vector_store
+        self.manifest = manifest
+        self.batch_size = max(1, batch_size)
+        self.stats = stats
+        self.save_interval = save_interval
+        self.last_save = time.monotonic()
+        self.buffer: List = []
+        self.enqueued = 0   # chunks handed to the writer so far
+        self.written = 0    # chunks flushed (successfully or not) so far
+        # (key, file_path, entry, stat_name, first_chunk, end_chunk) awaiting their last flush
+        self.waiting: List[Tuple[str, str, Dict[str, Any], str, int, int]] = []
+        self.failed_ranges: List[Tuple[int, int]] = []
+
+    def add_file(self, key: str, file_path: str, documents: List, entry: Dict[str, Any], stat_name: str):
+        first = self.enqueued
+        self.buffer.extend(documents)
+        self.enqueued += len(documents)
+        self.waiting.append((key, file_path, entry, stat_name, first, self.enqueued))
+        self.flush()
+
+    def flush(self, final: bool = False):
+        while len(self.buffer) >= self.batch_size or (final and self.buffer):
+            batch = self.buffer[:self.batch_size]
+            del self.buffer[:self.batch_size]
+            if self.vector_store.add_documents(batch):
+                skipped = len(self.vector_store.last_skipped_duplicates)
+                self.stats["chunks_added"] += len(batch) - skipped
+                self.stats["chunks_skipped"] += skipped
+            else:
+                self.failed_ranges.append((self.written, self.written + len(batch)))
+            self.written += len(batch)
+        self._commit_finished()
+
+    def _commit_finished(self):
+        still_waiting = []
+        for key, file_path, entry, stat_name, first, end in self.waiting:
+            if end > self.written:
+                still_waiting.append((key, file_path, entry, stat_name, first, end))
+                continue
+            if any(first < failed_end and failed_start < end for failed_start, failed_end in self.failed_ranges):
+                # Leave the manifest untouched so the file is retried next sync
+                self.stats["failed_files"][file_path] = "could not add chunks to vector store"
+                continue
+            self.manifest.set(key, entry)
+            self.stats[stat_name] += 1
+        if len(still_waiting) != len(self.waiting) and time.monotonic() - self.last_save >= self.save_interval:
+            self.manifest.save()
+            self.last_save = time.monotonic()
+        self.waiting = still_waiting
+
+
+def _file_key(file_path: Path) -> str:
+    return str(file_path.resolve())
+
+
+def _is_under(file_key: str, folder_key: str) -> bool:
+    return file_key == folder_key or file_key.startswith(folder_key.rstrip(os.sep) + os.sep)
+
+
+def sync_folder(doc_processor: DocumentProcessor, vector_store, folder_path: str,
+                batch_size: int = 256,
+                progress_callback: Optional[Callable[[int, int], None]] = None,
+                manifest_save_interval: float = 30.0) -> Dict[str, Any]:
+    """
+    Incrementally sync a folder into the vector store.
+
+    Only new or changed files are extracted and embedded; chunks of changed
+    and removed files are deleted. Unchanged files are detected from size/mtime
+    first and only hashed when those differ. Files chunked with a different
+    chunk size, overlap or splitter than the processor's count as changed.
+
+    progress_callback(done, total) is called after each new/changed file.
+    The manifest is saved every manifest_save_interval seconds and at the end.
+    """
+    manifest = vector_store.manifest
+    folder_key = _file_key(Path(folder_path))
+    chunking = doc_processor.chunking_config
+    stats = {
+        "added_files": 0,
+        "updated_files": 0,
+        "removed_files": 0,
+        "unchanged_files": 0,
+        "failed_files": {},
+        "chunks_added": 0,
+        "chunks_skipped": 0,
+        "chunks_deleted": 0,
+    }
+
+    try:
+        file_paths = doc_processor.list_supported_files(folder_path)
+        seen = {_file_key(file_path) for file_path in file_paths}
+
+        # Files that disappeared from this folder. Done first so that files
+        # whose chunks were skipped as near-duplicates of a removed file are
+        # re-indexed in this same run.
+        removed = [key for key in list(manifest.entries) if _is_under(key, folder_key) and key not in seen]
+        for key in removed:
+            entry = manifest.get(key)
+            if entry["chunk_ids"] and not vector_store.delete_documents(entry["chunk_ids"]):
+                continue
+            manifest.remove(key)
+            stats["chunks_deleted"] += len(entry["chunk_ids"])
+            stats["removed_files"] += 1
+        manifest.requeue_chunks(vector_store.pop_orphaned_duplicates())
+
+        # Pass 1: find new/changed files (cheap stat check, hash only on mismatch)
+        pending = []
+        for file_path in file_paths:
+            key = _file_key(file_path)
+            stat = file_path.stat()
+            entry = manifest.get(key)
+            same_chunking = entry is not None and entry.get("chunking") == chunking
+
+            if same_chunking and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                stats["unchanged_files"] += 1
+                continue
+
+            content_hash = compute_file_hash(str(file_path))
+            if same_chunking and entry["content_hash"] == content_hash:
+                # Touched but not modified - just refresh the stat fingerprint
+                entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                stats["unchanged_files"] += 1
+                continue
+
+            pending.append((key, str(file_path), stat, entry, content_hash))
+
+        # Pass 2: stream extract -> split -> embed/upsert for only those files.
+        # Extraction runs ahead by a bounded number of files; chunks are flushed
+        # to the store in fixed-size batches, so memory stays flat and chunks
+        # become searchable while the sync is still running.
+        writer = _BatchWriter(vector_store, manifest, batch_size, stats, manifest_save_interval)
+        results = doc_processor.iter_process_files(file_path for _, file_path, _, _, _ in pending)
+        for done, ((key, file_path, stat, entry, content_hash), (_, documents, error)) in enumerate(zip(pending, results), 1):
+            if error:
+                # Leave the manifest untouched so the file is retried next sync
+                stats["failed_files"][file_path] = error
+                print(f"❌ Failed: {Path(file_path).name}: {error}")
+            else:
+                print(f"Processed: {Path(file_path).name} ({len(documents)} chunks)")
+                new_ids = [doc.metadata["chunk_uid"] for doc in documents]
+                old_ids = set(entry["chunk_ids"]) if entry else set()
+
+                # Chunk ids are deterministic, so chunks that survived the edit are kept as-is
+                new_id_set = set(new_ids)
+                stale_ids = [chunk_id for chunk_id in old_ids if chunk_id not in new_id_set]
+                fresh_docs = [doc for doc in documents if doc.metadata["chunk_uid"] not in old_ids]
+
+                if stale_ids and not vector_store.delete_documents(stale_ids):
+                    # The old entry still lists the stale ids, so leaving it in
+                    # place retries the delete (and this file) next sync
+                    stats["failed_files"][file_path] = "could not delete outdated chunks"
+                else:
+                    stats["chunks_deleted"] += len(stale_ids)
+                    writer.add_file(key, file_path, fresh_docs, {
+                        "size": stat.st_size,
+                        "mtime_ns": stat.st_mtime_ns,
+                        "content_hash": content_hash,
+                        "chunking": chunking,
+                        "chunk_ids": new_ids,
+                    }, "updated_files" if entry else "added_files")
+
+            if progress_callback:
+                progress_callback(done, len(pending))
+
+        writer.flush(final=True)
+
+        # Chunks that were only skipped as near-duplicates of chunks deleted
+        # during this run: their files are re-indexed on the next sync
+        requeued = manifest.requeue_chunks(vector_store.pop_orphaned_duplicates())
+        if requeued:
+            print(f"🔁 {len(requeued)} file(s) had near-duplicate chunks of deleted content; re-indexing on next sync")
+    finally:
+        manifest.save()
+
+    print(
+        f"Sync complete: {stats['added_files']} new, {stats['updated_files']} changed, "
+        f"{stats['removed_files']} removed, {stats['unchanged_files']} unchanged, "
+        f"{len(stats['failed_files'])} failed files "
+        f"(+{stats['chunks_added']} / -{stats['chunks_deleted']} chunks, "
+        f"{stats['chunks_skipped']} near-duplicates skipped)"
+    )
+    return stats
@@ -0,0 +1,143 @@
+# model_loader.py
+import time
+import threading
+from typing import Any, Callable, List, Optional
+from langchain_core.embeddings import Embeddings
+
+# encode() options that give queries a different prompt than documents
+_QUERY_PROMPT_KEYS = ("prompt", "prompt_name")
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    Query embeddings for several texts, equal to embed_query on each.
+
+    Models may provide embed_queries(texts) for this. A sentence-transformer
+    (HuggingFaceEmbeddings) without query-specific instructions, prompts or
+    encode options embeds queries exactly like documents, so it is batched
+    through embed_documents. Any other model gets one embed_query per text,
+    since its query and document embeddings may differ.
+    """
+    batched = getattr(embeddings, "embed_queries", None)
+    if batched is not None:
+        return batched(texts)
+    encode_kwargs = getattr(embeddings, "encode_kwargs", None)
+    query_encode_kwargs = getattr(embeddings, "query_encode_kwargs", None) or encode_kwargs
+    symmetric = (
+        isinstance(encode_kwargs, dict)
+        and query_encode_kwargs == encode_kwargs
+        and not any(key in encode_kwargs for key in _QUERY_PROMPT_KEYS)
+        and not getattr(embeddings, "query_instruction", None)
+        and not getattr(embeddings, "embed_instruction", None)
+    )
+    if symmetric:
+        return embeddings.embed_documents(texts)
+    return [embeddings.embed_query(text) for text in texts]
+
+
+class LazyModel:
+    """
+    Loads a model on first use instead of at construction.
+
+    warm_up() starts the load in a background thread so the UI can render
+    meanwhile; a get() during that load waits for it rather than loading
+    twice. state is one of "not loaded", "loading", "ready", "failed".
+    """
+
+    def __init__(self, name: str, loader: Callable[[], Any]):
+        self.name = name
+        self._loader = loader
+        self._value = None
+        self._lock = threading.Lock()
+        self.state = "not loaded"
+        self.load_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def get(self) -> Optional[Any]:
+        """The loaded model, loading it now if needed; None if loading failed"""
+        if self.state in ("ready", "failed"):
+            return self._value
+        with self._lock:
+            if self.state not in ("ready", "failed"):
+                self.state = "loading"
+                start = time.perf_counter()
+                try:
+                    self._value = self._loader()
+                    self.state = "ready"
+                except Exception as e:
+                    print(f"❌ Error loading {self.name}: {e}")
+                    self.error = str(e)
+                    self.state = "failed"
+                self.load_seconds = time.perf_counter() - start
+                if self.state == "ready":
+                    print(f"✅ {self.name} loaded in {self.load_seconds:.1f}s")
+        return self._value
+
+    def warm_up(self) -> threading.Thread:
+        """Load in a daemon thread (no-op once loaded)"""
+        thread = threading.Thread(target=self.get, name=f"warm-up {self.name}", daemon=True)
+        thread.start()
+        return thread
+
+
+class ThreadLimitedEmbeddings(Embeddings):
+    """
+    Runs another model's embedding calls with torch limited to num_threads.
+
+    torch's thread count is process-wide, so it is lowered only for the
+    duration of each call and restored afterwards; calls are serialized to
+    keep that consistent. Other torch work running at the same moment (LLM
+    generation, the reranker) shares the limit while an embedding call is
+    in progress.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, embeddings: Embeddings, num_threads: int):
+        self.embeddings = embeddings
+        self.num_threads = num_threads
+
+    def _limited(self, call: Callable[[], Any]) -> Any:
+        import torch
+        with self._lock:
+            previous = torch.get_num_threads()
+            torch.set_num_threads(self.num_threads)
+            try:
+                return call()
+            finally:
+                torch.set_num_threads(previous)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._limited(lambda: self.embeddings.embed_documents(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._limited(lambda: self.embeddings.embed_query(text))
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self._limited(lambda: embed_queries(self.embeddings, texts))
+
+
+class LazyEmbeddings(Embeddings):
+    """Embeddings proxy whose underlying model is a LazyModel"""
+
+    def __init__(self, model: LazyModel):
+        self.model = model
+
+    def _embeddings(self) -> Embeddings:
+        embeddings = self.model.get()
+        if embeddings is None:
+            raise RuntimeError(f"{self.model.name} is not available: {self.model.error}")
+        return embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embeddings().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embeddings().embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return embed_queries(self._embeddings(), texts)
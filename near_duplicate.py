@@ -0,0 +1,298 @@
+# near_duplicate.py
+import re
+import zlib
+import random
+import sqlite3
+import threading
+from collections import defaultdict
+from typing import List, Dict, Optional, Tuple, Set
+
+import numpy as np
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Shingle rows hashed per numpy block (block x num_perm uint64 temporaries)
+_HASH_BLOCK = 1024
+
+
+class NearDuplicateIndex:
+    """
+    MinHash + LSH banding index for spotting near-duplicate chunks at ingest time.
+
+    Each chunk is reduced to a MinHash signature over word shingles. Signatures
+    are split into bands; chunks sharing any band bucket become candidates and
+    are confirmed by the estimated Jaccard similarity (fraction of equal
+    signature slots) against the threshold.
+
+    Signatures (packed uint32) and the band buckets live in SQLite and are
+    looked up per query, so opening the index loads nothing into memory and
+    other processes' additions are seen (index_path=None keeps it in memory only).
+    """
+
+    def __init__(self, index_path: Optional[str] = None, threshold: float = 0.9,
+                 num_perm: int = 64, bands: int = 16, shingle_size: int = 5):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        # Fixed seed: signatures must be comparable across runs
+        rng = random.Random(1)
+        perms = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+        a = np.array([a for a, _ in perms], dtype=np.uint64)
+        self._a_high, self._a_low = a >> np.uint64(32), a & np.uint64(_MAX_HASH)
+        self._b = np.array([b for _, b in perms], dtype=np.uint64)
+        # Odd multipliers folding a band's slots into one 64-bit bucket key
+        self._band_mix = np.array([rng.getrandbits(64) | 1 for _ in range(self.rows)], dtype=np.uint64)
+
+        self._lock = threading.Lock()
+        # Kept by check_and_add but not yet committed: visible to later checks,
+        # written to SQLite by commit()
+        self._pending: Dict[str, np.ndarray] = {}
+        self._pending_buckets: Dict[Tuple[int, int], Set[str]] = defaultdict(set)
+
+        self._conn = sqlite3.connect(index_path or ":memory:", timeout=60, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS minhash (chunk_id TEXT PRIMARY KEY, signature BLOB NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS bands ("
+            "band INTEGER NOT NULL, bucket INTEGER NOT NULL, chunk_id TEXT NOT NULL, "
+            "PRIMARY KEY (band, bucket, chunk_id)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS skipped (chunk_id TEXT PRIMARY KEY, duplicate_of TEXT NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_skipped_original ON skipped(duplicate_of)")
+        self._conn.commit()
+        self._migrate()
+
+    def _migrate(self):
+        """Move signatures from the old layout (uint64 lists, buckets rebuilt in memory)"""
+        if not self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'signatures'"
+        ).fetchone():
+            return
+        with self._conn:
+            rows = self._conn.execute("SELECT chunk_id, signature FROM signatures").fetchall()
+            if rows:
+                self._store([chunk_id for chunk_id, _ in rows],
+                            np.stack([np.frombuffer(blob, dtype=np.uint64) for _, blob in rows]).astype(np.uint32))
+            self._conn.execute("DROP TABLE signatures")
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM minhash").fetchone()[0] + len(self._pending)
+
+    def _shingles(self, text: str) -> np.ndarray:
+        words = re.findall(r'\w+', text.lower())
+        size = min(self.shingle_size, len(words)) or 1
+        return np.fromiter({
+            zlib.crc32(" ".join(words[i:i + size]).encode('utf-8'))
+            for i in range(max(len(words) - size + 1, 1))
+        }, dtype=np.uint64)
+
+    def _permute(self, shingles: np.ndarray) -> np.ndarray:
+        """
+        (a * shingle + b) mod 2^61-1 for every shingle and permutation, exact in
+        uint64: a is split at bit 32 and products are folded with 2^61 = 1 (mod p).
+        Works in place on two (shingles, num_perm) buffers.
+        """
+        prime = np.uint64(_MERSENNE_PRIME)
+        h = shingles[:, None]
+        high = h * self._a_high                      # < 2^61
+        result = high >> np.uint64(29)
+        high &= np.uint64((1 << 29) - 1)
+        high <<= np.uint64(32)
+        result += high
+        low = np.multiply(h, self._a_low, out=high)  # < 2^64
+        result += self._b
+        result += low >> np.uint64(61)
+        low &= prime
+        result += low                                # < 2^63
+        low = np.right_shift(result, np.uint64(61), out=low)
+        result &= prime
+        result += low
+        # result - p wraps around when result < p, so this subtracts p only when needed
+        np.minimum(result, result - prime, out=result)
+        return result
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        """MinHash signatures of many chunks, (len(texts), num_perm) uint32"""
+        result = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        shingles = [self._shingles(text) for text in texts]
+        start = 0
+        while start < len(texts):
+            # Hash the shingles of as many texts as fit in one block, then take
+            # each text's minimum per permutation
+            end, rows = start, 0
+            while end < len(texts) and (end == start or rows + len(shingles[end]) <= _HASH_BLOCK):
+                rows += len(shingles[end])
+                end += 1
+            block = shingles[start:end]
+            offsets = np.cumsum([0] + [len(s) for s in block[:-1]])
+            minima = np.minimum.reduceat(self._permute(np.concatenate(block)), offsets, axis=0)
+            result[start:end] = minima & np.uint64(_MAX_HASH)
+            start = end
+        return result
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of a chunk's word shingles"""
+        return self.signatures([text])[0]
+
+    def similarity(self, sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of two signatures"""
+        return np.count_nonzero(np.asarray(sig_a) == np.asarray(sig_b)) / self.num_perm
+
+    def _band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """(n, bands) signed 64-bit bucket keys, as SQLite stores integers"""
+        folded = (signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+                  * self._band_mix).sum(axis=2, dtype=np.uint64)
+        return folded.view(np.int64)
+
+    def _store(self, chunk_ids: List[str], signatures: np.ndarray):
+        keys = self._band_keys(signatures)
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO minhash (chunk_id, signature) VALUES (?, ?)",
+            [(chunk_id, signature.tobytes()) for chunk_id, signature in zip(chunk_ids, signatures)]
+        )
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO bands (band, bucket, chunk_id) VALUES (?, ?, ?)",
+            [(band, int(key), chunk_id) for chunk_id, row in zip(chunk_ids, keys) for band, key in enumerate(row)]
+        )
+
+    def _unstore(self, chunk_ids: List[str]):
+        found = [
+            (chunk_id, np.frombuffer(row[0], dtype=np.uint32))
+            for chunk_id in chunk_ids
+            for row in self._conn.execute("SELECT signature FROM minhash WHERE chunk_id = ?", (chunk_id,))
+        ]
+        if not found:
+            return
+        keys = self._band_keys(np.stack([signature for _, signature in found]))
+        self._conn.executemany(
+            "DELETE FROM bands WHERE band = ? AND bucket = ? AND chunk_id = ?",
+            [(band, int(key), chunk_id) for (chunk_id, _), row in zip(found, keys) for band, key in enumerate(row)]
+        )
+        self._conn.executemany("DELETE FROM minhash WHERE chunk_id = ?", [(chunk_id,) for chunk_id, _ in found])
+
+    def _discard_pending(self, chunk_id: str):
+        signature = self._pending.pop(chunk_id, None)
+        if signature is None:
+            return
+        for band, key in enumerate(self._band_keys(signature[None])[0]):
+            bucket = self._pending_buckets.get((band, int(key)))
+            if bucket:
+                bucket.discard(chunk_id)
+                if not bucket:
+                    del self._pending_buckets[(band, int(key))]
+
+    def _find_duplicate(self, chunk_id: str, signature: np.ndarray,
+                        keys: np.ndarray) -> Optional[Tuple[str, float]]:
+        candidates = set()
+        for band, key in enumerate(keys.tolist()):
+            candidates.update(self._pending_buckets.get((band, key), ()))
+        condition = " OR ".join(["(band = ? AND bucket = ?)"] * self.bands)
+        stored = [
+            row[0] for row in self._conn.execute(
+                f"SELECT DISTINCT chunk_id FROM bands WHERE {condition}",
+                [value for band, key in enumerate(keys.tolist()) for value in (band, key)]
+            )
+        ]
+        candidates.update(stored)
+        candidates.discard(chunk_id)
+        if not candidates:
+            return None
+
+        signatures = {candidate: self._pending[candidate] for candidate in candidates if candidate in self._pending}
+        missing = [candidate for candidate in candidates if candidate not in signatures]
+        if missing:
+            placeholders = ",".join("?" * len(missing))
+            for candidate, blob in self._conn.execute(
+                f"SELECT chunk_id, signature FROM minhash WHERE chunk_id IN ({placeholders})", missing
+            ):
+                signatures[candidate] = np.frombuffer(blob, dtype=np.uint32)
+
+        best = None
+        for candidate, other in signatures.items():
+            score = self.similarity(signature, other)
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (candidate, score)
+        return best
+
+    def find_duplicate(self, chunk_id: str, signature: np.ndarray) -> Optional[Tuple[str, float]]:
+        """Best indexed near-duplicate of a signature at or above the threshold (ignoring chunk_id itself)"""
+        signature = np.asarray(signature, dtype=np.uint32)
+        with self._lock:
+            return self._find_duplicate(chunk_id, signature, self._band_keys(signature[None])[0])
+
+    def check_and_add(self, chunk_ids: List[str], texts: List[str]) -> Tuple[List[int], List[Dict]]:
+        """
+        Screen a batch of chunks. Returns (indices to keep, skipped report).
+
+        Kept chunks are indexed immediately so duplicates inside the same batch
+        are caught too; call commit() once they are stored, or remove() if storing fails.
+        """
+        keep = []
+        skipped = []
+        signatures = self.signatures(texts)
+        all_keys = self._band_keys(signatures)
+        with self._lock:
+            for i, (chunk_id, signature, keys) in enumerate(zip(chunk_ids, signatures, all_keys)):
+                match = self._find_duplicate(chunk_id, signature, keys)
+                if match:
+                    skipped.append({"chunk_id": chunk_id, "duplicate_of": match[0], "similarity": match[1]})
+                    continue
+                self._discard_pending(chunk_id)
+                self._pending[chunk_id] = signature
+                for band, key in enumerate(keys.tolist()):
+                    self._pending_buckets[(band, key)].add(chunk_id)
+                keep.append(i)
+        return keep, skipped
+
+    def commit(self, chunk_ids: List[str], skipped: List[Dict]):
+        """Persist signatures of stored chunks and the skipped-duplicate links"""
+        with self._lock:
+            stored = [chunk_id for chunk_id in chunk_ids if chunk_id in self._pending]
+            with self._conn:
+                if stored:
+                    self._unstore(stored)
+                    self._store(stored, np.stack([self._pending[chunk_id] for chunk_id in stored]))
+                self._conn.executemany("DELETE FROM skipped WHERE chunk_id = ?", [(chunk_id,) for chunk_id in chunk_ids])
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO skipped (chunk_id, duplicate_of) VALUES (?, ?)",
+                    [(item["chunk_id"], item["duplicate_of"]) for item in skipped]
+                )
+            for chunk_id in stored:
+                self._discard_pending(chunk_id)
+
+    def remove(self, chunk_ids: List[str]) -> List[str]:
+        """
+        Forget chunks. Returns ids of previously skipped chunks whose original
+        was among them - those are no longer represented in the store.
+        """
+        removed = set(chunk_ids)
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._discard_pending(chunk_id)
+            orphaned = [
+                row[0] for chunk_id in chunk_ids
+                for row in self._conn.execute("SELECT chunk_id FROM skipped WHERE duplicate_of = ?", (chunk_id,))
+                if row[0] not in removed
+            ]
+            with self._conn:
+                self._unstore(chunk_ids)
+                self._conn.executemany(
+                    "DELETE FROM skipped WHERE chunk_id = ?", [(chunk_id,) for chunk_id in chunk_ids + orphaned]
+                )
+        return orphaned
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            self._pending_buckets.clear()
+            with self._conn:
+                self._conn.execute("DELETE FROM minhash")
+                self._conn.execute("DELETE FROM bands")
+                self._conn.execute("DELETE FROM skipped")
@@ -1,90 +1,199 @@
 # query_engine.py
 import re
-import torch
-from typing import List, Dict, Any
-from transformers import pipeline, AutoTokenizer, AutoModelForCausalLM
+import copy
+import time
+import threading
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
 from langchain.schema import Document
+from model_loader import LazyModel
+from answer_cache import AnswerCache
+from caching import LRUCache
 
 class QueryEngine:
-    def __init__(self, model_name: str = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"):
+    # Pipeline max_length: prompt + generated tokens must fit in it
+    CONTEXT_WINDOW = 2048
+    # Slack for special tokens and tokenizer merges across joined pieces
+    PROMPT_MARGIN_TOKENS = 16
+    RESPONSE_TYPES = ("standard_qa", "step_by_step", "generate_sop")
+    
+    def __init__(self, model_name: str = "TinyLlama/TinyLlama-1.1B-Chat-v1.0", warm_up: bool = False,
+                 answer_cache: Optional[AnswerCache] = None, token_count_cache_size: int = 4096,
+                 prefix_cache: bool = True):
         """
         Advanced Query Engine for SOP Knowledge Assistant with TinyLlama (1.1B params)
         Optimized for GTX 1650 4GB VRAM - Smaller footprint (~2.2GB)
         
         Supports: Q&A, Step-by-step instructions, SOP generation
+        
+        The model loads on first use, or in a background thread with warm_up,
+        so pages that never generate an answer don't pay for it.
+        
+        Context is packed to a token budget (CONTEXT_WINDOW minus template and
+        max new tokens); chunk token counts are cached in an LRU by chunk id.
+        
+        With prefix_cache, the key/value cache of each prompt template's static
+        preamble is computed once at load and handed to generate(), so prefill
+        only covers the documentation and question.
         """
-        try:
-            # Check if CUDA is available and set device
-            device = 0 if torch.cuda.is_available() else -1
-            device_name = "GPU (CUDA)" if device == 0 else "CPU"
-            
-            print(f"🚀 Loading TinyLlama Query Engine on: {device_name}")
-            print(f"📦 Model: {model_name} (1.1B params)")
-            print(f"   Size: ~1.5GB VRAM - Optimized for 4GB GPU")
-            
-            if torch.cuda.is_available():
-                print(f"   GPU: {torch.cuda.get_device_name(0)}")
-                print(f"   GPU Memory: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.1f} GB")
-            
-            # Initialize TinyLlama text generation pipeline with optimized settings
-            dtype = torch.float16 if torch.cuda.is_available() else torch.float32
-            
-            # TinyLlama optimizations (no trust_remote_code needed)
-            self.generator = pipeline(
-                "text-generation",
-                model=model_name,
-                tokenizer=model_name,
-                device=device,
-                max_length=2048,
-                do_sample=True,
-                temperature=0.7,
-                top_p=0.95,
-                repetition_penalty=1.15,
-                model_kwargs={"torch_dtype": dtype}
-            )
-            
-            self.model_loaded = True
-            self.model_name = model_name
-            print(f"✅ TinyLlama Query Engine loaded successfully")
-            print(f"   Features: Q&A, Step-by-step instructions, SOP generation ready")
-        except Exception as e:
-            print(f"❌ Error loading TinyLlama: {e}")
-            print("   System will use document extraction fallback")
-            self.generator = None
-            self.model_loaded = False
-            self.model_name = None
+        self.model_name = model_name
+        self.answer_cache = answer_cache
+        self._token_counts = LRUCache(token_count_cache_size)
+        self.prefix_cache = prefix_cache
+        self._prefix_caches: Dict[str, Optional[Tuple[List[int], Any]]] = {}
+        self._prefix_lock = threading.Lock()
+        self.model = LazyModel(f"TinyLlama Query Engine ({model_name})", self._load_generator)
+        if warm_up:
+            self.model.warm_up()
+    
+    @property
+    def generator(self):
+        return self.model.get()
+    
+    @property
+    def model_loaded(self) -> bool:
+        return self.generator is not None
+    
+    def _load_generator(self):
+        import torch
+        from transformers import pipeline
+        
+        # Check if CUDA is available and set device
+        device = 0 if torch.cuda.is_available() else -1
+        device_name = "GPU (CUDA)" if device == 0 else "CPU"
+        
+        print(f"🚀 Loading TinyLlama Query Engine on: {device_name}")
+        print(f"📦 Model: {self.model_name} (1.1B params)")
+        print(f"   Size: ~1.5GB VRAM - Optimized for 4GB GPU")
+        
+        if torch.cuda.is_available():
+            print(f"   GPU: {torch.cuda.get_device_name(0)}")
+            print(f"   GPU Memory: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.1f} GB")
+        
+        # Initialize TinyLlama text generation pipeline with optimized settings
+        dtype = torch.float16 if torch.cuda.is_available() else torch.float32
+        
+        # TinyLlama optimizations (no trust_remote_code needed)
+        generator = pipeline(
+            "text-generation",
+            model=self.model_name,
+            tokenizer=self.model_name,
+            device=device,
+            max_length=self.CONTEXT_WINDOW,
+            do_sample=True,
+            temperature=0.7,
+            top_p=0.95,
+            repetition_penalty=1.15,
+            model_kwargs={"torch_dtype": dtype}
+        )
+        print(f"   Features: Q&A, Step-by-step instructions, SOP generation ready")
+        if self.prefix_cache:
+            for response_type in self.RESPONSE_TYPES:
+                self._prefix_cache(response_type, generator)
+        return generator
     
     def generate_answer(self, query: str, context_docs: List[Document], 
-                       max_context_length: int = 3500, similarity_scores: List[float] = None) -> Dict[str, Any]:
+                       max_context_length: int = 3500, similarity_scores: List[float] = None,
+                       query_vector: List[float] = None) -> Dict[str, Any]:
         """
         Advanced answer generation with multiple modes:
         - Standard Q&A
         - Step-by-step instructions
         - SOP generation (future)
-        """
         
-        if not self.model_loaded:
-            return {
-                "answer": "Advanced Query Engine not available. Here are the relevant document excerpts:",
-                "sources": [doc.metadata.get("file_name", "Unknown") for doc in context_docs[:3]],
-                "context": [doc.page_content[:200] + "..." for doc in context_docs[:3]],
-                "answer_type": "fallback"
-            }
+        With an answer cache, the same question over the same chunks (or, given
+        query_vector, a close paraphrase) returns the stored answer.
+        """
         
         # Analyze query intent to determine response type
         response_type = self._analyze_query_intent(query)
         
-        # Prepare context from retrieved documents
-        context = self._prepare_context(context_docs, max_context_length)
+        _, temperature, max_tokens = self._build_prompt(query, "", response_type)
+        settings = self._answer_settings(temperature, max_tokens, max_context_length)
+        
+        cached = self._cached_answer(query, response_type, context_docs, settings, query_vector)
+        if cached:
+            return cached
+        
+        if not self.model_loaded:
+            return self._fallback_result(context_docs)
+        
+        # Pack retrieved documents into the prompt's token budget
+        prompt = self._pack_prompt(query, context_docs, response_type, max_tokens, max_context_length)
         
         # Generate appropriate response based on intent
-        if response_type == "step_by_step":
-            answer = self._generate_step_by_step_instructions(query, context)
-        elif response_type == "generate_sop":
-            answer = self._generate_new_sop(query, context)
-        else:
-            answer = self._generate_standard_answer(query, context)
+        generated = self._generate_response(prompt, temperature, max_tokens, response_type)
+        answer = self._finish_answer(prompt, response_type, generated)
         
+        result = self._answer_result(query, context_docs, similarity_scores, response_type, answer)
+        self._store_answer(query, response_type, context_docs, settings, result, query_vector)
+        return result
+    
+    def stream_answer(self, query: str, context_docs: List[Document],
+                      max_context_length: int = 3500, similarity_scores: List[float] = None,
+                      query_vector: List[float] = None) -> "AnswerStream":
+        """
+        Streaming variant of generate_answer: iterate the returned AnswerStream
+        for text pieces as the model produces them; once it is exhausted,
+        .result holds the same dict generate_answer returns (with the cleaned,
+        formatted answer) and .stats the time to first token. A cached answer
+        arrives as a single piece.
+        """
+        response_type = self._analyze_query_intent(query)
+        _, temperature, max_tokens = self._build_prompt(query, "", response_type)
+        settings = self._answer_settings(temperature, max_tokens, max_context_length)
+        
+        cached = self._cached_answer(query, response_type, context_docs, settings, query_vector)
+        if cached:
+            return AnswerStream(response_type, iter([cached["answer"]]), lambda text: cached)
+        
+        if not self.model_loaded:
+            return AnswerStream("fallback", iter(()), lambda text: self._fallback_result(context_docs))
+        
+        prompt = self._pack_prompt(query, context_docs, response_type, max_tokens, max_context_length)
+        
+        def finish(text: str) -> Dict[str, Any]:
+            result = self._answer_result(query, context_docs, similarity_scores, response_type,
+                                         self._finish_answer(prompt, response_type, text))
+            self._store_answer(query, response_type, context_docs, settings, result, query_vector)
+            return result
+        
+        return AnswerStream(response_type, self._stream_response(prompt, temperature, max_tokens, response_type), finish)
+    
+    def _answer_settings(self, temperature: float, max_tokens: int, max_context_length: int) -> Dict[str, Any]:
+        """Everything besides question and chunks that shapes an answer (part of the cache key)"""
+        return {"model": self.model_name, "temperature": temperature, "max_tokens": max_tokens,
+                "max_context_length": max_context_length, "context_window": self.CONTEXT_WINDOW}
+    
+    def _cached_answer(self, query: str, response_type: str, context_docs: List[Document],
+                       settings: Dict[str, Any], query_vector: List[float]) -> Dict[str, Any]:
+        if self.answer_cache is None or not context_docs:
+            return None
+        try:
+            cached = self.answer_cache.get(query, response_type, context_docs, settings, query_vector)
+        except Exception as e:
+            print(f"⚠️ Answer cache lookup failed: {e}")
+            return None
+        return dict(cached, cached=True) if cached else None
+    
+    def _store_answer(self, query: str, response_type: str, context_docs: List[Document],
+                      settings: Dict[str, Any], result: Dict[str, Any], query_vector: List[float]):
+        if self.answer_cache is None or not context_docs:
+            return
+        try:
+            self.answer_cache.put(query, response_type, context_docs, settings, result, query_vector)
+        except Exception as e:
+            print(f"⚠️ Could not cache answer: {e}")
+    
+    def _fallback_result(self, context_docs: List[Document]) -> Dict[str, Any]:
+        return {
+            "answer": "Advanced Query Engine not available. Here are the relevant document excerpts:",
+            "sources": [doc.metadata.get("file_name", "Unknown") for doc in context_docs[:3]],
+            "context": [doc.page_content[:200] + "..." for doc in context_docs[:3]],
+            "answer_type": "fallback"
+        }
+    
+    def _answer_result(self, query: str, context_docs: List[Document], similarity_scores: List[float],
+                       response_type: str, answer: str) -> Dict[str, Any]:
         return {
             "answer": answer,
             "sources": list(set([doc.metadata.get("file_name", "Unknown") for doc in context_docs])),
@@ -116,25 +225,11 @@ class QueryEngine:
         else:
             return "standard_qa"
     
-    def _generate_standard_answer(self, query: str, context: str) -> str:
-        """Generate standard Q&A response with TinyLlama optimized prompt"""
-        # TinyLlama Chat format
-        prompt = f"""<|system|>
-You are a helpful assistant answering questions based on documentation.
-<|user|>
-Answer the following question based on the provided documentation. Be detailed and comprehensive.
-
-Documentation:
-{context}
-
-Question: {query}
-<|assistant|>"""
-        
-        return self._generate_response(prompt, temperature=0.7, max_tokens=400)
-    
-    def _generate_step_by_step_instructions(self, query: str, context: str) -> str:
-        """Generate detailed step-by-step instructions with TinyLlama"""
-        prompt = f"""<|system|>
+    def _build_prompt(self, query: str, context: str, response_type: str) -> Tuple[str, float, int]:
+        """(prompt, temperature, max new tokens) for the response type"""
+        if response_type == "step_by_step":
+            # Generate detailed step-by-step instructions with TinyLlama
+            prompt = f"""<|system|>
 You are a helpful assistant creating step-by-step instructions.
 <|user|>
 Create detailed step-by-step instructions based on the documentation.
@@ -145,18 +240,11 @@ Documentation:
 Request: {query}
 <|assistant|>
 1."""
+            return prompt, 0.7, 500
         
-        response = self._generate_response(prompt, temperature=0.7, max_tokens=500)
-        
-        # Ensure proper step formatting
-        if not response.startswith("1."):
-            response = "1. " + response
-            
-        return self._format_step_by_step(response)
-    
-    def _generate_new_sop(self, query: str, context: str) -> str:
-        """Generate new SOP based on existing procedures (future feature)"""
-        prompt = f"""Based on the existing SOP documentation, create a new Standard Operating Procedure for the following requirement.
+        if response_type == "generate_sop":
+            # Generate new SOP based on existing procedures (future feature)
+            prompt = f"""Based on the existing SOP documentation, create a new Standard Operating Procedure for the following requirement.
 
 Existing SOP Documentation:
 {context}
@@ -168,43 +256,131 @@ NEW STANDARD OPERATING PROCEDURE
 Title: [Generated based on requirement]
 
 Purpose:"""
+            return prompt, 0.9, 500
+        
+        # Standard Q&A in TinyLlama Chat format
+        prompt = f"""<|system|>
+You are a helpful assistant answering questions based on documentation.
+<|user|>
+Answer the following question based on the provided documentation. Be detailed and comprehensive.
+
+Documentation:
+{context}
+
+Question: {query}
+<|assistant|>"""
+        return prompt, 0.7, 400
+    
+    def _finish_answer(self, prompt: str, response_type: str, generated: str) -> str:
+        """Post-process generated text into the displayed answer"""
+        # Clean and format response (but don't reject if short - TinyLlama can be concise)
+        response = self._clean_and_format_response(generated.strip())
+        
+        # Only fallback if truly empty or error
+        if not generated.strip() or len(response.strip()) < 5:
+            print("⚠️ Generated response empty, using document extraction")
+            response = self._extract_from_context(prompt)
         
-        return self._generate_response(prompt, temperature=0.9, max_tokens=500)
+        if response_type == "step_by_step":
+            # Ensure proper step formatting
+            if not response.startswith("1."):
+                response = "1. " + response
+            return self._format_step_by_step(response)
+        return response
+    
+    def _prompt_prefix(self, response_type: str) -> str:
+        """Static part of the response type's prompt, up to where the documentation goes"""
+        marker = "\x00"
+        return self._build_prompt("", marker, response_type)[0].split(marker)[0]
+    
+    def _prefix_cache(self, response_type: str, generator) -> Optional[Tuple[List[int], Any]]:
+        """(prefix token ids, past key values) for the response type's prompt prefix, computed once"""
+        if response_type not in self._prefix_caches:
+            with self._prefix_lock:
+                if response_type not in self._prefix_caches:
+                    self._prefix_caches[response_type] = self._compute_prefix_cache(response_type, generator)
+        return self._prefix_caches[response_type]
+    
+    def _compute_prefix_cache(self, response_type: str, generator) -> Optional[Tuple[List[int], Any]]:
+        try:
+            import torch
+            from transformers import DynamicCache
+            inputs = generator.tokenizer(self._prompt_prefix(response_type), return_tensors="pt")
+            inputs = inputs.to(generator.model.device)
+            past_key_values = DynamicCache()
+            with torch.no_grad():
+                generator.model(**inputs, past_key_values=past_key_values, use_cache=True)
+            prefix_ids = inputs["input_ids"][0].tolist()
+            print(f"🧠 Cached {response_type} prompt prefix ({len(prefix_ids)} tokens)")
+            return prefix_ids, past_key_values
+        except Exception as e:
+            print(f"⚠️ Could not cache {response_type} prompt prefix: {e}")
+            return None
     
-    def _generate_response(self, prompt: str, temperature: float = 0.7, max_tokens: int = 300) -> str:
-        """Core response generation with TinyLlama optimized settings"""
+    def _prefix_kwargs(self, prompt: str, response_type: Optional[str]) -> Dict[str, Any]:
+        """past_key_values for the prompt's cached prefix, or {} if it can't be reused"""
+        if not self.prefix_cache or prompt is None or response_type is None:
+            return {}
+        cached = self._prefix_cache(response_type, self.generator)
+        if cached is None:
+            return {}
+        prefix_ids, past_key_values = cached
+        # Reusable only if the prompt tokenizes to the same leading tokens
+        if self.generator.tokenizer(prompt)["input_ids"][:len(prefix_ids)] != prefix_ids:
+            return {}
+        # generate() extends the cache in place, so each call gets its own copy
+        return {"past_key_values": copy.deepcopy(past_key_values)}
+    
+    def _generation_kwargs(self, temperature: float, max_tokens: int, prompt: str = None,
+                           response_type: str = None) -> Dict[str, Any]:
+        """TinyLlama optimized sampling settings (plus the cached prompt prefix, if any)"""
+        tokenizer = self.generator.tokenizer
+        return dict(
+            self._prefix_kwargs(prompt, response_type),
+            max_new_tokens=max_tokens,
+            num_return_sequences=1,
+            truncation=True,
+            do_sample=True,
+            temperature=temperature,
+            top_p=0.9,
+            repetition_penalty=1.15,
+            eos_token_id=tokenizer.eos_token_id,
+            pad_token_id=tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+        )
+    
+    def _generate_response(self, prompt: str, temperature: float = 0.7, max_tokens: int = 300,
+                           response_type: str = None) -> str:
+        """Core response generation; returns the generated text ("" on error)"""
         try:
-            # Generate with TinyLlama optimized parameters
-            response = self.generator(
-                prompt,
-                max_new_tokens=max_tokens,
-                num_return_sequences=1,
-                truncation=True,
-                do_sample=True,
-                temperature=temperature,
-                top_p=0.9,
-                repetition_penalty=1.15,
-                eos_token_id=self.generator.tokenizer.eos_token_id,
-                pad_token_id=self.generator.tokenizer.pad_token_id if self.generator.tokenizer.pad_token_id is not None else self.generator.tokenizer.eos_token_id
-            )
+            response = self.generator(prompt, **self._generation_kwargs(temperature, max_tokens, prompt, response_type))
             
             # Extract generated text
             full_text = response[0]['generated_text']
-            generated_part = full_text[len(prompt):].strip()
-            
-            # Clean and format response (but don't reject if short - TinyLlama can be concise)
-            cleaned_response = self._clean_and_format_response(generated_part)
-            
-            # Only fallback if truly empty or error
-            if not cleaned_response or len(cleaned_response.strip()) < 5:
-                print("⚠️ Generated response empty, using document extraction")
-                return self._extract_from_context(prompt)
-            
-            return cleaned_response
+            return full_text[len(prompt):]
             
         except Exception as e:
             print(f"❌ Error generating response: {e}")
-            return self._extract_from_context(prompt)
+            return ""
+    
+    def _stream_response(self, prompt: str, temperature: float = 0.7, max_tokens: int = 300,
+                         response_type: str = None) -> Iterator[str]:
+        """Generated text pieces as they are decoded (generation runs in a background thread)"""
+        from transformers import TextIteratorStreamer
+        streamer = TextIteratorStreamer(self.generator.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        
+        def generate():
+            try:
+                self.generator(prompt, streamer=streamer,
+                               **self._generation_kwargs(temperature, max_tokens, prompt, response_type))
+            except Exception as e:
+                print(f"❌ Error generating response: {e}")
+                streamer.end()
+        
+        thread = threading.Thread(target=generate, name="generate", daemon=True)
+        thread.start()
+        for piece in streamer:
+            if piece:
+                yield piece
     
     def _extract_from_context(self, prompt: str) -> str:
         """Extract relevant information directly from the context in the prompt"""
@@ -393,20 +569,78 @@ Purpose:"""
         
         return cleaned
     
-    def _prepare_context(self, docs: List[Document], max_length: int) -> str:
-        """Prepare context string from documents"""
-        context_parts = []
-        current_length = 0
+    def _pack_prompt(self, query: str, docs: List[Document], response_type: str, max_tokens: int,
+                     max_context_length: int) -> str:
+        """Prompt with as much context as fits the token budget (character budget without a tokenizer)"""
+        tokenizer = getattr(self.generator, "tokenizer", None)
+        token_budget = None
+        if tokenizer is not None:
+            try:
+                template, _, _ = self._build_prompt(query, "", response_type)
+                token_budget = (self.CONTEXT_WINDOW - max_tokens - self.PROMPT_MARGIN_TOKENS
+                                - self._count_tokens(template, tokenizer))
+            except Exception as e:
+                print(f"⚠️ Token counting failed, using character budget: {e}")
+                tokenizer = None
+        context = self._prepare_context(docs, max_context_length, token_budget, tokenizer)
+        return self._build_prompt(query, context, response_type)[0]
+    
+    @staticmethod
+    def _count_tokens(text: str, tokenizer) -> int:
+        return len(tokenizer.encode(text, add_special_tokens=False))
+    
+    def _chunk_tokens(self, doc: Document, tokenizer) -> int:
+        """Token count of a chunk, cached by chunk id (content hash for chunks without one)"""
+        key = AnswerCache.chunk_key(doc)
+        count = self._token_counts.get(key)
+        if count is None:
+            count = self._count_tokens(doc.page_content, tokenizer)
+            self._token_counts.put(key, count)
+        return count
+    
+    @staticmethod
+    def _take_sentences(text: str, budget: int, count: Callable[[str], int]) -> str:
+        """Longest run of leading whole sentences (or lines) of text whose count fits the budget"""
+        end, used = 0, 0
+        for match in re.finditer(r'[.!?](?=\s)|\n|$', text):
+            cost = count(text[end:match.end()])
+            if used + cost > budget:
+                break
+            end, used = match.end(), used + cost
+        return text[:end].strip()
+    
+    def _prepare_context(self, docs: List[Document], max_length: int, token_budget: Optional[int] = None,
+                         tokenizer=None) -> str:
+        """
+        Prepare context string from documents. Whole chunks are added in
+        order while they fit token_budget (counted with tokenizer); the first
+        chunk that doesn't is cut at a sentence boundary. Without a tokenizer
+        max_length is a character budget instead.
+        """
+        if tokenizer is None or token_budget is None:
+            budget, count, min_partial = max_length, len, 100
+            chunk_cost = lambda doc: len(doc.page_content)
+            separator = 0
+        else:
+            budget, min_partial = token_budget, 32
+            count = lambda text: self._count_tokens(text, tokenizer)
+            chunk_cost = lambda doc: self._chunk_tokens(doc, tokenizer)
+            separator = self._count_tokens("\n\n", tokenizer)
         
+        context_parts = []
+        used = 0
         for doc in docs:
-            content = doc.page_content
-            if current_length + len(content) > max_length:
-                remaining = max_length - current_length
-                if remaining > 100:  # Only add if significant space left
-                    context_parts.append(content[:remaining] + "...")
+            join_cost = separator if context_parts else 0
+            cost = chunk_cost(doc) + join_cost
+            if used + cost > budget:
+                remaining = budget - used - join_cost
+                if remaining > min_partial:  # Only add if significant space left
+                    partial = self._take_sentences(doc.page_content, remaining, count)
+                    if partial:
+                        context_parts.append(partial)
                 break
-            context_parts.append(content)
-            current_length += len(content)
+            context_parts.append(doc.page_content)
+            used += cost
         
         return "\n\n".join(context_parts)
     
@@ -444,8 +678,12 @@ Purpose:"""
         Future method for generating SOPs with visual elements
         Will create comprehensive SOPs with text + diagrams/images
         """
-        # Placeholder for future multimodal SOP generation
-        return self._generate_new_sop(query, context)
+        # Placeholder for future multimodal SOP generation (text-only for now)
+        prompt, temperature, max_tokens = self._build_prompt(query, context, "generate_sop")
+        if not self.model_loaded:
+            return self._extract_from_context(prompt)
+        generated = self._generate_response(prompt, temperature, max_tokens, "generate_sop")
+        return self._finish_answer(prompt, "generate_sop", generated)
     
     def _calculate_confidence(self, docs: List[Document], query: str, answer: str, 
                              similarity_scores: List[float] = None) -> float:
@@ -509,3 +747,30 @@ Purpose:"""
         )
         
         return min(confidence, 1.0)
+
+
+class AnswerStream:
+    """
+    Text pieces of an answer as they are generated. After iteration ends,
+    result holds the final answer dict (post-processed) and stats the time
+    to first token and total generation time.
+    """
+
+    def __init__(self, answer_type: str, pieces: Iterator[str], finish: Callable[[str], Dict[str, Any]]):
+        self.answer_type = answer_type
+        self._pieces = pieces
+        self._finish = finish
+        self.result: Dict[str, Any] = None
+        self.stats = {"time_to_first_token_ms": None, "total_ms": None, "pieces": 0}
+
+    def __iter__(self) -> Iterator[str]:
+        start = time.perf_counter()
+        text = []
+        for piece in self._pieces:
+            if not text:
+                self.stats["time_to_first_token_ms"] = (time.perf_counter() - start) * 1000
+            text.append(piece)
+            yield piece
+        self.stats["pieces"] = len(text)
+        self.result = self._finish("".join(text))
+        self.stats["total_ms"] = (time.perf_counter() - start) * 1000
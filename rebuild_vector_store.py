@@ -3,82 +3,102 @@ Rebuild Vector Store - Remove all duplicates and reprocess documents cleanly
 """
 from vector_store import VectorStore
 from document_processor import DocumentProcessor
+from ingestion import sync_folder
 from collections import Counter
+from dotenv import load_dotenv
 import os
+import sys
 
-print("="*80)
-print("VECTOR STORE REBUILD - DUPLICATE REMOVAL")
-print("="*80)
+load_dotenv()
 
-# Step 1: Check current state
-print("\n📊 STEP 1: Checking current vector store state...")
-vs = VectorStore()
-import chromadb
-client = chromadb.PersistentClient(path='./chroma_db')
-coll = client.get_collection('sop-knowledge')
-results = coll.get()
+# Same settings as app.py, so the rebuilt index is the one the app reads
+DOCUMENTS_FOLDER = os.getenv('DOCUMENTS_FOLDER', './documents')
+CHROMA_PATH = os.getenv('CHROMA_PATH', './chroma_db')
+COLLECTION_NAME = os.getenv('COLLECTION_NAME', 'sop-knowledge')
+CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', '1000'))
+CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', '200'))
+CHUNK_SPLITTER = os.getenv('CHUNK_SPLITTER', 'offset')
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', './embedding_cache')
+EMBEDDING_CACHE_SIZE_MB = int(os.getenv('EMBEDDING_CACHE_SIZE_MB', '512'))
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '32'))
+EMBEDDING_THREADS = int(os.getenv('EMBEDDING_THREADS', '0')) or None
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv('NEAR_DUPLICATE_THRESHOLD', '0.9'))
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', str(os.cpu_count() or 1)))
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '256'))
+VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'chroma')
+VECTOR_DTYPE = os.getenv('VECTOR_DTYPE', 'float16')
+IVF_NPROBE = int(os.getenv('IVF_NPROBE', '16'))
+VECTOR_SHARDS = int(os.getenv('VECTOR_SHARDS', '1'))
+SHARD_BY = os.getenv('SHARD_BY', 'source')
 
-print(f"Current embeddings: {len(results['ids'])}")
-documents = results['documents']
-unique_docs = set(documents)
-print(f"Unique chunks: {len(unique_docs)}")
-print(f"Duplicate chunks: {len(documents) - len(unique_docs)}")
+def main():
+    print("="*80)
+    print("VECTOR STORE REBUILD - DUPLICATE REMOVAL")
+    print("="*80)
 
-# Step 2: Clear the vector store
-print("\n🗑️  STEP 2: Clearing vector store...")
-vs.clear_collection()
-print("✅ Vector store cleared")
+    # Step 1: Check current state
+    print("\n📊 STEP 1: Checking current vector store state...")
+    vs = VectorStore(CHROMA_PATH, COLLECTION_NAME, EMBEDDING_MODEL,
+                     EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_SIZE_MB,
+                     EMBEDDING_BATCH_SIZE, EMBEDDING_THREADS,
+                     NEAR_DUPLICATE_THRESHOLD,
+                     vector_backend=VECTOR_BACKEND,
+                     vector_dtype=VECTOR_DTYPE,
+                     ivf_nprobe=IVF_NPROBE,
+                     vector_shards=VECTOR_SHARDS,
+                     shard_by=SHARD_BY)
+    results = vs.backend.get()
 
-# Step 3: Reprocess documents with deduplication
-print("\n📄 STEP 3: Reprocessing documents...")
-doc_processor = DocumentProcessor(chunk_size=1000, chunk_overlap=200)
+    print(f"Current embeddings: {len(results['ids'])}")
+    documents = results['documents']
+    unique_docs = set(documents)
+    print(f"Unique chunks: {len(unique_docs)}")
+    print(f"Duplicate chunks: {len(documents) - len(unique_docs)}")
 
-documents_folder = "./documents"
-if not os.path.exists(documents_folder):
-    print(f"❌ Documents folder not found: {documents_folder}")
-    exit(1)
+    # Step 2: Clear the vector store
+    print("\n🗑️  STEP 2: Clearing vector store...")
+    vs.clear_collection()
+    print("✅ Vector store cleared")
 
-# Process all documents
-all_docs = doc_processor.process_folder(documents_folder)
-print(f"\nProcessed {len(all_docs)} chunks from documents")
+    # Step 3: Reprocess documents. Files stream through extract -> split -> embed
+    # -> upsert in fixed-size batches, so memory stays flat on large shares; this
+    # also rebuilds the ingestion manifest, so later runs of sync_vector_store.py
+    # only touch changed files
+    print("\n📄 STEP 3: Reprocessing documents...")
+    doc_processor = DocumentProcessor(CHUNK_SIZE, CHUNK_OVERLAP, INGEST_WORKERS, CHUNK_SPLITTER)
 
-# Step 4: Deduplicate chunks before adding
-print("\n🔍 STEP 4: Removing duplicates...")
-seen_content = set()
-unique_docs = []
+    documents_folder = DOCUMENTS_FOLDER
+    if not os.path.exists(documents_folder):
+        print(f"❌ Documents folder not found: {documents_folder}")
+        sys.exit(1)
 
-for doc in all_docs:
-    content_hash = doc.page_content.strip()
-    if content_hash not in seen_content:
-        seen_content.add(content_hash)
-        unique_docs.append(doc)
+    stats = sync_folder(doc_processor, vs, documents_folder, batch_size=INGEST_BATCH_SIZE)
+    # e.g. IVF-PQ training started by the sync; it would be cut off at exit
+    vs.backend.wait_until_idle()
+    print(f"\nProcessed {stats['added_files']} files, {stats['chunks_added']} chunks")
 
-print(f"Original chunks: {len(all_docs)}")
-print(f"After deduplication: {len(unique_docs)}")
-print(f"Removed duplicates: {len(all_docs) - len(unique_docs)}")
+    # Step 4: Verify the rebuild
+    print("\n✔️  STEP 4: Verifying rebuild...")
+    info = vs.get_collection_info()
+    print(f"Final document count: {info['document_count']}")
 
-# Step 5: Add deduplicated documents to vector store
-print("\n💾 STEP 5: Adding deduplicated documents to vector store...")
-vs.add_documents(unique_docs)
-print("✅ Documents added successfully")
+    # Check sources
+    print("\n📚 Documents by source:")
+    sources = [m.get('file_name', 'Unknown') for m in vs.backend.get()['metadatas']]
+    for source, count in Counter(sources).most_common():
+        print(f"  {source}: {count} chunks")
 
-# Step 6: Verify the rebuild
-print("\n✔️  STEP 6: Verifying rebuild...")
-info = vs.get_collection_info()
-print(f"Final document count: {info['document_count']}")
+    print("\n" + "="*80)
+    print("✅ REBUILD COMPLETE!")
+    print("="*80)
+    print("\nNext steps:")
+    print("1. Restart Streamlit: streamlit run app.py")
+    print("2. Test your queries - you should see:")
+    print("   - No duplicate results")
+    print("   - Higher confidence scores")
+    print("   - Better quality answers")
 
-# Check sources
-print("\n📚 Documents by source:")
-sources = [doc.metadata.get('file_name', 'Unknown') for doc in unique_docs]
-for source, count in Counter(sources).most_common():
-    print(f"  {source}: {count} chunks")
 
-print("\n" + "="*80)
-print("✅ REBUILD COMPLETE!")
-print("="*80)
-print("\nNext steps:")
-print("1. Restart Streamlit: streamlit run app.py")
-print("2. Test your queries - you should see:")
-print("   - No duplicate results")
-print("   - Higher confidence scores")
-print("   - Better quality answers")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# reranker.py
+import time
+import hashlib
+from typing import List, Tuple
+from langchain.schema import Document
+from caching import LRUCache
+
+class Reranker:
+    """
+    Optional cross-encoder stage between retrieval and generation.
+
+    Scores (query, chunk) pairs with a small local cross-encoder in batches,
+    in retrieval order, and stops starting new batches once time_budget_ms is
+    spent; unscored candidates keep their retrieval order after the scored
+    ones. Scores are cached per (query, chunk id), so repeated questions cost
+    nothing.
+    """
+
+    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+                 batch_size: int = 16, time_budget_ms: int = 500, cache_size: int = 4096):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.time_budget_ms = time_budget_ms
+        self.score_cache = LRUCache(cache_size)
+        self.last_stats = {"scored": 0, "cached": 0, "unscored": 0, "ms": 0.0}
+        try:
+            from sentence_transformers import CrossEncoder
+            print(f"🔧 Loading reranker: {model_name} (CPU)")
+            self.model = CrossEncoder(model_name, device='cpu', max_length=512)
+            self.model_loaded = True
+        except Exception as e:
+            print(f"❌ Error loading reranker: {e}")
+            self.model = None
+            self.model_loaded = False
+
+    @staticmethod
+    def _chunk_key(doc: Document) -> str:
+        return doc.metadata.get("chunk_uid") or hashlib.sha1(doc.page_content.encode('utf-8')).hexdigest()
+
+    def rerank(self, query: str, docs_with_scores: List[Tuple[Document, float]], top_k: int) -> List[Tuple[Document, float]]:
+        """
+        Reorder (Document, distance) candidates by cross-encoder relevance and
+        keep top_k. Distances are passed through unchanged.
+        """
+        if not self.model_loaded or not docs_with_scores:
+            return docs_with_scores[:top_k]
+
+        start = time.perf_counter()
+        query_key = " ".join(query.split())
+        keys = [(query_key, self._chunk_key(doc)) for doc, _ in docs_with_scores]
+        scores = [self.score_cache.get(key) for key in keys]
+        cached = len(scores) - scores.count(None)
+
+        pending = [i for i, score in enumerate(scores) if score is None]
+        for offset in range(0, len(pending), self.batch_size):
+            if (time.perf_counter() - start) * 1000 >= self.time_budget_ms:
+                break
+            batch = pending[offset:offset + self.batch_size]
+            batch_scores = self.model.predict(
+                [(query, docs_with_scores[i][0].page_content) for i in batch],
+                batch_size=self.batch_size
+            )
+            for i, score in zip(batch, batch_scores):
+                scores[i] = float(score)
+                self.score_cache.put(keys[i], scores[i])
+
+        scored = sorted((i for i, score in enumerate(scores) if score is not None), key=lambda i: -scores[i])
+        unscored = [i for i, score in enumerate(scores) if score is None]
+        self.last_stats = {
+            "scored": len(scored) - cached,
+            "cached": cached,
+            "unscored": len(unscored),
+            "ms": (time.perf_counter() - start) * 1000,
+        }
+        return [docs_with_scores[i] for i in scored + unscored][:top_k]
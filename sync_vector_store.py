@@ -0,0 +1,77 @@
+"""
+Sync Vector Store - Incrementally re-ingest the documents folder
+
+Only new or changed files are extracted and embedded, and chunks of
+changed/removed files are deleted. Safe to run nightly (e.g. from cron).
+"""
+import os
+import sys
+from dotenv import load_dotenv
+from vector_store import VectorStore
+from document_processor import DocumentProcessor
+from ingestion import sync_folder
+
+load_dotenv()
+
+DOCUMENTS_FOLDER = os.getenv('DOCUMENTS_FOLDER', './documents')
+CHROMA_PATH = os.getenv('CHROMA_PATH', './chroma_db')
+COLLECTION_NAME = os.getenv('COLLECTION_NAME', 'sop-knowledge')
+CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', '1000'))
+CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', '200'))
+CHUNK_SPLITTER = os.getenv('CHUNK_SPLITTER', 'offset')
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', './embedding_cache')
+EMBEDDING_CACHE_SIZE_MB = int(os.getenv('EMBEDDING_CACHE_SIZE_MB', '512'))
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '32'))
+EMBEDDING_THREADS = int(os.getenv('EMBEDDING_THREADS', '0')) or None
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv('NEAR_DUPLICATE_THRESHOLD', '0.9'))
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', str(os.cpu_count() or 1)))
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '256'))
+# Must match the app's storage settings, or the sync writes somewhere the app doesn't read
+VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'chroma')
+VECTOR_DTYPE = os.getenv('VECTOR_DTYPE', 'float16')
+IVF_NPROBE = int(os.getenv('IVF_NPROBE', '16'))
+VECTOR_SHARDS = int(os.getenv('VECTOR_SHARDS', '1'))
+SHARD_BY = os.getenv('SHARD_BY', 'source')
+
+def main():
+    folder = sys.argv[1] if len(sys.argv) > 1 else DOCUMENTS_FOLDER
+
+    print("="*80)
+    print(f"VECTOR STORE SYNC - {folder}")
+    print("="*80)
+
+    if not os.path.exists(folder):
+        print(f"❌ Documents folder not found: {folder}")
+        sys.exit(1)
+
+    vs = VectorStore(CHROMA_PATH, COLLECTION_NAME, EMBEDDING_MODEL,
+                     EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_SIZE_MB,
+                     EMBEDDING_BATCH_SIZE, EMBEDDING_THREADS,
+                     NEAR_DUPLICATE_THRESHOLD,
+                     vector_backend=VECTOR_BACKEND,
+                     vector_dtype=VECTOR_DTYPE,
+                     ivf_nprobe=IVF_NPROBE,
+                     vector_shards=VECTOR_SHARDS,
+                     shard_by=SHARD_BY)
+    doc_processor = DocumentProcessor(CHUNK_SIZE, CHUNK_OVERLAP, INGEST_WORKERS, CHUNK_SPLITTER)
+
+    stats = sync_folder(doc_processor, vs, folder, batch_size=INGEST_BATCH_SIZE)
+    # e.g. IVF-PQ training started by the sync; it would be cut off at exit
+    vs.backend.wait_until_idle()
+
+    print(f"\n  New files:       {stats['added_files']}")
+    print(f"  Changed files:   {stats['updated_files']}")
+    print(f"  Removed files:   {stats['removed_files']}")
+    print(f"  Unchanged files: {stats['unchanged_files']}")
+    print(f"  Failed files:    {len(stats['failed_files'])}")
+    print(f"  Chunks added:    {stats['chunks_added']}")
+    print(f"  Chunks deleted:  {stats['chunks_deleted']}")
+    print(f"  Near-duplicates: {stats['chunks_skipped']} skipped")
+    for failed_path, error in stats['failed_files'].items():
+        print(f"  ❌ {failed_path}: {error}")
+    print(f"\nFinal document count: {vs.get_collection_info()['document_count']}")
+
+
+if __name__ == "__main__":
+    main()
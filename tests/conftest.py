@@ -0,0 +1,31 @@
+"""
+pytest setup: the suite imports the root modules directly and uses the
+offline HashEmbeddings from the benchmarks, so no model download is needed.
+The other scripts in this folder are manual checks that load the real
+models (run them with python), so pytest skips them.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+collect_ignore = ["final_test.py", "test_advanced.py", "test_app.py", "test_phi2.py"]
+
+
+@pytest.fixture
+def make_store(tmp_path):
+    """Factory for a VectorStore in a temp directory with offline embeddings"""
+    from common import HashEmbeddings
+    from vector_store import VectorStore
+
+    def make(**kwargs):
+        options = dict(persist_directory=str(tmp_path / "db"), collection_name="test",
+                       embedding_cache_dir=None, vector_backend="numpy", embeddings=HashEmbeddings())
+        options.update(kwargs)
+        return VectorStore(**options)
+
+    return make
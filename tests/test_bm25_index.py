@@ -0,0 +1,91 @@
+import math
+import random
+from collections import Counter
+from functools import lru_cache
+
+import pytest
+
+from bm25_index import BM25Index, tokenize
+
+WORDS = "engine valve pump deck crane ballast tank hatch mooring winch oil filter alarm".split()
+
+
+def corpus(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    texts = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40))) for _ in range(count)]
+    texts[7] += " SOP-1234"
+    return [f"c{i}" for i in range(count)], texts
+
+
+@lru_cache(maxsize=None)
+def term_counts(text: str) -> Counter:
+    return Counter(tokenize(text))
+
+
+def brute_force(texts, ids, query, k, k1=1.5, b=0.75):
+    docs = [term_counts(text) for text in texts]
+    lengths = [sum(doc.values()) for doc in docs]
+    avg = sum(lengths) / len(docs)
+    scores = {}
+    for term in dict.fromkeys(tokenize(query)):
+        df = sum(1 for doc in docs if term in doc)
+        idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        for chunk_id, doc, length in zip(ids, docs, lengths):
+            if term in doc:
+                tf = doc[term]
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg))
+    return sorted(scores.items(), key=lambda item: (-item[1], int(item[0][1:])))[:k]
+
+
+def assert_same_ranking(actual, expected):
+    assert [chunk_id for chunk_id, _ in actual] == [chunk_id for chunk_id, _ in expected]
+    assert [score for _, score in actual] == pytest.approx([score for _, score in expected], rel=1e-5)
+
+
+@pytest.mark.parametrize("query", ["engine oil", "valve pump deck crane", "SOP-1234 alarm", "engine"])
+def test_common_terms_are_scored_exactly(tmp_path, query):
+    ids, texts = corpus(500)
+    index = BM25Index(str(tmp_path / "bm25.sqlite"))
+    index.add(ids, texts)
+    assert_same_ranking(index.search(query, k=10), brute_force(texts, ids, query, 10))
+
+
+def test_pruned_search_matches_brute_force(tmp_path):
+    """Rare terms first, then common ones only probed for docs still in contention"""
+    rng = random.Random(3)
+    vocabulary = [f"w{i}" for i in range(2000)]
+    weights = [1 / (i + 1) for i in range(2000)]
+    texts = [" ".join(rng.choices(vocabulary, weights, k=rng.randint(20, 80))) for _ in range(3000)]
+    ids = [f"c{i}" for i in range(3000)]
+    index = BM25Index(str(tmp_path / "bm25.sqlite"))
+    index.add(ids, texts)
+    for _ in range(30):
+        words = rng.sample(texts[rng.randrange(3000)].split(), 4)
+        query = " ".join(words + ["w0", "w1"])
+        for k in (1, 5, 20):
+            assert_same_ranking(index.search(query, k=k), brute_force(texts, ids, query, k))
+
+
+def test_updates_and_other_writers_are_seen(tmp_path):
+    ids, texts = corpus(300)
+    path = str(tmp_path / "bm25.sqlite")
+    index, other = BM25Index(path), BM25Index(path)
+    index.add(ids[:200], texts[:200])
+    assert_same_ranking(index.search("engine oil", k=5), brute_force(texts[:200], ids[:200], "engine oil", 5))
+
+    other.add(ids[200:], texts[200:])  # e.g. the sync script
+    other.remove(ids[:50])
+    assert_same_ranking(index.search("engine oil", k=5), brute_force(texts[50:], ids[50:], "engine oil", 5))
+
+    reopened = BM25Index(path)
+    assert_same_ranking(reopened.search("engine oil", k=5), brute_force(texts[50:], ids[50:], "engine oil", 5))
+
+
+def test_filters(tmp_path):
+    ids, texts = corpus(200)
+    metadatas = [{"source": "a.txt" if i % 2 else "b.txt"} for i in range(200)]
+    index = BM25Index(str(tmp_path / "bm25.sqlite"), facet_fields=("source",))
+    index.add(ids, texts, metadatas)
+    hits = index.search("engine", k=50, filters={"source": ["a.txt"]})
+    assert hits and all(int(chunk_id[1:]) % 2 for chunk_id, _ in hits)
+    assert index.search("engine", k=5, filters={"source": ["missing.txt"]}) == []
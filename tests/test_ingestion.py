@@ -0,0 +1,155 @@
+import os
+
+from document_processor import DocumentProcessor
+from ingestion import IngestionManifest, sync_folder
+
+ENGINE = " ".join(f"Step {i}: check engine valve {i} and record the pressure reading." for i in range(20))
+DECK = " ".join(f"Deck task {i}: inspect mooring line {i} for chafing before departure." for i in range(20))
+
+
+def write(path, text: str):
+    path.write_text(text, encoding="utf-8")
+
+
+def stored_sources(store):
+    return {metadata["file_name"] for metadata in store.backend.get()["metadatas"]}
+
+
+def test_add_unchanged_modify_remove(tmp_path, make_store):
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    store = make_store(near_duplicate_threshold=None)
+    processor = DocumentProcessor(chunk_size=200, chunk_overlap=20)
+    write(folder / "engine.txt", ENGINE)
+    write(folder / "deck.txt", DECK)
+
+    stats = sync_folder(processor, store, str(folder))
+    assert stats["added_files"] == 2 and not stats["failed_files"]
+    total = store.backend.count()
+    assert total == stats["chunks_added"]
+    assert stored_sources(store) == {"engine.txt", "deck.txt"}
+
+    stats = sync_folder(processor, store, str(folder))
+    assert stats["unchanged_files"] == 2
+    assert stats["chunks_added"] == stats["chunks_deleted"] == 0
+
+    # Only the tail of the file changes: surviving chunks keep their ids
+    write(folder / "engine.txt", ENGINE + " Finally sign the engine log.")
+    stats = sync_folder(processor, store, str(folder))
+    assert stats["updated_files"] == 1 and stats["unchanged_files"] == 1
+    assert 0 < stats["chunks_added"] < total
+    entry = store.manifest.get(str((folder / "engine.txt").resolve()))
+    assert sorted(store.backend.get(ids=entry["chunk_ids"])["ids"]) == sorted(entry["chunk_ids"])
+
+    os.remove(folder / "deck.txt")
+    stats = sync_folder(processor, store, str(folder))
+    assert stats["removed_files"] == 1 and stats["chunks_deleted"] > 0
+    assert stored_sources(store) == {"engine.txt"}
+    assert store.backend.count() == len(entry["chunk_ids"])
+
+
+def test_chunking_change_rechunks_unchanged_files(tmp_path, make_store):
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    store = make_store(near_duplicate_threshold=None)
+    write(folder / "engine.txt", ENGINE)
+    sync_folder(DocumentProcessor(chunk_size=200, chunk_overlap=20), store, str(folder))
+    small_chunks = store.backend.count()
+
+    stats = sync_folder(DocumentProcessor(chunk_size=400, chunk_overlap=20), store, str(folder))
+    assert stats["updated_files"] == 1
+    assert store.backend.count() < small_chunks
+    assert max(len(text) for text in store.backend.get()["documents"]) > 200
+
+
+def test_failed_stale_delete_is_retried(tmp_path, make_store):
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    store = make_store(near_duplicate_threshold=None)
+    processor = DocumentProcessor(chunk_size=200, chunk_overlap=20)
+    write(folder / "engine.txt", ENGINE)
+    sync_folder(processor, store, str(folder))
+    key = str((folder / "engine.txt").resolve())
+    old_ids = list(store.manifest.get(key)["chunk_ids"])
+
+    write(folder / "engine.txt", DECK)
+    delete_documents = store.delete_documents
+    store.delete_documents = lambda ids: False
+    stats = sync_folder(processor, store, str(folder))
+    assert str(folder / "engine.txt") in stats["failed_files"]
+    assert store.manifest.get(key)["chunk_ids"] == old_ids
+
+    store.delete_documents = delete_documents
+    stats = sync_folder(processor, store, str(folder))
+    assert stats["updated_files"] == 1
+    assert not store.backend.get(ids=old_ids)["ids"]
+    assert stored_sources(store) == {"engine.txt"}
+    assert all(text in DECK for text in store.backend.get()["documents"])
+
+
+def test_worker_pool_matches_in_process_chunking(tmp_path):
+    paths = []
+    for i in range(DocumentProcessor.POOL_MIN_FILES):
+        write(tmp_path / f"sop_{i}.txt", (ENGINE, DECK)[i % 2] + f" Revision {i}.")
+        paths.append(str(tmp_path / f"sop_{i}.txt"))
+    processor = DocumentProcessor(chunk_size=200, chunk_overlap=20)
+    try:
+        # A couple of files don't start worker processes
+        processor.process_files(paths[:2], max_workers=2)
+        assert processor._pool is None
+
+        pooled = processor.process_files(paths, max_workers=2)
+        pool = processor._pool
+        assert pool is not None
+        # Once running, the pool is reused, also for small batches
+        assert processor.process_files(paths[:2], max_workers=2) == pooled[:2]
+        assert processor._pool is pool
+    finally:
+        processor.close()
+    serial = processor.process_files(paths, max_workers=1)
+    assert [(path, [doc.metadata["chunk_uid"] for doc in docs], error) for path, docs, error in pooled] == \
+           [(path, [doc.metadata["chunk_uid"] for doc in docs], error) for path, docs, error in serial]
+
+
+def test_switching_backend_resyncs_into_the_new_backend(tmp_path, make_store):
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    processor = DocumentProcessor(chunk_size=200, chunk_overlap=20)
+    write(folder / "engine.txt", ENGINE)
+    write(folder / "deck.txt", DECK)
+    numpy_store = make_store(near_duplicate_threshold=None)
+    sync_folder(processor, numpy_store, str(folder))
+    total = numpy_store.backend.count()
+
+    for options in (dict(vector_backend="ivfpq"), dict(vector_shards=2)):
+        store = make_store(near_duplicate_threshold=None, **options)
+        assert store.backend.count() == 0
+        stats = sync_folder(processor, store, str(folder))
+        assert stats["added_files"] == 2 and stats["unchanged_files"] == 0
+        assert store.backend.count() == total
+        assert store.hybrid_search("mooring line chafing", k=3)
+
+    # The original backend's bookkeeping is still intact
+    stats = sync_folder(processor, make_store(near_duplicate_threshold=None), str(folder))
+    assert stats["unchanged_files"] == 2
+
+
+def test_manifest_is_saved_on_an_interval_not_per_batch(tmp_path, make_store):
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    for i in range(6):
+        write(folder / f"sop_{i}.txt", ENGINE + f" Revision {i}.")
+    processor = DocumentProcessor(chunk_size=200, chunk_overlap=20)
+
+    saves_per_interval = {}
+    for interval in (30.0, 0.0):
+        store = make_store(near_duplicate_threshold=None, persist_directory=str(tmp_path / f"db-{interval}"))
+        saves = []
+        save = store.manifest.save
+        store.manifest.save = lambda: saves.append(1) or save()
+        stats = sync_folder(processor, store, str(folder), batch_size=4, manifest_save_interval=interval)
+        assert stats["added_files"] == 6
+        assert len(IngestionManifest(store.manifest.manifest_path).entries) == 6
+        saves_per_interval[interval] = len(saves)
+    # Only the final save, versus one per batch that finished a file
+    assert saves_per_interval[30.0] == 1 and saves_per_interval[0.0] > 3
@@ -0,0 +1,23 @@
+import sys
+import types
+
+from common import HashEmbeddings
+from model_loader import ThreadLimitedEmbeddings
+
+
+def test_thread_limit_applies_only_during_embedding(monkeypatch):
+    torch = types.SimpleNamespace(threads=16, seen=[])
+    torch.get_num_threads = lambda: torch.threads
+    torch.set_num_threads = lambda n: setattr(torch, "threads", n)
+    monkeypatch.setitem(sys.modules, "torch", torch)
+
+    class Recording(HashEmbeddings):
+        def embed_documents(self, texts):
+            torch.seen.append(torch.threads)
+            return super().embed_documents(texts)
+
+    embeddings = ThreadLimitedEmbeddings(Recording(), num_threads=4)
+    assert embeddings.embed_documents(["check the valve"]) == HashEmbeddings().embed_documents(["check the valve"])
+    assert torch.seen == [4]
+    # The LLM and reranker in the same process get their threads back
+    assert torch.threads == 16
@@ -0,0 +1,78 @@
+from langchain.schema import Document
+
+OTHER = " ".join(f"Deck task {i}: inspect mooring line {i} for chafing before departure." for i in range(5))
+TEXT = ("Before starting the main engine the duty engineer checks the lube oil level, "
+        "opens the cooling water valves and confirms the turning gear is disengaged. ")
+
+
+def chunk(chunk_id: str, text: str, source: str) -> Document:
+    return Document(page_content=text, metadata={"chunk_uid": chunk_id, "source": source, "file_name": source})
+
+
+def test_near_duplicate_is_skipped_until_original_is_deleted(make_store):
+    store = make_store(near_duplicate_threshold=0.8)
+    original = chunk("a", TEXT * 3, "sop_v1.txt")
+    revised = chunk("b", TEXT * 3 + "Record the check in the log.", "sop_v2.txt")
+
+    assert store.add_documents([original])
+    assert len(store.near_duplicates) == 1
+
+    assert store.add_documents([revised])
+    assert [item["chunk_id"] for item in store.last_skipped_duplicates] == ["b"]
+    assert store.backend.count() == 1
+
+    assert store.delete_documents(["a"])
+    assert store.pop_orphaned_duplicates() == ["b"]
+    assert store.add_documents([revised])
+    assert store.last_skipped_duplicates == []
+    assert store.backend.get(ids=["b"])["ids"] == ["b"]
+
+
+def reference_signature(index, text: str):
+    """The MinHash definition, one shingle and permutation at a time"""
+    import random
+    import re
+    import zlib
+    prime = (1 << 61) - 1
+    rng = random.Random(1)
+    perms = [(rng.randrange(1, prime), rng.randrange(0, prime)) for _ in range(index.num_perm)]
+    words = re.findall(r'\w+', text.lower())
+    size = min(index.shingle_size, len(words)) or 1
+    shingles = {zlib.crc32(" ".join(words[i:i + size]).encode('utf-8'))
+                for i in range(max(len(words) - size + 1, 1))}
+    return [min((a * shingle + b) % prime for shingle in shingles) & 0xFFFFFFFF for a, b in perms]
+
+
+def test_vectorized_signatures_match_reference():
+    from near_duplicate import NearDuplicateIndex
+    index = NearDuplicateIndex()
+    texts = [TEXT, "", "one", TEXT * 40, "Valve 12-B: torque to 45 Nm"]
+    signatures = index.signatures(texts)
+    for text, signature in zip(texts, signatures):
+        assert signature.tolist() == reference_signature(index, text)
+
+
+def test_index_is_shared_through_sqlite(tmp_path):
+    import sqlite3
+    from array import array
+    from near_duplicate import NearDuplicateIndex
+    path = str(tmp_path / "minhash.sqlite")
+
+    # An index written in the old layout (uint64 signature lists) is migrated
+    legacy = sqlite3.connect(path)
+    legacy.execute("CREATE TABLE signatures (chunk_id TEXT PRIMARY KEY, signature BLOB NOT NULL)")
+    legacy.execute("INSERT INTO signatures VALUES (?, ?)",
+                   ("a", array('Q', reference_signature(NearDuplicateIndex(), TEXT * 3)).tobytes()))
+    legacy.commit()
+    legacy.close()
+
+    first, second = NearDuplicateIndex(path, threshold=0.8), NearDuplicateIndex(path, threshold=0.8)
+    keep, skipped = first.check_and_add(["b", "c"], [TEXT * 3 + "Log it.", OTHER])
+    assert keep == [1] and skipped[0]["duplicate_of"] == "a"
+    first.commit(["c"], skipped)
+
+    # Seen by another handle without reopening
+    keep, skipped = second.check_and_add(["d"], [OTHER + " Sign off."])
+    assert keep == [] and skipped[0]["duplicate_of"] == "c"
+    assert second.remove(["a"]) == ["b"]
+    assert len(NearDuplicateIndex(path)) == 1
@@ -0,0 +1,139 @@
+import os
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from vector_backends import NumpyBackend, IVFPQBackend, VectorBackend
+
+
+def unit_vectors(count: int, dim: int = 16, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def upsert(backend, prefix: str, vectors: np.ndarray):
+    ids = [f"{prefix}-{i}" for i in range(len(vectors))]
+    backend.upsert(ids, vectors.tolist(), [{"source": prefix}] * len(ids), ids)
+    return ids
+
+
+def assert_stored(backend, ids, vectors):
+    stored = backend.get(ids=ids, include_embeddings=True)
+    assert stored["ids"] == ids
+    np.testing.assert_allclose(stored["embeddings"], vectors, atol=2e-3)
+
+
+@pytest.mark.parametrize("backend_class", [NumpyBackend, IVFPQBackend])
+def test_two_handles_on_one_store_do_not_share_rows(tmp_path, backend_class):
+    """Like the app and the sync script each opening the store"""
+    first, second = backend_class(str(tmp_path)), backend_class(str(tmp_path))
+    a, b = unit_vectors(50, seed=1), unit_vectors(50, seed=2)
+    ids_a = upsert(first, "a", a)
+    ids_b = upsert(second, "b", b)  # must not reuse a's rows
+    first.delete(ids_a[:10])
+    ids_c = upsert(second, "c", a[:10])  # reuses the rows freed by the other handle
+
+    for backend in (first, second):
+        assert backend.count() == 100
+        assert_stored(backend, ids_a[10:], a[10:])
+        assert_stored(backend, ids_b, b)
+        assert_stored(backend, ids_c, a[:10])
+        hits = backend.query(b[:1].tolist(), n_results=1)
+        assert hits["ids"][0] == ["b-0"]
+
+
+def _write_batches(directory: str, prefix: str):
+    backend = NumpyBackend(directory)
+    vectors = unit_vectors(200, seed=len(prefix))
+    for start in range(0, 200, 10):
+        ids = [f"{prefix}-{i}" for i in range(start, start + 10)]
+        backend.upsert(ids, vectors[start:start + 10].tolist(), [{}] * 10, ids)
+
+
+def test_concurrent_writer_processes(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    writers = [context.Process(target=_write_batches, args=(str(tmp_path), prefix)) for prefix in ("x", "yy")]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join(60)
+        assert writer.exitcode == 0
+
+    backend = NumpyBackend(str(tmp_path))
+    assert backend.count() == 400
+    for prefix in ("x", "yy"):
+        ids = [f"{prefix}-{i}" for i in range(200)]
+        assert_stored(backend, ids, unit_vectors(200, seed=len(prefix)))
+
+
+def test_keep_decoded_is_opt_in(tmp_path):
+    backend = NumpyBackend(str(tmp_path))
+    upsert(backend, "a", unit_vectors(20))
+    backend.query(unit_vectors(1).tolist(), n_results=3)
+    assert backend._decoded is None
+
+
+def test_incomplete_backend_fails_at_construction():
+    class QueryOnly(VectorBackend):
+        def query(self, query_embeddings, n_results, filters=None, include_embeddings=False):
+            return {}
+
+    with pytest.raises(TypeError):
+        QueryOnly()
+
+
+def assert_encoded(backend):
+    """Every live row's stored IVF-PQ codes match encoding it with the current quantizers"""
+    rows = sorted(backend._rows.values())
+    lists, codes = backend._encode(backend._decode(rows), backend.centroids, backend.codebooks)
+    np.testing.assert_array_equal(backend._lists[rows], lists)
+    np.testing.assert_array_equal(backend._codes[rows], codes)
+
+
+def test_ivfpq_trains_in_background(tmp_path):
+    backend = IVFPQBackend(str(tmp_path), train_min_rows=600, nlist=8, pq_m=4)
+    vectors = unit_vectors(800, seed=3)
+    ids = upsert(backend, "a", vectors[:500])
+    assert not backend.trained
+    upsert(backend, "b", vectors[500:])  # crosses train_min_rows: returns without training inline
+    # Until training finishes, queries are exact
+    assert backend.query(vectors[:1].tolist(), n_results=1)["ids"][0] == [ids[0]]
+    backend.wait_until_idle()
+    assert backend.trained and backend.trained_rows == 800
+    assert_encoded(backend)
+    assert IVFPQBackend(str(tmp_path)).trained
+
+
+def test_ivfpq_rows_written_during_training_are_reencoded(tmp_path, monkeypatch):
+    import vector_backends
+    backend = IVFPQBackend(str(tmp_path), auto_train=False, nlist=8, pq_m=4)
+    other = IVFPQBackend(str(tmp_path), auto_train=False)
+    ids = upsert(backend, "a", unit_vectors(600, seed=4))
+    assert backend.train()
+    first_generation = backend.generation
+
+    kmeans = vector_backends._kmeans
+    writes = []
+
+    def kmeans_with_concurrent_writes(*args, **kwargs):
+        if not writes:
+            # Writers are not blocked by the training: this handle and another "process"
+            writes.append(upsert(backend, "b", unit_vectors(50, seed=5)))
+            other.delete(ids[:100])
+            writes.append(upsert(other, "c", unit_vectors(100, seed=6)))
+        return kmeans(*args, **kwargs)
+
+    monkeypatch.setattr(vector_backends, "_kmeans", kmeans_with_concurrent_writes)
+    assert backend.train()
+    assert backend.generation == first_generation + 1
+    assert_encoded(backend)
+    assert backend.count() == 650
+    assert backend.query(unit_vectors(50, seed=5)[7:8].tolist(), n_results=1)["ids"][0] == ["b-7"]
+
+    # The other handle switches to the new index, the old code files are gone
+    other.count()
+    assert other.generation == backend.generation
+    assert_encoded(other)
+    assert sorted(name for name in os.listdir(tmp_path) if name.startswith(("pq_codes", "ivf_lists"))) == \
+        [f"ivf_lists.{backend.generation}.int32", f"pq_codes.{backend.generation}.uint8"]
@@ -0,0 +1,85 @@
+from langchain.schema import Document
+
+
+def test_results_cache_sees_writes_from_another_store(make_store):
+    app, sync = make_store(near_duplicate_threshold=None), make_store(near_duplicate_threshold=None)
+    engine = Document(page_content="Check the engine lube oil level before starting.",
+                      metadata={"chunk_uid": "engine", "source": "engine.txt"})
+    deck = Document(page_content="Inspect the mooring lines for chafing.",
+                    metadata={"chunk_uid": "deck", "source": "deck.txt"})
+    assert app.add_documents([engine])
+    for search in (app.search_with_scores, app.hybrid_search):
+        assert [doc.metadata["chunk_uid"] for doc, _ in search("engine lube oil", k=5)] == ["engine"]
+
+    # Written by another instance (like the sync script): no stale cached results
+    assert sync.add_documents([deck]) and sync.delete_documents(["engine"])
+    for search in (app.search_with_scores, app.hybrid_search):
+        assert [doc.metadata["chunk_uid"] for doc, _ in search("engine lube oil", k=5)] == ["deck"]
+    assert [doc.metadata["chunk_uid"] for doc, _ in app.search_many(["engine lube oil"], k=5)[0]] == ["deck"]
+
+
+class QueryPrefixEmbeddings:
+    """Asymmetric model: queries are embedded with an instruction prefix"""
+
+    def __init__(self):
+        from common import HashEmbeddings
+        self.base = HashEmbeddings()
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.base.embed_query("query: " + text)
+
+
+def test_batched_search_embeds_with_query_semantics(make_store):
+    embeddings = QueryPrefixEmbeddings()
+    store = make_store(near_duplicate_threshold=None, embeddings=embeddings)
+    queries = ["engine lube oil", "mooring line chafing"]
+    store.search_many(queries, k=1)
+    assert embeddings.batches == []
+    for query in queries:
+        # The cache filled by search_many holds query embeddings, not document ones
+        assert store.embed_query(query) == embeddings.embed_query(query)
+
+
+def test_embed_queries_batches_only_symmetric_models():
+    from model_loader import embed_queries
+
+    class SentenceTransformerLike(QueryPrefixEmbeddings):
+        encode_kwargs = {"normalize_embeddings": True}
+        query_encode_kwargs = {}
+
+        def embed_query(self, text):
+            return self.base.embed_query(text)
+
+    symmetric = SentenceTransformerLike()
+    assert embed_queries(symmetric, ["a b", "c d"]) == [symmetric.embed_query("a b"), symmetric.embed_query("c d")]
+    assert symmetric.batches == [["a b", "c d"]]
+
+    with_query_prompt = SentenceTransformerLike()
+    with_query_prompt.query_encode_kwargs = {"normalize_embeddings": True, "prompt": "query: "}
+    embed_queries(with_query_prompt, ["a b"])
+    assert with_query_prompt.batches == []
+
+
+def test_embedding_cache_is_keyed_by_the_injected_model(tmp_path, make_store):
+    from common import HashEmbeddings
+    cache_dir = str(tmp_path / "embedding_cache")
+    chunk = [Document(page_content="Check the engine lube oil level.", metadata={"chunk_uid": "engine"})]
+
+    first = make_store(persist_directory=str(tmp_path / "a"), embedding_cache_dir=cache_dir,
+                       embeddings=HashEmbeddings(dim=64))
+    assert first.add_documents(chunk) and first.last_embed_stats["encoded"] == 1
+
+    # Same embedding_model string, different model: nothing may come from the cache
+    other = make_store(persist_directory=str(tmp_path / "b"), embedding_cache_dir=cache_dir,
+                       embeddings=HashEmbeddings(dim=32))
+    assert other.add_documents(chunk) and other.last_embed_stats["cached"] == 0
+    assert len(other.backend.get(ids=["engine"], include_embeddings=True)["embeddings"][0]) == 32
+
+    same = make_store(persist_directory=str(tmp_path / "c"), embedding_cache_dir=cache_dir,
+                      embeddings=HashEmbeddings(dim=64))
+    assert same.add_documents(chunk) and same.last_embed_stats["cached"] == 1
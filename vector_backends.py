@@ -0,0 +1,863 @@
+# vector_backends.py
+import os
+import json
+import mmap
+import zlib
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Sequence, Tuple
+import numpy as np
+
+# Canonical filter form used by all backends: {field: [allowed values, ...]},
+# a chunk matches when every listed field has one of the allowed values.
+Filters = Dict[str, List]
+
+class VectorBackend(ABC):
+    """
+    Storage + nearest-neighbour lookup behind VectorStore.
+
+    Results use Chroma's column layout so callers don't care which backend
+    answered: query() returns {"ids", "documents", "metadatas", "distances"}
+    with one list per query embedding, get() returns flat lists. Distances
+    are squared L2 between unit vectors (2 - 2 * cosine), Chroma's default.
+    Filters are applied inside the index, before ranking.
+    """
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: List[List[float]], metadatas: List[dict], documents: List[str]):
+        ...
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        ...
+
+    @abstractmethod
+    def query(self, query_embeddings: List[List[float]], n_results: int,
+              filters: Optional[Filters] = None, include_embeddings: bool = False) -> Dict[str, list]:
+        ...
+
+    @abstractmethod
+    def get(self, ids: Optional[List[str]] = None, offset: int = 0, limit: Optional[int] = None,
+            include_embeddings: bool = False) -> Dict[str, list]:
+        ...
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    def wait_until_idle(self, timeout: Optional[float] = None):
+        """Wait for background maintenance (e.g. index training) to finish; most backends have none"""
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+
+class ChromaBackend(VectorBackend):
+    """Persistent Chroma collection (SQLite + HNSW)"""
+
+    def __init__(self, persist_directory: str, collection_name: str, embeddings):
+        from langchain_chroma import Chroma
+        self._chroma_class = Chroma
+        self.persist_directory = persist_directory
+        self.collection_name = collection_name
+        self.embeddings = embeddings
+        self.vectorstore = Chroma(
+            collection_name=collection_name,
+            embedding_function=embeddings,
+            persist_directory=persist_directory
+        )
+
+    @property
+    def collection(self):
+        return self.vectorstore._collection
+
+    def upsert(self, ids, embeddings, metadatas, documents):
+        self.collection.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    @staticmethod
+    def _where(filters: Optional[Filters]) -> Optional[dict]:
+        if not filters:
+            return None
+        clauses = [{field: {"$in": list(values)}} for field, values in filters.items()]
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def query(self, query_embeddings, n_results, filters=None, include_embeddings=False):
+        include = ["documents", "metadatas", "distances"] + (["embeddings"] if include_embeddings else [])
+        n_results = min(n_results, self.collection.count())
+        if not n_results:
+            return {key: [[] for _ in query_embeddings] for key in ["ids"] + include}
+        return self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=self._where(filters),
+            include=include
+        )
+
+    def get(self, ids=None, offset=0, limit=None, include_embeddings=False):
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        if ids is not None:
+            return self.collection.get(ids=ids, include=include)
+        return self.collection.get(include=include, offset=offset, limit=limit)
+
+    def count(self):
+        return self.collection.count()
+
+    def clear(self):
+        self.vectorstore.delete_collection()
+        self.vectorstore = self._chroma_class(
+            collection_name=self.collection_name,
+            embedding_function=self.embeddings,
+            persist_directory=self.persist_directory
+        )
+
+
+class NumpyBackend(VectorBackend):
+    """
+    Exact search over a memory-mapped matrix of normalized embeddings.
+
+    Vectors live in a raw float16 file (or int8 with a per-row scale) mapped
+    with np.memmap, so opening is instant and the OS shares the pages between
+    processes. Chunk ids, texts and metadata live in a SQLite sidecar.
+    Deleted rows are tombstoned and reused by later inserts. Queries score
+    every live row with blocked matrix products and pick the top k with
+    argpartition, so recall is exact (up to the storage precision).
+
+    By default queries score straight from the shared mapping. keep_decoded
+    keeps a private float32 copy of the matrix after the first query, which
+    is faster (decoding dominates query time) but costs every process 4
+    bytes per dimension per row.
+
+    Several processes (the app and the sync script) may write the same
+    store: writes hold a SQLite write lock (BEGIN IMMEDIATE) and reload the
+    row map if another process committed since, so rows are never handed
+    out twice; reads reload it the same way.
+
+    Values of facet_fields are indexed in the sidecar, so a filtered query
+    only scores the matching rows.
+    """
+
+    DTYPES = {"float16": np.float16, "int8": np.int8}
+    BLOCK_ROWS = 65536
+
+    def __init__(self, directory: str, dtype: str = "float16", keep_decoded: bool = False,
+                 facet_fields: Sequence[str] = ()):
+        if dtype not in self.DTYPES:
+            raise ValueError(f"Unsupported vector dtype: {dtype} (use one of {', '.join(self.DTYPES)})")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.dtype = dtype
+        self.keep_decoded = keep_decoded
+        self.facet_fields = tuple(facet_fields)
+        self.matrix_path = os.path.join(directory, f"vectors.{dtype}")
+        self.scales_path = os.path.join(directory, "scales.float32")
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(directory, "rows.sqlite"), timeout=60, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rows ("
+            "row INTEGER PRIMARY KEY, chunk_id TEXT UNIQUE NOT NULL, document TEXT, metadata TEXT)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS facets ("
+            "field TEXT NOT NULL, value TEXT NOT NULL, row INTEGER NOT NULL, "
+            "PRIMARY KEY (field, value, row)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_facets_row ON facets(row)")
+        self._conn.commit()
+        self._transaction_depth = 0
+        self._load_state()
+        if self.facet_fields and self._rows and not self._conn.execute("SELECT 1 FROM facets LIMIT 1").fetchone():
+            self._backfill_facets()
+
+    def _load_state(self):
+        """(Re)read dimension, capacity and the row map from the sidecar and remap the files"""
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        meta = dict(self._conn.execute("SELECT key, value FROM meta"))
+        if meta.get("dtype", self.dtype) != self.dtype:
+            raise ValueError(f"{self.directory} holds {meta['dtype']} vectors, not {self.dtype}")
+        self.dim = int(meta["dim"]) if "dim" in meta else None
+        self._capacity = int(meta.get("capacity", 0))
+        self._matrix = None
+        self._scales = None
+        self._decoded = None
+        self._rows: Dict[str, int] = dict(self._conn.execute("SELECT chunk_id, row FROM rows"))
+        self._size = max(self._rows.values(), default=-1) + 1
+        self._live = np.zeros(self._capacity, dtype=bool)
+        self._live[list(self._rows.values())] = True
+        self._free = sorted(set(range(self._size)) - set(self._rows.values()), reverse=True)
+        if self.dim and self._capacity:
+            self._map()
+
+    def _refresh(self):
+        """Reload state if another process committed to the sidecar since we last read it"""
+        if self._conn.execute("PRAGMA data_version").fetchone()[0] != self._data_version:
+            self._load_state()
+
+    @contextmanager
+    def _write_transaction(self):
+        """
+        Hold the sidecar's write lock (across processes) with up-to-date
+        state; on error the transaction is rolled back and state reloaded.
+        """
+        with self._lock:
+            if self._transaction_depth:
+                self._transaction_depth += 1
+                try:
+                    yield
+                finally:
+                    self._transaction_depth -= 1
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._transaction_depth = 1
+            try:
+                self._refresh()
+                yield
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                self._load_state()
+                raise
+            finally:
+                self._transaction_depth = 0
+
+    def _backfill_facets(self):
+        """Index facet values of rows stored before facets existed"""
+        facets = []
+        for row, metadata in self._conn.execute("SELECT row, metadata FROM rows"):
+            metadata = json.loads(metadata or "{}")
+            facets.extend((field, str(metadata[field]), row)
+                          for field in self.facet_fields if metadata.get(field) is not None)
+        self._conn.executemany("INSERT OR IGNORE INTO facets (field, value, row) VALUES (?, ?, ?)", facets)
+        self._conn.commit()
+
+    def _map(self):
+        self._matrix = np.memmap(self.matrix_path, dtype=self.DTYPES[self.dtype], mode='r+',
+                                 shape=(self._capacity, self.dim))
+        if self.dtype == "int8":
+            self._scales = np.memmap(self.scales_path, dtype=np.float32, mode='r+', shape=(self._capacity,))
+
+    def _reserve(self, rows: int):
+        """Grow the matrix file (doubling) so it holds at least `rows` rows"""
+        if rows <= self._capacity:
+            return
+        capacity = max(rows, self._capacity * 2, 1024)
+        if self._matrix is not None:
+            self._flush()
+            self._matrix = self._scales = self._decoded = None
+        with open(self.matrix_path, 'ab') as file:
+            file.truncate(capacity * self.dim * np.dtype(self.DTYPES[self.dtype]).itemsize)
+        if self.dtype == "int8":
+            with open(self.scales_path, 'ab') as file:
+                file.truncate(capacity * 4)
+        self._live = np.concatenate([self._live, np.zeros(capacity - self._capacity, dtype=bool)])
+        self._capacity = capacity
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('capacity', ?)", (str(capacity),))
+        self._map()
+
+    def _flush(self):
+        self._matrix.flush()
+        if self._scales is not None:
+            self._scales.flush()
+
+    def _write(self, rows: List[int], vectors: np.ndarray):
+        if self.dtype == "int8":
+            # Per-row scale: unit vectors have small components, so a fixed scale wastes most of the range
+            scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+            self._matrix[rows] = np.rint(vectors / scales[:, None]).astype(np.int8)
+            self._scales[rows] = scales
+        else:
+            self._matrix[rows] = vectors.astype(np.float16)
+        self._flush()
+        if self._decoded is not None:
+            self._decoded[rows] = self._decode(rows)
+
+    def _decode(self, rows) -> np.ndarray:
+        """float32 vectors for a row slice or list of rows"""
+        vectors = np.asarray(self._matrix[rows], dtype=np.float32)
+        if self.dtype == "int8":
+            vectors *= self._scales[rows][:, None]
+        return vectors
+
+    def upsert(self, ids, embeddings, metadatas, documents):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        with self._write_transaction():
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                    [("dim", str(self.dim)), ("dtype", self.dtype)]
+                )
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+
+            rows = []
+            for chunk_id in ids:
+                row = self._rows.get(chunk_id)
+                if row is None:
+                    row = self._free.pop() if self._free else self._size
+                    self._size = max(self._size, row + 1)
+                    self._rows[chunk_id] = row
+                rows.append(row)
+            self._reserve(self._size)
+            self._write(rows, vectors)
+            self._live[rows] = True
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO rows (row, chunk_id, document, metadata) VALUES (?, ?, ?, ?)",
+                [(row, chunk_id, document, json.dumps(metadata or {}))
+                 for row, chunk_id, document, metadata in zip(rows, ids, documents, metadatas)]
+            )
+            self._conn.executemany("DELETE FROM facets WHERE row = ?", [(row,) for row in rows])
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO facets (field, value, row) VALUES (?, ?, ?)",
+                [(field, str(metadata[field]), row)
+                 for row, metadata in zip(rows, metadatas) if metadata
+                 for field in self.facet_fields if metadata.get(field) is not None]
+            )
+
+    def delete(self, ids):
+        with self._write_transaction():
+            rows = [self._rows.pop(chunk_id) for chunk_id in ids if chunk_id in self._rows]
+            self._live[rows] = False
+            self._free.extend(rows)
+            self._free.sort(reverse=True)
+            self._conn.executemany("DELETE FROM rows WHERE row = ?", [(row,) for row in rows])
+            self._conn.executemany("DELETE FROM facets WHERE row = ?", [(row,) for row in rows])
+
+    def _filtered_rows(self, filters: Filters) -> np.ndarray:
+        """Live rows matching every filtered field, from the facet index"""
+        rows = None
+        for field, values in filters.items():
+            if field not in self.facet_fields:
+                raise ValueError(f"Cannot filter on {field!r} (indexed fields: {', '.join(self.facet_fields)})")
+            matched = {row for (row,) in self._conn.execute(
+                f"SELECT row FROM facets WHERE field = ? AND value IN ({','.join('?' * len(values))})",
+                [field, *map(str, values)]
+            )}
+            rows = matched if rows is None else rows & matched
+        rows = np.array(sorted(rows), dtype=np.int64)
+        return rows[self._live[rows]] if len(rows) else rows
+
+    def _scores(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Cosine similarity of every stored row (tombstones = -inf), shape (queries, rows);
+        only of the given rows when rows is passed.
+        """
+        if self.keep_decoded and self._decoded is None:
+            self._decoded = self._decode(slice(0, self._capacity))
+        if rows is not None:
+            vectors = self._decoded[rows] if self._decoded is not None else self._decode(rows)
+            return queries @ vectors.T
+        scores = np.empty((len(queries), self._size), dtype=np.float32)
+        for start in range(0, self._size, self.BLOCK_ROWS):
+            block = slice(start, min(start + self.BLOCK_ROWS, self._size))
+            vectors = self._decoded[block] if self._decoded is not None else self._decode(block)
+            scores[:, block] = queries @ vectors.T
+        scores[:, ~self._live[:self._size]] = -np.inf
+        return scores
+
+    def _fetch_rows(self, rows: List[int]) -> Dict[int, tuple]:
+        found = {}
+        for start in range(0, len(rows), 500):
+            batch = rows[start:start + 500]
+            found.update(
+                (row, (chunk_id, document, json.loads(metadata)))
+                for row, chunk_id, document, metadata in self._conn.execute(
+                    f"SELECT row, chunk_id, document, metadata FROM rows WHERE row IN ({','.join('?' * len(batch))})",
+                    batch
+                )
+            )
+        return found
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Column indices and values of the k best scores per row, best first"""
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(scores.shape[1]), (len(scores), 1))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def _search(self, queries: np.ndarray, n_results: int,
+                rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, cosine scores) of the best matches per query; exact over all rows or the given rows"""
+        top, top_scores = self._top_k(self._scores(queries, rows), n_results)
+        return (top if rows is None else rows[top]), top_scores
+
+    def query(self, query_embeddings, n_results, filters=None, include_embeddings=False):
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if include_embeddings:
+            results["embeddings"] = []
+        with self._lock:
+            self._refresh()
+            rows = self._filtered_rows(filters) if filters else None
+            n_results = min(n_results, len(self._rows) if rows is None else len(rows))
+            if not n_results:
+                for key in results:
+                    results[key] = [[] for _ in query_embeddings]
+                return results
+            top, top_scores = self._search(np.asarray(query_embeddings, dtype=np.float32), n_results, rows)
+            found = self._fetch_rows(sorted(set(top.ravel().tolist())))
+            if include_embeddings:
+                decoded = {row: vector for row, vector in zip(found, self._decode(list(found)).tolist())}
+
+        for rows, row_scores in zip(top.tolist(), top_scores.tolist()):
+            hits = [(row, score) for row, score in zip(rows, row_scores) if row in found]
+            results["ids"].append([found[row][0] for row, _ in hits])
+            results["documents"].append([found[row][1] for row, _ in hits])
+            results["metadatas"].append([found[row][2] for row, _ in hits])
+            results["distances"].append([2.0 - 2.0 * score for _, score in hits])
+            if include_embeddings:
+                results["embeddings"].append([decoded[row] for row, _ in hits])
+        return results
+
+    def get(self, ids=None, offset=0, limit=None, include_embeddings=False):
+        with self._lock:
+            self._refresh()
+            if ids is not None:
+                rows = [self._rows[chunk_id] for chunk_id in ids if chunk_id in self._rows]
+            else:
+                rows = sorted(self._rows.values())[offset:None if limit is None else offset + limit]
+            found = self._fetch_rows(rows)
+            results = {
+                "ids": [found[row][0] for row in rows],
+                "documents": [found[row][1] for row in rows],
+                "metadatas": [found[row][2] for row in rows],
+            }
+            if include_embeddings:
+                results["embeddings"] = self._decode(rows).tolist() if rows else []
+        return results
+
+    def count(self):
+        with self._lock:
+            self._refresh()
+            return len(self._rows)
+
+    def clear(self):
+        with self._write_transaction():
+            self._matrix = self._scales = self._decoded = None
+            for path in (self.matrix_path, self.scales_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._conn.execute("DELETE FROM rows")
+            self._conn.execute("DELETE FROM facets")
+            self._conn.execute("DELETE FROM meta")
+            self.dim = None
+            self._capacity = 0
+            self._rows = {}
+            self._size = 0
+            self._live = np.zeros(0, dtype=bool)
+            self._free = []
+
+
+def _kmeans(data: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means on float32 rows; empty clusters are re-seeded from random rows"""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _nearest(data, centroids)
+        counts = np.bincount(labels, minlength=k)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        filled = counts > 0
+        sums = np.add.reduceat(data[np.argsort(labels, kind='stable')], starts[filled], axis=0)
+        centroids[filled] = sums / counts[filled, None]
+        centroids[~filled] = data[rng.choice(len(data), size=int((~filled).sum()), replace=False)]
+    return centroids
+
+def _nearest(data: np.ndarray, centroids: np.ndarray, block: int = 16384) -> np.ndarray:
+    """Index of the nearest centroid (L2) for every row, computed in blocks"""
+    norms = (centroids * centroids).sum(axis=1)
+    return np.concatenate([
+        np.argmin(norms[None, :] - 2.0 * (data[start:start + block] @ centroids.T), axis=1)
+        for start in range(0, len(data), block)
+    ]) if len(data) else np.zeros(0, dtype=np.int64)
+
+
+class IVFPQBackend(NumpyBackend):
+    """
+    Approximate search for very large collections: inverted file + product
+    quantization, with an exact rerank.
+
+    A coarse k-means splits the vectors into nlist lists; each vector's
+    residual from its list centroid is compressed to pq_m one-byte codes
+    (one per dim/pq_m-wide subspace, 256 centroids each). A query scans only
+    the nprobe nearest lists using per-list distance tables over the codes,
+    then re-scores the best k * rerank_factor candidates exactly against the
+    float16/int8 vectors in the memmap. RAM holds the codes (pq_m bytes per
+    chunk) and list order instead of full vectors; raise nprobe for recall,
+    lower it for speed.
+
+    The quantizers are trained once the collection reaches train_min_rows
+    and retrained whenever it has grown retrain_growth-fold since, in a
+    background thread (auto_train=False leaves that to train()). Training
+    holds the write lock only to snapshot the rows and to swap the new index
+    in, so ingestion and queries carry on meanwhile: until the first
+    training finishes, and for filtered queries, search is exact over the
+    rows the NumPy backend would score; during a retraining the previous
+    index keeps serving.
+    """
+
+    def __init__(self, directory: str, dtype: str = "float16", facet_fields: Sequence[str] = (),
+                 nlist: Optional[int] = None, pq_m: Optional[int] = None, nprobe: int = 16,
+                 rerank_factor: int = 10, train_min_rows: int = 10000, retrain_growth: int = 4,
+                 auto_train: bool = True):
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.nprobe = nprobe
+        self.rerank_factor = rerank_factor
+        self.train_min_rows = train_min_rows
+        self.retrain_growth = retrain_growth
+        self.auto_train = auto_train
+        self.trained_rows = 0
+        # Each training writes its codes under a new generation number; the
+        # quantizer file names the generation in use, so replacing it switches
+        # every process to the new index at once
+        self.generation = 0
+        self.quantizer_path = os.path.join(directory, "quantizers.npz")
+        self.centroids = self.codebooks = None
+        self._quantizer_mtime = None
+        self._codes = self._lists = None
+        self._order = self._offsets = None
+        self._training_lock = threading.Lock()
+        self._training_thread: Optional[threading.Thread] = None
+        super().__init__(directory, dtype, keep_decoded=False, facet_fields=facet_fields)
+        self._maybe_train()
+
+    def _generation_paths(self, generation: int) -> Tuple[str, str]:
+        """(PQ codes, list ids) files of a training generation (0: indexes from before generations)"""
+        suffix = f".{generation}" if generation else ""
+        return (os.path.join(self.directory, f"pq_codes{suffix}.uint8"),
+                os.path.join(self.directory, f"ivf_lists{suffix}.int32"))
+
+    def _load_state(self):
+        # Quantizers too, in case another process trained or cleared the index
+        mtime = os.stat(self.quantizer_path).st_mtime_ns if os.path.exists(self.quantizer_path) else None
+        if mtime != self._quantizer_mtime:
+            self.centroids = self.codebooks = None
+            self.trained_rows = self.generation = 0
+            if mtime is not None:
+                with np.load(self.quantizer_path) as quantizers:
+                    self.centroids, self.codebooks = quantizers["centroids"], quantizers["codebooks"]
+                    self.trained_rows = int(quantizers["rows"])
+                    self.generation = int(quantizers["generation"]) if "generation" in quantizers else 0
+            self._quantizer_mtime = mtime
+        self._codes = self._lists = self._order = self._offsets = None
+        super()._load_state()
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def needs_training(self) -> bool:
+        """The collection reached train_min_rows, or grew retrain_growth-fold since the last training"""
+        return len(self._rows) >= max(self.train_min_rows, self.trained_rows * self.retrain_growth)
+
+    def _map(self):
+        super()._map()
+        # Reranking reads a few scattered rows; stop readahead from paging in the whole matrix
+        mapping = getattr(self._matrix, '_mmap', None)
+        if mapping is not None and hasattr(mmap, 'MADV_RANDOM'):
+            mapping.madvise(mmap.MADV_RANDOM)
+        if not self.trained:
+            return
+        self._codes, self._lists = self._map_codes(self.generation, self._capacity, self.codebooks.shape[0])
+
+    @staticmethod
+    def _grow_file(path: str, size: int):
+        with open(path, 'ab') as file:
+            if file.tell() < size:
+                file.truncate(size)
+
+    def _map_codes(self, generation: int, capacity: int, m: int) -> Tuple[np.memmap, np.memmap]:
+        # Sized here too, so growing the matrix in _reserve grows the codes with it
+        codes_path, lists_path = self._generation_paths(generation)
+        self._grow_file(codes_path, capacity * m)
+        self._grow_file(lists_path, capacity * 4)
+        return (np.memmap(codes_path, dtype=np.uint8, mode='r+', shape=(capacity, m)),
+                np.memmap(lists_path, dtype=np.int32, mode='r+', shape=(capacity,)))
+
+    def _flush(self):
+        super()._flush()
+        if self._codes is not None:
+            self._codes.flush()
+            self._lists.flush()
+
+    @staticmethod
+    def _encode(vectors: np.ndarray, centroids: np.ndarray, codebooks: np.ndarray):
+        """(list id, PQ codes of the residual) for each vector"""
+        lists = _nearest(vectors, centroids)
+        residuals = vectors - centroids[lists]
+        m, _, width = codebooks.shape
+        codes = np.empty((len(vectors), m), dtype=np.uint8)
+        for j in range(m):
+            codes[:, j] = _nearest(residuals[:, j * width:(j + 1) * width], codebooks[j])
+        return lists.astype(np.int32), codes
+
+    def _write(self, rows, vectors):
+        if self.trained:
+            # Codes first: super()._write flushes every mapping
+            self._lists[rows], self._codes[rows] = self._encode(vectors, self.centroids, self.codebooks)
+            self._order = None
+        super()._write(rows, vectors)
+
+    def upsert(self, ids, embeddings, metadatas, documents):
+        super().upsert(ids, embeddings, metadatas, documents)
+        self._maybe_train()
+
+    def _maybe_train(self):
+        """Start a background training when the collection has grown enough (and none is running)"""
+        if not self.auto_train or not self.needs_training:
+            return
+        with self._training_lock:
+            if self._training_thread is not None and self._training_thread.is_alive():
+                return
+            self._training_thread = threading.Thread(target=self._train_in_background,
+                                                     name="ivfpq-train", daemon=True)
+            self._training_thread.start()
+
+    def _train_in_background(self):
+        try:
+            self.train()
+        except Exception as e:
+            print(f"❌ IVF-PQ training failed: {e}")
+
+    def wait_until_idle(self, timeout: Optional[float] = None):
+        thread = self._training_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def train(self, sample_size: int = 100000, iterations: int = 10, seed: int = 0):
+        """
+        Fit the coarse and product quantizers on a sample of live rows and encode
+        every row into a new generation of code files, then swap it in. Rows
+        written meanwhile (by any process) are re-encoded during the swap.
+        """
+        with self._lock:
+            self._refresh()
+            live = np.flatnonzero(self._live[:self._size])
+            if len(live) < 256:
+                print(f"⚠️ Need at least 256 vectors to train the IVF-PQ index, have {len(live)}")
+                return False
+            rng = np.random.default_rng(seed)
+            sample = self._decode(np.sort(rng.choice(live, size=min(len(live), sample_size), replace=False)))
+            snapshot = dict(self._rows)
+            size, capacity = self._size, self._capacity
+            matrix, scales = self._matrix, self._scales
+            generation = self.generation + 1
+
+        print(f"🔧 Training IVF-PQ index on {len(live)} vectors...")
+        nlist = self.nlist or int(np.clip(4 * np.sqrt(len(live)), 16, 65536))
+        nlist = min(nlist, len(sample) // 39 or 1)
+        centroids = _kmeans(sample, nlist, iterations, seed)
+        residuals = sample - centroids[_nearest(sample, centroids)]
+        m = self.pq_m or next(m for m in range(max(self.dim // 8, 1), 0, -1) if self.dim % m == 0)
+        if self.dim % m:
+            raise ValueError(f"pq_m={m} must divide the embedding dimension {self.dim}")
+        width = self.dim // m
+        codebooks = np.stack([
+            _kmeans(np.ascontiguousarray(residuals[:, j * width:(j + 1) * width]), 256, iterations, seed)
+            for j in range(m)
+        ])
+
+        # Encode the snapshot's rows from the mapping captured with it (a
+        # concurrent _reserve remaps self._matrix, not this one)
+        codes, lists = self._map_codes(generation, capacity, m)
+        for start in range(0, size, self.BLOCK_ROWS):
+            block = slice(start, min(start + self.BLOCK_ROWS, size))
+            vectors = np.asarray(matrix[block], dtype=np.float32)
+            if scales is not None:
+                vectors *= scales[block][:, None]
+            lists[block], codes[block] = self._encode(vectors, centroids, codebooks)
+        codes.flush()
+        lists.flush()
+        del codes, lists
+
+        try:
+            with self._write_transaction():
+                if self.generation >= generation or not self._rows:
+                    # Another process swapped in a newer index, or cleared the store, meanwhile
+                    for path in self._generation_paths(generation):
+                        os.remove(path)
+                    return False
+                previous = self.generation
+                self.centroids, self.codebooks = centroids, codebooks
+                self.trained_rows, self.generation = len(live), generation
+                self._map()
+                changed = sorted(row for chunk_id, row in self._rows.items() if snapshot.get(chunk_id) != row)
+                if changed:
+                    self._lists[changed], self._codes[changed] = self._encode(self._decode(changed), centroids, codebooks)
+                self._flush()
+                temp_path = self.quantizer_path + ".tmp.npz"
+                np.savez(temp_path, centroids=centroids, codebooks=codebooks, rows=len(live), generation=generation)
+                os.replace(temp_path, self.quantizer_path)
+                self._quantizer_mtime = os.stat(self.quantizer_path).st_mtime_ns
+                # Committed with the transaction, so other processes see a change and reload
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('trained_rows', ?)",
+                                   (str(self.trained_rows),))
+                self._order = None
+        except BaseException:
+            # Back to whatever quantizers are on disk
+            with self._lock:
+                self._quantizer_mtime = None
+                self._load_state()
+            raise
+        # Processes still mapping the old files keep reading them until they reload
+        for path in self._generation_paths(previous):
+            if os.path.exists(path):
+                os.remove(path)
+        print(f"✅ IVF-PQ index: {nlist} lists, {m} bytes per vector ({len(changed)} rows written meanwhile)")
+        return True
+
+    def _inverted_lists(self):
+        """Rows grouped by list (order) and each list's start in it (offsets), rebuilt after writes"""
+        if self._order is None:
+            lists = np.asarray(self._lists[:self._size])
+            self._order = np.argsort(lists, kind='stable').astype(np.int32)
+            self._offsets = np.concatenate([[0], np.cumsum(np.bincount(lists, minlength=len(self.centroids)))])
+        return self._order, self._offsets
+
+    def _search(self, queries, n_results, rows=None):
+        if rows is not None or not self.trained:
+            return super()._search(queries, n_results, rows)
+        order, offsets = self._inverted_lists()
+        m, _, width = self.codebooks.shape
+        nprobe = min(self.nprobe, len(self.centroids))
+        coarse = (self.centroids * self.centroids).sum(axis=1)[None, :] - 2.0 * (queries @ self.centroids.T)
+        probes = np.argpartition(coarse, nprobe - 1, axis=1)[:, :nprobe]
+        codebook_norms = (self.codebooks * self.codebooks).sum(axis=2)
+
+        top = np.full((len(queries), n_results), -1, dtype=np.int64)
+        top_scores = np.full((len(queries), n_results), -np.inf, dtype=np.float32)
+        for i, (query, lists) in enumerate(zip(queries, probes)):
+            candidates = [order[offsets[l]:offsets[l + 1]] for l in lists]
+            owner = np.repeat(np.arange(nprobe), [len(c) for c in candidates])
+            candidates = np.concatenate(candidates).astype(np.int64)
+            keep = self._live[candidates]
+            candidates, owner = candidates[keep], owner[keep]
+            if not len(candidates):
+                continue
+            # Distance tables: query residual per probed list vs every subspace centroid
+            # ||r - code||^2 = ||r||^2 - 2 r.code + ||code||^2 per subspace, r = query residual of the list
+            residuals = query[None, :] - self.centroids[lists]
+            tables = codebook_norms[:, None, :] - 2.0 * (
+                residuals.reshape(nprobe, m, width).transpose(1, 0, 2) @ self.codebooks.transpose(0, 2, 1))
+            # tables is (m, nprobe, 256); look up each candidate's code in its list's table
+            index = (np.arange(m) * nprobe * 256)[None, :] + (owner * 256)[:, None] + self._codes[candidates]
+            approx = tables.ravel()[index].sum(axis=1) + (residuals * residuals).sum(axis=1)[owner]
+            shortlist = min(n_results * self.rerank_factor, len(candidates))
+            shortlist = np.sort(candidates[np.argpartition(approx, shortlist - 1)[:shortlist]])
+            exact = self._decode(shortlist) @ query
+            best, best_scores = self._top_k(exact[None, :], min(n_results, len(shortlist)))
+            top[i, :best.shape[1]] = shortlist[best[0]]
+            top_scores[i, :best.shape[1]] = best_scores[0]
+        return top, top_scores
+
+    def clear(self):
+        with self._write_transaction():
+            super().clear()
+            paths = [*self._generation_paths(self.generation), self.quantizer_path]
+            self.centroids = self.codebooks = None
+            self._quantizer_mtime = None
+            self.trained_rows = self.generation = 0
+            self._codes = self._lists = self._order = self._offsets = None
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+class ShardedBackend(VectorBackend):
+    """
+    Partitions chunks across several backends (one per directory) and runs
+    every operation on the shards in parallel threads.
+
+    A chunk's shard is a stable hash (crc32) of its shard_by metadata value,
+    e.g. source, so all chunks of one file land together; chunks without it
+    are placed by id. Upserts write each shard's slice concurrently; queries
+    fan out to all shards and merge the per-shard top k by distance, which is
+    exact because every shard returns its own best k. Deletes and id lookups
+    go to every shard, as ids alone don't say where a chunk lives.
+    """
+
+    def __init__(self, shards: List[VectorBackend], shard_by: str = "source"):
+        if not shards:
+            raise ValueError("ShardedBackend needs at least one shard")
+        self.shards = shards
+        self.shard_by = shard_by
+        self._executor = ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="shard")
+
+    def shard_for(self, chunk_id: str, metadata: Optional[dict]) -> int:
+        key = (metadata or {}).get(self.shard_by)
+        return zlib.crc32(str(chunk_id if key is None else key).encode('utf-8')) % len(self.shards)
+
+    def _each(self, call, shards=None) -> list:
+        """Run call(shard) on the given (default: all) shards in parallel, results in shard order"""
+        return list(self._executor.map(call, self.shards if shards is None else shards))
+
+    def upsert(self, ids, embeddings, metadatas, documents):
+        parts: Dict[int, List[int]] = {}
+        for i, (chunk_id, metadata) in enumerate(zip(ids, metadatas)):
+            parts.setdefault(self.shard_for(chunk_id, metadata), []).append(i)
+        self._each(lambda item: self.shards[item[0]].upsert(
+            [ids[i] for i in item[1]], [embeddings[i] for i in item[1]],
+            [metadatas[i] for i in item[1]], [documents[i] for i in item[1]]
+        ), list(parts.items()))
+
+    def delete(self, ids):
+        self._each(lambda shard: shard.delete(ids))
+
+    def query(self, query_embeddings, n_results, filters=None, include_embeddings=False):
+        responses = self._each(lambda shard: shard.query(query_embeddings, n_results, filters, include_embeddings))
+        keys = ["ids", "documents", "metadatas", "distances"] + (["embeddings"] if include_embeddings else [])
+        results = {key: [] for key in keys}
+        for q in range(len(query_embeddings)):
+            hits = sorted(
+                ((distance, s, i) for s, response in enumerate(responses)
+                 for i, distance in enumerate(response["distances"][q])),
+                key=lambda hit: hit[0]
+            )[:n_results]
+            for key in keys:
+                results[key].append([responses[s][key][q][i] for _, s, i in hits])
+        return results
+
+    def get(self, ids=None, offset=0, limit=None, include_embeddings=False):
+        keys = ["ids", "documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        if ids is not None:
+            parts = self._each(lambda shard: shard.get(ids=ids, include_embeddings=include_embeddings))
+        else:
+            # Page through the shards in order, as if they were one collection
+            parts = []
+            for shard in self.shards:
+                if limit is not None and limit <= 0:
+                    break
+                count = shard.count()
+                if offset >= count:
+                    offset -= count
+                    continue
+                part = shard.get(offset=offset, limit=limit, include_embeddings=include_embeddings)
+                parts.append(part)
+                offset = 0
+                if limit is not None:
+                    limit -= len(part["ids"])
+        results = {key: [] for key in keys}
+        for part in parts:
+            for key in keys:
+                results[key].extend(list(part[key]) if part.get(key) is not None else [])
+        return results
+
+    def count(self):
+        return sum(self._each(lambda shard: shard.count()))
+
+    def wait_until_idle(self, timeout: Optional[float] = None):
+        self._each(lambda shard: shard.wait_until_idle(timeout))
+
+    def clear(self):
+        self._each(lambda shard: shard.clear())
@@ -1,73 +1,537 @@
 # vector_store.py
 import os
-from typing import List, Optional
-import chromadb
-from chromadb.config import Settings
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
+import time
+import uuid
+from collections import Counter
+import numpy as np
+from typing import List, Optional, Callable, Dict, Union
 from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from ingestion import IngestionManifest
+from embedding_cache import EmbeddingCache
+from near_duplicate import NearDuplicateIndex
+from bm25_index import BM25Index
+from caching import LRUCache
+from model_loader import LazyModel, LazyEmbeddings, ThreadLimitedEmbeddings, embed_queries
+from vector_backends import VectorBackend, ChromaBackend, NumpyBackend, IVFPQBackend, ShardedBackend
 
 class VectorStore:
+    # Metadata written by DocumentProcessor that searches can be restricted to
+    FILTER_FIELDS = ("source", "file_name", "file_type")
+    
     def __init__(self, persist_directory: str = "./chroma_db", 
                  collection_name: str = "sop-knowledge",
-                 embedding_model: str = "all-MiniLM-L6-v2"):
+                 embedding_model: str = "all-MiniLM-L6-v2",
+                 embedding_cache_dir: Optional[str] = "./embedding_cache",
+                 embedding_cache_size_mb: int = 512,
+                 embedding_batch_size: int = 32,
+                 embedding_threads: Optional[int] = None,
+                 near_duplicate_threshold: Optional[float] = 0.9,
+                 query_cache_size: int = 1024,
+                 results_cache_size: int = 256,
+                 vector_backend: str = "chroma",
+                 vector_dtype: str = "float16",
+                 ivf_nprobe: int = 16,
+                 vector_shards: int = 1,
+                 shard_by: str = "source",
+                 warm_up: bool = False,
+                 embeddings: Optional[Embeddings] = None):
         self.persist_directory = persist_directory
         self.collection_name = collection_name
+        self.embedding_batch_size = embedding_batch_size
+        self.last_embed_stats = {"cached": 0, "encoded": 0}
+        
+        if embeddings is not None:
+            # Caller-supplied model (e.g. an offline stub in benchmarks)
+            self.embedding_model = LazyModel(f"Embedding model {embedding_model}", lambda: embeddings)
+            self.embedding_model.get()
+            self.embeddings = embeddings
+        else:
+            # The sentence-transformer loads on first embed (or in the background
+            # with warm_up), so opening the store doesn't wait for it
+            self.embedding_model = LazyModel(
+                f"Embedding model {embedding_model}",
+                lambda: self._load_embeddings(embedding_model, embedding_batch_size, embedding_threads)
+            )
+            self.embeddings = LazyEmbeddings(self.embedding_model)
+            if warm_up:
+                self.embedding_model.warm_up()
+        
+        # Re-embedding unchanged chunks (after a clear, rebuild or re-upload)
+        # becomes a cache lookup instead of a forward pass. Keyed by the model
+        # actually used, so an injected model never reads another model's vectors.
+        self.embedding_cache = None
+        if embedding_cache_dir:
+            model_name = embedding_model if embeddings is None else self._embeddings_name(embeddings)
+            self.embedding_cache = EmbeddingCache(
+                embedding_cache_dir,
+                model_key=f"{model_name}|normalize=True",
+                max_size_mb=embedding_cache_size_mb
+            )
         
+        # Where vectors live: Chroma (SQLite + HNSW), an exact-search memmap matrix,
+        # or that matrix behind a compressed IVF-PQ index for very large collections.
+        # With vector_shards > 1, one such backend per shard directory.
+        self.layout_name = self._layout_name(collection_name, vector_backend, vector_shards, shard_by)
+        if vector_shards > 1:
+            self.backend = ShardedBackend([
+                self._open_backend(vector_backend, os.path.join(persist_directory, self.layout_name, f"shard-{i}"),
+                                   collection_name, vector_dtype, ivf_nprobe)
+                for i in range(vector_shards)
+            ], shard_by=shard_by)
+            vector_backend = f"{vector_backend} x {vector_shards} shards by {shard_by}"
+        else:
+            self.backend = self._open_backend(vector_backend, persist_directory, collection_name,
+                                              vector_dtype, ivf_nprobe)
+        print(f"🗄️ Vector backend: {vector_backend} ({self.backend.count()} chunks)")
+        
+        # Tracks which files/chunks are in the collection for incremental re-sync.
+        # Like the BM25 and MinHash files below it describes what one backend
+        # layout holds, so switching backend or sharding starts from a full sync.
+        self.manifest = IngestionManifest(
+            os.path.join(persist_directory, f"{self.layout_name}-manifest.json")
+        )
+        
+        # MinHash/LSH screen so revised copies of the same SOP are not indexed twice
+        self.near_duplicates = None
+        self.last_skipped_duplicates: List[dict] = []
+        self.skipped_duplicates_total = 0
+        self._orphaned_duplicates: List[str] = []
+        if near_duplicate_threshold:
+            os.makedirs(persist_directory, exist_ok=True)
+            self.near_duplicates = NearDuplicateIndex(
+                os.path.join(persist_directory, f"{self.layout_name}-minhash.sqlite"),
+                threshold=near_duplicate_threshold
+            )
+        
+        # Lexical side of hybrid search: exact SOP ids, part numbers, form codes
+        os.makedirs(persist_directory, exist_ok=True)
+        self.bm25 = BM25Index(
+            os.path.join(persist_directory, f"{self.layout_name}-bm25.sqlite"),
+            facet_fields=self.FILTER_FIELDS
+        )
+        if (not len(self.bm25) and self.backend.count()) or self.bm25.missing_facets:
+            self.rebuild_lexical_index()
+        
+        # Repeated queries (shift handovers) skip the embedding pass and the lookup.
+        # Results are dropped whenever the collection changes; query embeddings
+        # only depend on the model and are kept.
+        self.query_embedding_cache = LRUCache(query_cache_size)
+        self.results_cache = LRUCache(results_cache_size)
+        self._cache_generation = 0
+        self._store_generation = self.bm25.generation
+        self._change_listeners: List[Callable[[Optional[List[str]]], None]] = []
+    
+    @staticmethod
+    def _load_embeddings(embedding_model: str, embedding_batch_size: int,
+                         embedding_threads: Optional[int]) -> Embeddings:
         # Initialize embeddings with GPU support
         import torch
+        from langchain_huggingface import HuggingFaceEmbeddings
         device = 'cuda' if torch.cuda.is_available() else 'cpu'
         print(f"🔧 Initializing embeddings on: {device.upper()}")
-        
-        self.embeddings = HuggingFaceEmbeddings(
+        embeddings = HuggingFaceEmbeddings(
             model_name=embedding_model,
             model_kwargs={'device': device},
-            encode_kwargs={'normalize_embeddings': True}
+            encode_kwargs={'normalize_embeddings': True, 'batch_size': embedding_batch_size}
         )
-        
-        # Initialize Chroma
-        self.vectorstore = Chroma(
-            collection_name=collection_name,
-            embedding_function=self.embeddings,
-            persist_directory=persist_directory
+        if device == 'cpu' and embedding_threads:
+            # Only while embedding: the LLM and reranker in this process keep their threads
+            print(f"   CPU threads: {embedding_threads} (while embedding)")
+            return ThreadLimitedEmbeddings(embeddings, embedding_threads)
+        return embeddings
+    
+    @staticmethod
+    def _embeddings_name(embeddings: Embeddings) -> str:
+        """Identity of a caller-supplied model: its model_name, else its class"""
+        return getattr(embeddings, "model_name", None) or \
+            f"{type(embeddings).__module__}.{type(embeddings).__qualname__}"
+    
+    @staticmethod
+    def _layout_name(collection_name: str, vector_backend: str, vector_shards: int, shard_by: str) -> str:
+        """
+        Name prefix for the files that belong to one backend layout. A single
+        Chroma collection keeps the plain collection name (existing stores).
+        """
+        if vector_shards > 1:
+            return f"{collection_name}-{vector_backend}-{vector_shards}-shards-by-{shard_by}"
+        if vector_backend == "chroma":
+            return collection_name
+        return f"{collection_name}-{vector_backend}"
+    
+    def _open_backend(self, vector_backend: str, directory: str, collection_name: str,
+                      vector_dtype: str, ivf_nprobe: int) -> VectorBackend:
+        if vector_backend == "numpy":
+            return NumpyBackend(
+                os.path.join(directory, f"{collection_name}-numpy"), dtype=vector_dtype,
+                facet_fields=self.FILTER_FIELDS
+            )
+        if vector_backend == "ivfpq":
+            return IVFPQBackend(
+                os.path.join(directory, f"{collection_name}-ivfpq"), dtype=vector_dtype,
+                facet_fields=self.FILTER_FIELDS, nprobe=ivf_nprobe
+            )
+        if vector_backend == "chroma":
+            return ChromaBackend(directory, collection_name, self.embeddings)
+        raise ValueError(f"Unknown vector backend: {vector_backend} (use chroma, numpy or ivfpq)")
+
+    def rebuild_lexical_index(self, page_size: int = 5000):
+        """Re-index every stored chunk in BM25 (e.g. for collections built before it existed)"""
+        total = self.backend.count()
+        print(f"🔤 Building BM25 index for {total} chunks...")
+        self.bm25.clear()
+        for offset in range(0, total, page_size):
+            page = self.backend.get(offset=offset, limit=page_size)
+            self.bm25.add(page["ids"], page["documents"], page["metadatas"])
+    
+    def add_change_listener(self, listener: Callable[[Optional[List[str]]], None]):
+        """Call listener(chunk_ids) after chunks are added, replaced or deleted (None = everything cleared)"""
+        self._change_listeners.append(listener)
+    
+    def _invalidate_results(self, chunk_ids: Optional[List[str]] = None):
+        self._cache_generation += 1
+        self._store_generation = self.bm25.generation
+        self.results_cache.clear()
+        for listener in self._change_listeners:
+            try:
+                listener(chunk_ids)
+            except Exception as e:
+                print(f"⚠️ Change listener failed: {e}")
+    
+    def _check_external_changes(self):
+        """
+        Drop cached results when another process or store instance (e.g. the
+        sync script) changed the collection. Every write goes through the BM25
+        index, so its generation counter covers them all.
+        """
+        generation = self.bm25.generation
+        if generation != self._store_generation:
+            self._store_generation = generation
+            self._cache_generation += 1
+            self.results_cache.clear()
+    
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        return " ".join(query.split())
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Query embedding, served from the LRU cache when the same query was seen before"""
+        key = self._normalize_query(query)
+        vector = self.query_embedding_cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(key)
+            self.query_embedding_cache.put(key, vector)
+        return vector
+    
+    def _cached_results(self, key: tuple, compute: Callable[[], list]) -> list:
+        self._check_external_changes()
+        results = self.results_cache.get(key)
+        if results is None:
+            generation = self._cache_generation
+            results = compute()
+            # Don't cache results computed while the collection was changing
+            if generation == self._cache_generation:
+                self.results_cache.put(key, results)
+        return list(results)
+    
+    def get_cache_stats(self) -> dict:
+        return {
+            "query_embeddings": self.query_embedding_cache.get_stats(),
+            "results": self.results_cache.get_stats(),
+        }
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed chunk texts: cache lookup first, then encode the misses in
+        length-sorted batches so each batch pads to similar lengths.
+        """
+        vectors = self.embedding_cache.get_many(texts) if self.embedding_cache else [None] * len(texts)
+        missing = sorted(
+            (i for i, vector in enumerate(vectors) if vector is None),
+            key=lambda i: len(texts[i]),
+            reverse=True
         )
+        
+        for start in range(0, len(missing), self.embedding_batch_size):
+            batch = missing[start:start + self.embedding_batch_size]
+            encoded = self.embeddings.embed_documents([texts[i] for i in batch])
+            for i, vector in zip(batch, encoded):
+                vectors[i] = vector
+        
+        if missing and self.embedding_cache:
+            self.embedding_cache.put_many([texts[i] for i in missing], [vectors[i] for i in missing])
+        
+        self.last_embed_stats = {"cached": len(texts) - len(missing), "encoded": len(missing)}
+        return vectors
     
-    def add_documents(self, documents: List[Document]) -> bool:
-        """Add documents to vector store"""
+    def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None) -> bool:
+        """Add documents to vector store (upserts by chunk id, so re-adding is idempotent)"""
         try:
             if documents:
-                self.vectorstore.add_documents(documents)
-                # Note: Chroma now auto-persists, no need for manual persist()
-                print(f"Added {len(documents)} document chunks to vector store")
+                if ids is None:
+                    ids = [doc.metadata.get("chunk_uid") or str(uuid.uuid4()) for doc in documents]
+                texts = [doc.page_content for doc in documents]
+                
+                self.last_skipped_duplicates = []
+                if self.near_duplicates is not None:
+                    keep, skipped = self.near_duplicates.check_and_add(ids, texts)
+                    position = {chunk_id: i for i, chunk_id in enumerate(ids)}
+                    for item in skipped:
+                        item["source"] = documents[position[item["chunk_id"]]].metadata.get("source", "Unknown")
+                    self.last_skipped_duplicates = skipped
+                    self.skipped_duplicates_total += len(skipped)
+                    if skipped:
+                        print(f"⏭️ Skipped {len(skipped)} near-duplicate chunks "
+                              f"(threshold {self.near_duplicates.threshold:.2f})")
+                    documents = [documents[i] for i in keep]
+                    ids = [ids[i] for i in keep]
+                    texts = [texts[i] for i in keep]
+                    if not documents:
+                        self.near_duplicates.commit([], skipped)
+                        return True
+                
+                start_time = time.perf_counter()
+                try:
+                    embeddings = self.embed_documents(texts)
+                    embed_time = time.perf_counter() - start_time
+                    
+                    self.backend.upsert(
+                        ids=ids,
+                        embeddings=embeddings,
+                        metadatas=[doc.metadata for doc in documents],
+                        documents=texts
+                    )
+                except Exception:
+                    if self.near_duplicates is not None:
+                        self.near_duplicates.remove(ids)
+                    raise
+                total_time = time.perf_counter() - start_time
+                if self.near_duplicates is not None:
+                    self.near_duplicates.commit(ids, self.last_skipped_duplicates)
+                self.bm25.add(ids, texts, [doc.metadata for doc in documents])
+                self._invalidate_results(ids)
+                
+                stats = self.last_embed_stats
+                print(f"Added {len(documents)} document chunks to vector store "
+                      f"({stats['cached']} cached, {stats['encoded']} encoded) - "
+                      f"{len(documents) / max(total_time, 1e-9):.1f} chunks/sec, "
+                      f"embedding {stats['encoded'] / max(embed_time, 1e-9):.1f} chunks/sec")
                 return True
             return False
         except Exception as e:
             print(f"Error adding documents to vector store: {e}")
             return False
     
-    def search(self, query: str, k: int = 5) -> List[Document]:
+    def delete_documents(self, ids: List[str]) -> bool:
+        """Delete chunks by id"""
+        try:
+            if ids:
+                self.backend.delete(ids)
+                self.bm25.remove(ids)
+                self._invalidate_results(ids)
+                if self.near_duplicates is not None:
+                    self._orphaned_duplicates.extend(self.near_duplicates.remove(ids))
+                print(f"Deleted {len(ids)} document chunks from vector store")
+            return True
+        except Exception as e:
+            print(f"Error deleting documents from vector store: {e}")
+            return False
+    
+    def pop_orphaned_duplicates(self) -> List[str]:
+        """
+        Ids of chunks that were skipped as near-duplicates of chunks deleted
+        since the last call; they need re-adding to stay searchable.
+        """
+        orphaned, self._orphaned_duplicates = self._orphaned_duplicates, []
+        return orphaned
+    
+    def _normalize_filters(self, filters: Optional[Dict[str, Union[str, List[str]]]]) -> Optional[Dict[str, List[str]]]:
+        """
+        Canonical filter form: {"file_type": ".pdf", "file_name": ["a.pdf", "b.pdf"]}
+        becomes {field: sorted values}; empty values mean no restriction on that field.
+        """
+        if not filters:
+            return None
+        normalized = {}
+        for field, values in filters.items():
+            if field not in self.FILTER_FIELDS:
+                raise ValueError(f"Cannot filter on {field!r} (supported: {', '.join(self.FILTER_FIELDS)})")
+            values = [values] if isinstance(values, str) else list(values or [])
+            if values:
+                normalized[field] = sorted(set(values))
+        return normalized or None
+    
+    @staticmethod
+    def _filters_key(filters: Optional[Dict[str, List[str]]]) -> tuple:
+        return tuple((field, tuple(values)) for field, values in sorted((filters or {}).items()))
+    
+    def get_filter_values(self) -> Dict[str, List[str]]:
+        """Values currently in the collection for each filterable field (for UI pickers)"""
+        return {field: self.bm25.facet_values(field) for field in self.FILTER_FIELDS}
+    
+    @staticmethod
+    def _scored_documents(response: dict, row: int = 0) -> List[tuple]:
+        """(Document, distance) pairs for one query of a backend query() response"""
+        return [
+            (Document(page_content=text, metadata=metadata or {}), distance)
+            for text, metadata, distance in zip(
+                response["documents"][row], response["metadatas"][row], response["distances"][row]
+            )
+        ]
+    
+    def search(self, query: str, k: int = 5, filters: Optional[dict] = None) -> List[Document]:
         """Search for relevant documents"""
         try:
-            results = self.vectorstore.similarity_search(query, k=k)
-            return results
+            return [doc for doc, _ in self.search_with_scores(query, k, filters)]
         except Exception as e:
             print(f"Error searching vector store: {e}")
             return []
     
-    def search_with_scores(self, query: str, k: int = 5) -> List[tuple]:
-        """Search with similarity scores"""
+    def search_with_scores(self, query: str, k: int = 5, filters: Optional[dict] = None) -> List[tuple]:
+        """
+        Search with similarity scores. filters restricts results by metadata,
+        e.g. {"file_name": ["engine_manual.pdf"], "file_type": ".pdf"}.
+        """
         try:
-            results = self.vectorstore.similarity_search_with_score(query, k=k)
-            return results
+            filters = self._normalize_filters(filters)
+            return self._cached_results(
+                ("search_with_scores", self._normalize_query(query), k, self._filters_key(filters)),
+                lambda: self._scored_documents(self.backend.query([self.embed_query(query)], k, filters))
+            )
         except Exception as e:
             print(f"Error searching vector store with scores: {e}")
             return []
     
+    def search_many(self, queries: List[str], k: int = 5, filters: Optional[dict] = None) -> List[List[tuple]]:
+        """
+        search_with_scores for many queries at once: one batched embedding pass
+        for the uncached queries (where the model embeds queries like documents,
+        see model_loader.embed_queries) and one batched backend query.
+        Returns a list of (Document, distance) lists, one per query.
+        """
+        try:
+            filters = self._normalize_filters(filters)
+            filters_key = self._filters_key(filters)
+            keys = [("search_with_scores", self._normalize_query(query), k, filters_key) for query in queries]
+            self._check_external_changes()
+            results = [self.results_cache.get(key) for key in keys]
+            pending = [i for i, result in enumerate(results) if result is None]
+            if not pending:
+                return [list(result) for result in results]
+            
+            generation = self._cache_generation
+            vectors = {i: self.query_embedding_cache.get(keys[i][1]) for i in pending}
+            to_embed = [i for i in pending if vectors[i] is None]
+            if to_embed:
+                # Query semantics, so vectors (and cache entries) match embed_query's
+                encoded = embed_queries(self.embeddings, [keys[i][1] for i in to_embed])
+                for i, vector in zip(to_embed, encoded):
+                    vectors[i] = vector
+                    self.query_embedding_cache.put(keys[i][1], vector)
+            
+            response = self.backend.query([vectors[i] for i in pending], k, filters)
+            for row, i in enumerate(pending):
+                results[i] = self._scored_documents(response, row)
+                if generation == self._cache_generation:
+                    self.results_cache.put(keys[i], results[i])
+            return [list(result) for result in results]
+        except Exception as e:
+            print(f"Error in batched search: {e}")
+            return [[] for _ in queries]
+    
+    def mmr_search(self, query: str, k: int = 5, diversity: float = 0.3, fetch_k: Optional[int] = None,
+                   filters: Optional[dict] = None) -> List[tuple]:
+        """
+        Maximal marginal relevance: take fetch_k nearest candidates, then pick k
+        that are relevant to the query but not to each other. diversity=0 is
+        plain similarity order, 1 ignores relevance after the first pick.
+        Uses the candidate embeddings returned with the lookup (no re-embedding).
+        Returns (Document, distance) pairs like search_with_scores.
+        """
+        try:
+            filters = self._normalize_filters(filters)
+            return self._cached_results(
+                ("mmr", self._normalize_query(query), k, diversity, fetch_k, self._filters_key(filters)),
+                lambda: self._mmr_search(query, k, diversity, fetch_k or max(k * 4, 20), filters)
+            )
+        except Exception as e:
+            print(f"Error in MMR search: {e}")
+            return []
+    
+    def _mmr_search(self, query: str, k: int, diversity: float, fetch_k: int,
+                    filters: Optional[Dict[str, List[str]]]) -> List[tuple]:
+        query_embedding = self.embed_query(query)
+        response = self.backend.query([query_embedding], fetch_k, filters, include_embeddings=True)
+        candidates = self._scored_documents(response)
+        if len(candidates) <= 1:
+            return candidates
+        
+        vectors = np.asarray(response["embeddings"][0], dtype=np.float32)
+        relevance = vectors @ np.asarray(query_embedding, dtype=np.float32)
+        pairwise = vectors @ vectors.T
+        selected = [int(np.argmax(relevance))]
+        redundancy = pairwise[selected[0]].copy()
+        while len(selected) < min(k, len(candidates)):
+            scores = (1.0 - diversity) * relevance - diversity * redundancy
+            scores[selected] = -np.inf
+            pick = int(np.argmax(scores))
+            selected.append(pick)
+            redundancy = np.maximum(redundancy, pairwise[pick])
+        return [candidates[i] for i in selected]
+    
+    def hybrid_search(self, query: str, k: int = 5, candidates: Optional[int] = None,
+                      rrf_k: int = 60, filters: Optional[dict] = None) -> List[tuple]:
+        """
+        Fuse dense (vector backend) and lexical (BM25) rankings with reciprocal rank fusion.
+        
+        Returns (Document, distance) pairs like search_with_scores, ordered by
+        fused rank. The distance is always the dense distance to the query, so
+        downstream confidence scoring reads it the same way.
+        """
+        try:
+            filters = self._normalize_filters(filters)
+            return self._cached_results(
+                ("hybrid", self._normalize_query(query), k, candidates, rrf_k, self._filters_key(filters)),
+                lambda: self._hybrid_search(query, k, candidates, rrf_k, filters)
+            )
+        except Exception as e:
+            print(f"Error in hybrid search: {e}")
+            return []
+    
+    def _hybrid_search(self, query: str, k: int, candidates: Optional[int], rrf_k: int,
+                       filters: Optional[Dict[str, List[str]]]) -> List[tuple]:
+        n_candidates = min(candidates or max(k * 4, 20), self.backend.count())
+        if not n_candidates:
+            return []
+        
+        query_embedding = self.embed_query(query)
+        dense = self.backend.query([query_embedding], n_candidates, filters)
+        found = dict(zip(dense["ids"][0], self._scored_documents(dense)))
+        lexical_ids = [chunk_id for chunk_id, _ in self.bm25.search(query, n_candidates, filters)]
+        
+        fused = Counter()
+        for ranking in (dense["ids"][0], lexical_ids):
+            for rank, chunk_id in enumerate(ranking):
+                fused[chunk_id] += 1.0 / (rrf_k + rank + 1)
+        top_ids = [chunk_id for chunk_id, _ in fused.most_common(k)]
+        
+        # Lexical-only hits: fetch them and score against the query embedding
+        missing = [chunk_id for chunk_id in top_ids if chunk_id not in found]
+        if missing:
+            extra = self.backend.get(ids=missing, include_embeddings=True)
+            for chunk_id, text, metadata, embedding in zip(
+                extra["ids"], extra["documents"], extra["metadatas"], extra["embeddings"]
+            ):
+                # Squared L2 between unit vectors, the backends' distance
+                distance = 2.0 - 2.0 * sum(a * b for a, b in zip(query_embedding, embedding))
+                found[chunk_id] = (Document(page_content=text, metadata=metadata or {}), distance)
+        
+        return [found[chunk_id] for chunk_id in top_ids if chunk_id in found]
+    
     def get_collection_info(self) -> dict:
         """Get information about the collection"""
         try:
-            collection = self.vectorstore._collection
-            count = collection.count()
+            count = self.backend.count()
             return {
                 "document_count": count,
                 "collection_name": self.collection_name
@@ -78,12 +542,13 @@ class VectorStore:
     def clear_collection(self):
         """Clear all documents from collection"""
         try:
-            self.vectorstore.delete_collection()
-            self.vectorstore = Chroma(
-                collection_name=self.collection_name,
-                embedding_function=self.embeddings,
-                persist_directory=self.persist_directory
-            )
+            self.backend.clear()
+            self.manifest.clear()
+            self.bm25.clear()
+            self._invalidate_results()
+            if self.near_duplicates is not None:
+                self.near_duplicates.clear()
+            self._orphaned_duplicates = []
             print("Collection cleared successfully")
         except Exception as e:
             print(f"Error clearing collection: {e}")